@@ -0,0 +1,318 @@
+# phonics_achievements.py - Levels and achievements, kept current from each progress write
+#
+#     python phonics_achievements.py list
+#     python phonics_achievements.py backfill
+#
+# Each user has a small packed counter record (events, words, day streak, stars on the
+# latest day, plays per letter, unlocked bits). record_progress_batch folds every new
+# progress row into the counters, evaluates the rules and writes counters, unlocks and
+# level in the same transaction as the progress itself, so a render never scans
+# progress and an unlock can never exist without the result that earned it.
+#
+# Backfill rebuilds every user's counters from aggregate queries over progress and
+# progress_daily. Run it once after upgrading, or per shard with --db. Unlocks already
+# recorded keep their original time; users whose level or achievements change get
+# their version slot bumped so running apps reload their profiles.
+import argparse
+import json
+import struct
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import date, timedelta
+
+# Points needed for each level, in order; users.level holds the name
+LEVELS = (
+    ('beginner', 0),
+    ('explorer', 100),
+    ('adventurer', 300),
+    ('wizard', 750),
+    ('champion', 1500),
+    ('legend', 3000),
+)
+_LEVEL_POINTS = [points for _, points in LEVELS]
+_LEVEL_RANK = {name: rank for rank, (name, _) in enumerate(LEVELS)}
+
+LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# Successful plays of a letter before it counts as mastered
+MASTERY_PLAYS = 3
+WORD_ACTIVITIES = ('word_wizard', 'word_builder')
+
+Achievement = namedtuple('Achievement', ['key', 'icon', 'title', 'description', 'test'])
+
+# Append only: a rule's position is its bit in the unlocked mask
+ACHIEVEMENTS = (
+    Achievement('first_steps', '👣', 'First Steps', 'Finish your first activity',
+                lambda c: c.events >= 1),
+    Achievement('letter_explorer', '🔤', 'Letter Explorer', 'Master 5 letter sounds',
+                lambda c: c.mastered >= 5),
+    Achievement('alphabet_hero', '🏆', 'Alphabet Hero', 'Master all 26 letter sounds',
+                lambda c: c.mastered >= len(LETTERS)),
+    Achievement('word_wizard', '🪄', 'Word Wizard', 'Read or build 10 words',
+                lambda c: c.words >= 10),
+    Achievement('word_master', '📚', 'Word Master', 'Read or build 50 words',
+                lambda c: c.words >= 50),
+    Achievement('on_a_roll', '🔥', 'On a Roll', 'Play 3 days in a row',
+                lambda c: c.best_streak >= 3),
+    Achievement('super_week', '🌈', 'Super Week', 'Play 7 days in a row',
+                lambda c: c.best_streak >= 7),
+    Achievement('star_shower', '🌟', 'Star Shower', 'Earn 20 stars in one day',
+                lambda c: c.best_day_stars >= 20),
+    Achievement('busy_bee', '🐝', 'Busy Bee', 'Finish 100 activities',
+                lambda c: c.events >= 100),
+)
+ACHIEVEMENTS_BY_KEY = {achievement.key: achievement for achievement in ACHIEVEMENTS}
+
+_STATE = struct.Struct('<B10sIIIIHH%dsQ' % len(LETTERS))
+_STATE_VERSION = 1
+
+
+def level_for(points):
+    """Level name for a points total"""
+    return LEVELS[bisect_right(_LEVEL_POINTS, points) - 1][0]
+
+
+def _next_day(day):
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+
+class Counters:
+    """One user's running totals; every update is O(1)"""
+
+    __slots__ = ('day', 'events', 'words', 'day_stars', 'best_day_stars', 'streak', 'best_streak',
+                 'letter_plays', 'mastered', 'unlocked')
+
+    def __init__(self):
+        self.day = ''
+        self.events = 0
+        self.words = 0
+        self.day_stars = 0
+        self.best_day_stars = 0
+        self.streak = 0
+        self.best_streak = 0
+        self.letter_plays = bytearray(len(LETTERS))
+        self.mastered = 0
+        self.unlocked = 0
+
+    def play_letter(self, letter, plays=1):
+        index = LETTERS.find(letter) if letter and len(letter) == 1 else -1
+        if index < 0:
+            return
+        before = self.letter_plays[index]
+        after = min(255, before + plays)
+        self.letter_plays[index] = after
+        if before < MASTERY_PLAYS <= after:
+            self.mastered += 1
+
+    def add_day(self, day, stars):
+        """Count stars on a day; consecutive days extend the streak"""
+        if day == self.day:
+            self.day_stars += stars
+        elif day > self.day:
+            self.streak = self.streak + 1 if self.day and day == _next_day(self.day) else 1
+            self.day = day
+            self.day_stars = stars
+        else:
+            # Imported history older than the latest day does not change the streak
+            return
+        self.best_streak = max(self.best_streak, self.streak)
+        self.best_day_stars = max(self.best_day_stars, self.day_stars)
+
+    def apply(self, activity, content, score, stars, when):
+        """Fold one progress event in"""
+        self.events += 1
+        if score > 0:
+            if activity == 'letter_sounds':
+                self.play_letter(content)
+            elif activity in WORD_ACTIVITIES:
+                self.words += 1
+        self.add_day(when[:10], stars)
+
+    def unlock(self):
+        """Return the achievements this user has just earned and mark them unlocked"""
+        earned = []
+        for bit, achievement in enumerate(ACHIEVEMENTS):
+            if not self.unlocked >> bit & 1 and achievement.test(self):
+                self.unlocked |= 1 << bit
+                earned.append(achievement)
+        return earned
+
+    def encode(self):
+        return _STATE.pack(_STATE_VERSION, self.day.encode('ascii'), self.events, self.words, self.day_stars,
+                           self.best_day_stars, self.streak, self.best_streak, bytes(self.letter_plays),
+                           self.unlocked)
+
+    @classmethod
+    def decode(cls, blob):
+        counters = cls()
+        if blob is None:
+            return counters
+        (version, day, counters.events, counters.words, counters.day_stars, counters.best_day_stars,
+         counters.streak, counters.best_streak, plays, counters.unlocked) = _STATE.unpack(blob)
+        if version != _STATE_VERSION:
+            raise ValueError(f"Unknown counter state version {version}")
+        counters.day = day.rstrip(b'\0').decode('ascii')
+        counters.letter_plays = bytearray(plays)
+        counters.mastered = sum(1 for count in plays if count >= MASTERY_PLAYS)
+        return counters
+
+
+def _write(conn, counters, levels, unlocks):
+    conn.executemany("""
+        INSERT INTO user_counters (user_id, state) VALUES (?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET state = excluded.state
+    """, [(user_id, state.encode()) for user_id, state in counters.items()])
+    conn.executemany("INSERT OR IGNORE INTO achievements (user_id, achievement, unlocked_at) VALUES (?, ?, ?)",
+                     unlocks)
+    conn.executemany("UPDATE users SET level = ? WHERE id = ?", [(level, user_id) for user_id, level in levels])
+
+
+def apply_progress(conn, rows, names, unlocked=None):
+    """Fold freshly inserted progress rows into their users' counters, in the caller's transaction
+
+    rows are (user_id, activity, content, score, time_spent, date, stars_earned) and
+    names maps user_id to name. Run after the users' totals are updated, since levels
+    follow total_points. New unlocks are appended to unlocked as
+    (user_name, 'achievement' or 'level', key).
+    """
+    user_ids = json.dumps(list({row[0] for row in rows}))
+    loaded = conn.execute("""
+        SELECT users.id, users.total_points, users.level, c.state
+        FROM users LEFT JOIN user_counters AS c ON c.user_id = users.id
+        WHERE users.id IN (SELECT value FROM json_each(?))
+    """, (user_ids,)).fetchall()
+    counters = {user_id: Counters.decode(state) for user_id, _, _, state in loaded}
+
+    unlocks = []
+    for user_id, activity, content, score, _, when, stars in rows:
+        state = counters[user_id]
+        state.apply(activity, content, score, stars, when)
+        unlocks.extend((user_id, achievement.key, when) for achievement in state.unlock())
+
+    levels = []
+    for user_id, points, level, _ in loaded:
+        earned = level_for(points)
+        if _LEVEL_RANK[earned] > _LEVEL_RANK.get(level, -1):
+            levels.append((user_id, earned))
+
+    _write(conn, counters, levels, unlocks)
+    if unlocked is not None:
+        unlocked.extend((names[user_id], 'achievement', key) for user_id, key, _ in unlocks)
+        unlocked.extend((names[user_id], 'level', level) for user_id, level in levels)
+
+
+def backfill(storage, versions=None):
+    """Rebuild every user's counters, unlocks and level from their whole history
+
+    The history is read as a few grouped queries (per user; per user and day; per user
+    and letter) from one read snapshot, then folded per user in Python. Rows written
+    after the snapshot are replayed one by one inside the short write transaction.
+    Existing achievement rows are kept; only missing ones are added, dated by the
+    user's latest day. The changed users are bumped in versions, a VersionTable.
+    Returns (users, new unlocks, scan seconds, write seconds).
+    """
+    started = time.perf_counter()
+    counters = {}
+
+    def state(user_id):
+        counters.setdefault(user_id, Counters())
+        return counters[user_id]
+
+    with storage.connection() as conn:
+        conn.execute("BEGIN")
+        try:
+            high = conn.execute("SELECT COALESCE(MAX(id), 0) FROM progress").fetchone()[0]
+            words = ','.join('?' * len(WORD_ACTIVITIES))
+            for user_id, events, word_count in conn.execute(f"""
+                SELECT user_id, SUM(events), SUM(words) FROM (
+                    SELECT user_id, COUNT(*) AS events,
+                           SUM(activity IN ({words}) AND score > 0) AS words
+                    FROM progress WHERE id <= ? GROUP BY user_id
+                    UNION ALL
+                    SELECT user_id, SUM(events), SUM(CASE WHEN activity IN ({words}) AND score > 0 THEN events END)
+                    FROM progress_daily GROUP BY user_id
+                ) GROUP BY user_id
+            """, WORD_ACTIVITIES + (high,) + WORD_ACTIVITIES):
+                entry = state(user_id)
+                entry.events = events
+                entry.words = word_count or 0
+            for user_id, day, stars in conn.execute("""
+                SELECT user_id, day, SUM(stars) FROM (
+                    SELECT user_id, substr(date, 1, 10) AS day, SUM(stars_earned) AS stars
+                    FROM progress WHERE id <= ? GROUP BY user_id, day
+                    UNION ALL
+                    SELECT user_id, day, SUM(stars) FROM progress_daily GROUP BY user_id, day
+                ) GROUP BY user_id, day ORDER BY user_id, day
+            """, (high,)):
+                state(user_id).add_day(day, stars)
+            for user_id, letter, plays in conn.execute("""
+                SELECT user_id, content, SUM(plays) FROM (
+                    SELECT user_id, content, COUNT(*) AS plays FROM progress
+                    WHERE id <= ? AND activity = 'letter_sounds' AND score > 0 GROUP BY user_id, content
+                    UNION ALL
+                    SELECT user_id, content, SUM(events) FROM progress_daily
+                    WHERE activity = 'letter_sounds' AND score > 0 GROUP BY user_id, content
+                ) GROUP BY user_id, content
+            """, (high,)):
+                state(user_id).play_letter(letter, plays)
+        finally:
+            conn.execute("COMMIT")
+    scanned = time.perf_counter()
+
+    with storage.transaction() as conn:
+        for user_id, activity, content, score, when, stars in conn.execute("""
+            SELECT user_id, activity, content, score, date, stars_earned FROM progress WHERE id > ? ORDER BY id
+        """, (high,)).fetchall():
+            state(user_id).apply(activity, content, score, stars, when)
+        users = conn.execute("SELECT id, name, total_points, level FROM users").fetchall()
+        recorded = set(conn.execute("SELECT user_id, achievement FROM achievements"))
+        unlocks = []
+        levels = []
+        changed = set()
+        for user_id, name, points, level in users:
+            entry = state(user_id)
+            entry.unlocked = 0
+            for achievement in entry.unlock():
+                if (user_id, achievement.key) not in recorded:
+                    unlocks.append((user_id, achievement.key, entry.day or None))
+                    changed.add(name)
+            earned = level_for(points)
+            levels.append((user_id, earned))
+            if earned != level:
+                changed.add(name)
+        conn.execute("DELETE FROM user_counters")
+        _write(conn, {user_id: counters[user_id] for user_id, _, _, _ in users}, levels, unlocks)
+    if versions is not None and changed:
+        versions.bump(changed)
+    return len(users), len(unlocks), scanned - started, time.perf_counter() - scanned
+
+
+def main():
+    from phonics_profiles import VersionTable
+    from phonics_storage import PhonicsStorage, DEFAULT_DB_PATH
+
+    parser = argparse.ArgumentParser(description="Levels and achievements")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help="print the levels and achievement rules")
+    backfill_parser = sub.add_parser('backfill', help="rebuild counters, unlocks and levels from all progress")
+    backfill_parser.add_argument('--versions', help="version slots file the apps read "
+                                                    "(default: next to --db; when sharded, next to the directory)")
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for name, points in LEVELS:
+            print(f"level {name:<12} {points:>6} points")
+        for achievement in ACHIEVEMENTS:
+            print(f"{achievement.icon} {achievement.key:<16} {achievement.description}")
+        return
+    storage = PhonicsStorage(args.db)
+    versions = VersionTable(args.versions or storage.db_path + '-versions')
+    users, unlocks, scan, write = backfill(storage, versions)
+    print(f"backfilled {users} users, {unlocks} new achievements: scan {scan:.2f}s, write {write:.2f}s")
+    versions.close()
+    storage.close()
+
+
+if __name__ == '__main__':
+    main()
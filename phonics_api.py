@@ -0,0 +1,357 @@
+# phonics_api.py - Headless JSON API for kiosks and native clients
+#
+#     pip install uvicorn
+#     python phonics_api.py serve --port 8600        (or: uvicorn phonics_api:app)
+#     python phonics_api.py bench --events 20000 --batch 50
+#
+# A plain ASGI app with no framework underneath, sharing PhonicsServices with the
+# Streamlit UI: the same storage, journal, caches and practice queues. Progress is
+# queued in the write-behind journal, so a request returns before anything touches
+# SQLite; clients should hold a keep-alive connection and post results in batches.
+#
+#   GET  /health                          {"ok": true}
+#   POST /users                           {"name", "theme", "classroom"}    -> 201
+#   GET  /leaderboard?limit=5&page=0      [{"name", "points", "level", "stars"}, ...]
+#   GET  /users/{name}                    {"name", "points", "stars", "level", "achievements"}
+#   GET  /users/{name}/next?activity=letter_sounds&exclude=A
+#                                         {"item": "B", "sound": "buh"}
+#   POST /progress                        {"events": [{"user", "activity", "content",
+#                                           "score", "time_spent"}, ...]}
+#                                         -> {"accepted": n, "rejected": [...]}
+#                                         content is required; for letter_sounds it is a letter
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from urllib.parse import parse_qs, unquote
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+MAX_BATCH_EVENTS = 1000
+MAX_NAME_LENGTH = 40
+MAX_LEADERBOARD_LIMIT = 100
+
+
+class ApiError(Exception):
+    """Turned into a JSON error response with this status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json_response(status, payload):
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    return status, headers, body
+
+
+def _int(value, name, low, high):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} must be an integer")
+    if not low <= number <= high:
+        raise ApiError(400, f"{name} must be between {low} and {high}")
+    return number
+
+
+def _name(value):
+    if not isinstance(value, str) or not value.strip():
+        raise ApiError(400, "name is required")
+    name = value.strip()
+    if len(name) > MAX_NAME_LENGTH:
+        raise ApiError(400, f"name is longer than {MAX_NAME_LENGTH} characters")
+    return name
+
+
+class PhonicsApi:
+    """Routes requests to PhonicsServices; blocking work runs on the default thread pool"""
+
+    def __init__(self, services=None):
+        self._services = services
+
+    @property
+    def services(self):
+        if self._services is None:
+            from phonics_services import PhonicsServices
+            self._services = PhonicsServices()
+        return self._services
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            status, headers, body = await self._handle(scope, receive)
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Open storage and compile the packs before the first request arrives
+                await asyncio.to_thread(lambda: self.services.content.get('letters'))
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._services is not None:
+                    await asyncio.to_thread(self._services.journal.close)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _handle(self, scope, receive):
+        method = scope['method']
+        parts = [unquote(part) for part in scope['path'].strip('/').split('/')]
+        query = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+        try:
+            if parts == ['health'] and method == 'GET':
+                return _json_response(200, {'ok': True})
+            if parts == ['users'] and method == 'POST':
+                data = await self._read_json(receive)
+                return await asyncio.to_thread(self.create_user, data)
+            if parts == ['leaderboard'] and method == 'GET':
+                return await asyncio.to_thread(self.leaderboard, query)
+            if len(parts) == 2 and parts[0] == 'users' and method == 'GET':
+                return await asyncio.to_thread(self.profile, parts[1])
+            if len(parts) == 3 and parts[0] == 'users' and parts[2] == 'next' and method == 'GET':
+                return await asyncio.to_thread(self.next_item, parts[1], query)
+            if parts == ['progress'] and method == 'POST':
+                data = await self._read_json(receive)
+                return await asyncio.to_thread(self.record_progress, data)
+            raise ApiError(404, "not found")
+        except ApiError as e:
+            status, headers, body = _json_response(e.status, {'error': e.message})
+            if e.status == 503:
+                headers.append((b'retry-after', b'1'))
+            return status, headers, body
+        except Exception:
+            # Anything else is a bug; keep the server up and the client on JSON
+            logger.exception("Unhandled error in %s %s", method, scope['path'])
+            return _json_response(500, {'error': "internal error"})
+
+    async def _read_json(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise ApiError(400, "client disconnected")
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise ApiError(413, f"request body is over {MAX_BODY_BYTES} bytes")
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                break
+        try:
+            return json.loads(b''.join(chunks) or b'null')
+        except ValueError:
+            raise ApiError(400, "request body is not valid JSON")
+
+    # Endpoints, run off the event loop
+
+    def create_user(self, data):
+        """Same as the character picker's create button"""
+        if not isinstance(data, dict):
+            raise ApiError(400, "expected a JSON object")
+        name = _name(data.get('name'))
+        theme = data.get('theme', 'rainbow')
+        if theme not in self.services.content.get('themes').themes:
+            raise ApiError(400, f"unknown theme {theme!r}")
+        classroom = data.get('classroom')
+        if classroom is not None and (not isinstance(classroom, str) or not classroom.strip()):
+            raise ApiError(400, "classroom must be a non-empty string")
+        classroom = classroom.strip() if classroom else None
+        try:
+            user_id = self.services.create_user(name, theme, 'letter_sounds', classroom)
+        except sqlite3.IntegrityError:
+            raise ApiError(409, f"{name!r} already exists")
+        return _json_response(201, {'id': user_id, 'name': name, 'theme': theme, 'classroom': classroom})
+
+    def leaderboard(self, query):
+        limit = _int(query.get('limit', 5), 'limit', 1, MAX_LEADERBOARD_LIMIT)
+        page = _int(query.get('page', 0), 'page', 0, 1 << 20)
+        rows = self.services.leaderboard.page(page, limit) if page else self.services.leaderboard.top(limit)
+        return _json_response(200, [
+            {'name': name, 'points': points, 'level': level, 'stars': stars}
+            for name, points, level, stars in rows
+        ])
+
+    def profile(self, name):
+        profile = self.services.profiles.get(name)
+        if profile is None:
+            raise ApiError(404, f"no user {name!r}")
+        return _json_response(200, {'name': profile.name, 'points': profile.points,
+                                    'stars': profile.stars, 'level': profile.level,
+                                    'achievements': list(profile.achievements)})
+
+    def next_item(self, name, query):
+        activity = query.get('activity', 'letter_sounds')
+        items = self.services.items(activity)
+        if not items:
+            raise ApiError(400, f"{activity!r} has no practice queue")
+        if self.services.profiles.get(name) is None:
+            raise ApiError(404, f"no user {name!r}")
+        item = self.services.next_item(name, activity, exclude=query.get('exclude'))
+        sounds = self.services.content.get('letters').sounds
+        return _json_response(200, {'item': item, 'sound': sounds.get(item)})
+
+    def record_progress(self, data):
+        """Queue a batch of results; events that fail validation are reported by index"""
+        events = data.get('events') if isinstance(data, dict) and 'events' in data else [data]
+        if not isinstance(events, list) or not events:
+            raise ApiError(400, "expected {\"events\": [...]} or one event object")
+        if len(events) > MAX_BATCH_EVENTS:
+            raise ApiError(413, f"at most {MAX_BATCH_EVENTS} events per request")
+
+        services = self.services
+        known = {}
+        # Items each scheduled activity accepts, looked up once per request
+        items = {}
+        valid = []
+        rejected = []
+        for index, event in enumerate(events):
+            try:
+                if not isinstance(event, dict):
+                    raise ApiError(400, "event must be an object")
+                name = _name(event.get('user'))
+                activity = event.get('activity')
+                if not isinstance(activity, str) or not activity:
+                    raise ApiError(400, "activity is required")
+                content = event.get('content')
+                if not isinstance(content, str) or not content:
+                    raise ApiError(400, "content is required")
+                if activity not in items:
+                    items[activity] = frozenset(services.items(activity))
+                if items[activity] and content not in items[activity]:
+                    raise ApiError(400, f"{content!r} is not an item of {activity!r}")
+                score = _int(event.get('score', 0), 'score', 0, 1000)
+                time_spent = _int(event.get('time_spent', 0), 'time_spent', 0, 86400)
+                if name not in known:
+                    known[name] = services.profiles.get(name) is not None
+                if not known[name]:
+                    raise ApiError(404, f"no user {name!r}")
+            except ApiError as e:
+                rejected.append({'index': index, 'error': e.message})
+                continue
+            valid.append((index, name, activity, content, score, time_spent))
+
+        # Refuse the whole batch while the writer catches up, rather than drop part of it
+        if len(valid) > services.journal.room():
+            raise ApiError(503, "progress journal is full, retry shortly")
+        accepted = 0
+        for index, name, activity, content, score, time_spent in valid:
+            if services.record_progress(name, activity, content, score, time_spent):
+                accepted += 1
+            else:
+                rejected.append({'index': index, 'error': "progress journal is full, retry shortly"})
+        status = 200 if accepted or not rejected else 400
+        return _json_response(status, {'accepted': accepted, 'rejected': rejected})
+
+
+app = PhonicsApi()
+
+
+# Benchmark: drive the app in-process, as a server would, without a network in the way
+
+async def _call(api, method, path, payload=None, query=b''):
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await api({'type': 'http', 'method': method, 'path': path, 'query_string': query}, receive, send)
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+
+async def _bench(api, users, events, batch, concurrency):
+    names = [f'api-bench-{i}' for i in range(users)]
+    for name in names:
+        await _call(api, 'POST', '/users', {'name': name})
+    letters = api.services.items('letter_sounds')
+    requests = [
+        [{'user': names[(start + i) % users], 'activity': 'letter_sounds',
+          'content': letters[(start + i) % len(letters)], 'score': 5, 'time_spent': 1}
+         for i in range(min(batch, events - start))]
+        for start in range(0, events, batch)
+    ]
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    latencies = []
+
+    async def client():
+        while not queue.empty():
+            request = queue.get_nowait()
+            started = time.perf_counter()
+            status, result = await _call(api, 'POST', '/progress', {'events': request})
+            while status == 503:
+                await asyncio.sleep(0.05)
+                status, result = await _call(api, 'POST', '/progress', {'events': request})
+            latencies.append(time.perf_counter() - started)
+            if status != 200 or result['rejected']:
+                raise RuntimeError(f"progress request failed: {status} {result}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    accepted = time.perf_counter() - started
+    await asyncio.to_thread(api.services.journal.flush)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(f"{events} events in {len(requests)} requests of {batch} over {concurrency} clients: "
+          f"accepted at {events / accepted:,.0f} events/s, written at {events / elapsed:,.0f} events/s")
+    print(f"request latency p50 {latencies[len(latencies) // 2] * 1000:.2f} ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+
+    started = time.perf_counter()
+    for i in range(1000):
+        await _call(api, 'GET', f'/users/{names[i % users]}')
+    print(f"profile reads: {1000 / (time.perf_counter() - started):,.0f}/s")
+    started = time.perf_counter()
+    for i in range(1000):
+        await _call(api, 'GET', f'/users/{names[i % users]}/next', query=b'activity=letter_sounds')
+    print(f"next-item reads: {1000 / (time.perf_counter() - started):,.0f}/s")
+    api.services.journal.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON API for kiosks and native clients")
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help="run under uvicorn")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8600)
+    serve.add_argument('--keep-alive', type=int, default=30, help="seconds an idle connection stays open")
+    bench = sub.add_parser('bench', help="measure throughput in-process against a scratch database")
+    bench.add_argument('--users', type=int, default=30)
+    bench.add_argument('--events', type=int, default=20000)
+    bench.add_argument('--batch', type=int, default=50, help="events per request")
+    bench.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        try:
+            import uvicorn
+        except ImportError:
+            raise SystemExit("phonics_api needs an ASGI server: pip install uvicorn")
+        uvicorn.run(app, host=args.host, port=args.port, timeout_keep_alive=args.keep_alive)
+    else:
+        import os
+        import tempfile
+        from phonics_services import PhonicsServices
+
+        workdir = tempfile.mkdtemp(prefix='phonics-api-bench-')
+        services = PhonicsServices(os.path.join(workdir, 'phonics.db'))
+        services.content.cache_dir = os.path.join(workdir, 'content_cache')
+        asyncio.run(_bench(PhonicsApi(services), args.users, args.events, args.batch, args.concurrency))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+# phonics_assets.py - Local asset pipeline: content-hashed static files served by Streamlit
+#
+# Build the bundle with:
+#     python phonics_assets.py build
+# Source files live under assets/ (fonts/, images/, sounds/). The build copies them
+# into static/ with content-hashed names and writes static/manifest.json. Streamlit
+# serves static/ at app/static/ when server.enableStaticServing is on, so the app
+# never fetches fonts or media from a third party at render time. The Comic Neue
+# sources (SIL Open Font License) go in assets/fonts/; until they are bundled, text
+# uses the local 'Comic Sans MS', cursive fallback in the stylesheet.
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import string
+
+try:
+    from fontTools import subset as font_subset
+except ImportError:  # Optional: fonts are copied whole when fontTools is missing
+    font_subset = None
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(APP_DIR, 'assets')
+STATIC_DIR = os.path.join(APP_DIR, 'static')
+MANIFEST_NAME = 'manifest.json'
+STATIC_URL = 'app/static'
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.woff', '.woff2')
+
+# Glyphs the app renders in Comic Neue; emoji come from the system emoji font
+FONT_GLYPHS = string.ascii_letters + string.digits + string.punctuation + ' ’…'
+
+# Comic Neue weights, keyed by the source file stem
+FONT_FACES = {
+    'ComicNeue-Regular': ('Comic Neue', 400),
+    'ComicNeue-Bold': ('Comic Neue', 700),
+}
+
+
+def content_hash(path, length=10):
+    """Return a short SHA-256 digest of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()[:length]
+
+
+def subset_font(source, target, glyphs=FONT_GLYPHS):
+    """Write a copy of a font reduced to the given glyphs, as woff2 when possible"""
+    options = font_subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = ['*']
+    font = font_subset.load_font(source, options)
+    subsetter = font_subset.Subsetter(options)
+    subsetter.populate(text=glyphs)
+    subsetter.subset(font)
+    try:
+        font_subset.save_font(font, target, options)
+    except ImportError:
+        # woff2 needs brotli; fall back to an uncompressed subset
+        options.flavor = None
+        target = os.path.splitext(target)[0] + '.ttf'
+        font_subset.save_font(font, target, options)
+    return target
+
+
+def build(assets_dir=ASSETS_DIR, static_dir=STATIC_DIR):
+    """Copy every asset into static_dir under a content-hashed name and write the manifest"""
+    os.makedirs(static_dir, exist_ok=True)
+    manifest = {}
+    for root, _, files in os.walk(assets_dir):
+        for filename in sorted(files):
+            source = os.path.join(root, filename)
+            logical = os.path.relpath(source, assets_dir).replace(os.sep, '/')
+            stem, ext = os.path.splitext(filename)
+            out_dir = os.path.join(static_dir, os.path.dirname(logical))
+            os.makedirs(out_dir, exist_ok=True)
+
+            if ext.lower() in FONT_EXTENSIONS and font_subset is not None:
+                staged = subset_font(source, os.path.join(out_dir, f'{stem}.subset.woff2'))
+                ext = os.path.splitext(staged)[1]
+            else:
+                staged = os.path.join(out_dir, f'{stem}.staged{ext}')
+                shutil.copyfile(source, staged)
+
+            hashed = os.path.join(out_dir, f'{stem}.{content_hash(staged)}{ext}')
+            os.replace(staged, hashed)
+            manifest[logical] = os.path.relpath(hashed, static_dir).replace(os.sep, '/')
+
+    with open(os.path.join(static_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def clean(static_dir=STATIC_DIR):
+    """Remove hashed files that the current manifest no longer references"""
+    manifest = load_manifest(static_dir)
+    keep = set(manifest.values()) | {MANIFEST_NAME}
+    removed = []
+    for root, _, files in os.walk(static_dir):
+        for filename in files:
+            relative = os.path.relpath(os.path.join(root, filename), static_dir).replace(os.sep, '/')
+            if relative not in keep:
+                os.remove(os.path.join(root, filename))
+                removed.append(relative)
+    return removed
+
+
+def load_manifest(static_dir=STATIC_DIR):
+    """Read the asset manifest, or an empty one when the bundle has not been built"""
+    try:
+        with open(os.path.join(static_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def asset_url(manifest, logical_name):
+    """Return the served URL for an asset, or None if it is not in the bundle"""
+    hashed = manifest.get(logical_name)
+    return f'{STATIC_URL}/{hashed}' if hashed else None
+
+
+def font_face_css(manifest):
+    """Build @font-face rules for every bundled Comic Neue file"""
+    formats = {'.woff2': 'woff2', '.woff': 'woff', '.ttf': 'truetype', '.otf': 'opentype'}
+    rules = []
+    for logical, hashed in sorted(manifest.items()):
+        stem, _ = os.path.splitext(os.path.basename(logical))
+        if stem not in FONT_FACES:
+            continue
+        family, weight = FONT_FACES[stem]
+        fmt = formats.get(os.path.splitext(hashed)[1].lower(), 'truetype')
+        rules.append(
+            f"@font-face {{ font-family: '{family}'; font-weight: {weight}; font-display: swap; "
+            f"src: url('{STATIC_URL}/{hashed}') format('{fmt}'); }}"
+        )
+    if not rules:
+        return ''
+    return '<style>' + ' '.join(rules) + '</style>'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the phonics app static asset bundle")
+    parser.add_argument('command', choices=['build', 'clean'])
+    parser.add_argument('--assets', default=ASSETS_DIR)
+    parser.add_argument('--static', default=STATIC_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        manifest = build(args.assets, args.static)
+        for logical, hashed in sorted(manifest.items()):
+            print(f"{logical} -> {hashed}")
+        if not any(os.path.splitext(os.path.basename(logical))[0] in FONT_FACES for logical in manifest):
+            print("no Comic Neue files in assets/fonts/: text uses the local fallback fonts")
+        if font_subset is None:
+            print("fontTools not installed: fonts were copied without subsetting")
+    else:
+        for relative in clean(args.static):
+            print(f"removed {relative}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+# phonics_bench.py - Headless classroom load test for the phonics app
+#
+# Drives the real app script with Streamlit's app-testing API. Each simulated child
+# walks splash -> user_selection -> welcome -> main_menu -> letter_sounds and clicks
+# speak_letter / next_letter with a think time between clicks. Example:
+#     python phonics_bench.py --children 30 --clicks 20 --output bench.json
+#     python phonics_bench.py --children 30 --compare bench.json
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(APP_DIR, 'phonics_web_app.py')
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds"""
+    return {
+        'count': len(samples),
+        'p50_ms': _ms(percentile(samples, 50)),
+        'p95_ms': _ms(percentile(samples, 95)),
+        'p99_ms': _ms(percentile(samples, 99)),
+        'max_ms': _ms(max(samples) if samples else None),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000.0, 3)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return round(peak / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0), 1)
+
+
+class Recorder:
+    """Latencies and error counts gathered inside one worker process"""
+
+    def __init__(self):
+        self.screens = defaultdict(list)
+        self.db_writes = []
+        self.lock_errors = 0
+        self.app_errors = []
+        self.journals = []
+
+    def rerun(self, screen, seconds):
+        self.screens[screen].append(seconds)
+
+    def db_write(self, seconds):
+        self.db_writes.append(seconds)
+
+    def lock_error(self):
+        self.lock_errors += 1
+
+    def app_error(self, message):
+        self.app_errors.append(message)
+
+    def as_dict(self):
+        """Picklable raw samples for merging in the parent process"""
+        journal = self.journals[0].stats() if self.journals else {}
+        return {
+            'screens': dict(self.screens),
+            'db_writes': self.db_writes,
+            'lock_errors': self.lock_errors,
+            'app_errors': self.app_errors,
+            'journal': journal,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+
+def instrument_storage(recorder):
+    """Time every storage write transaction and count SQLite lock errors"""
+    from phonics_journal import ProgressJournal
+    from phonics_storage import PhonicsStorage
+
+    def timed(method):
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if 'locked' in str(e) or 'busy' in str(e):
+                    recorder.lock_error()
+                raise
+            finally:
+                recorder.db_write(time.perf_counter() - start)
+        return wrapper
+
+    for name in ('record_progress', 'record_progress_batch', 'create_user'):
+        setattr(PhonicsStorage, name, timed(getattr(PhonicsStorage, name)))
+
+    # Remember the app's journal so the run can wait for it to drain
+    original_init = ProgressJournal.__init__
+
+    def tracking_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        recorder.journals.append(self)
+
+    ProgressJournal.__init__ = tracking_init
+
+
+class Child:
+    """One simulated child driving its own app session"""
+
+    def __init__(self, index, recorder, clicks, think_time, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.name = f"bench-child-{index}"
+        self.recorder = recorder
+        self.clicks = clicks
+        self.think_time = think_time
+        self.rng = random.Random(index)
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    def _run(self, action=None):
+        start = time.perf_counter()
+        (action or self.app).run()
+        elapsed = time.perf_counter() - start
+        for exc in self.app.exception:
+            self.recorder.app_error(exc.message)
+        for error in self.app.error:
+            message = str(error.value)
+            if 'locked' in message or 'busy' in message:
+                self.recorder.lock_error()
+            self.recorder.app_error(message)
+        self.recorder.rerun(self.app.session_state['session'].screen, elapsed)
+
+    def _think(self):
+        """Seconds until this child's next click"""
+        return self.rng.uniform(0.5, 1.5) * self.think_time if self.think_time else 0.0
+
+    def play(self):
+        """Generator of reruns; yields the think time before the next one"""
+        self._run()
+        if self.app.session_state['session'].screen == 'splash':
+            yield self._think()
+            self._run(self.app.button(key='enter_kingdom').click())
+        yield self._think()
+        self.app.text_input(key='new_user_input').input(self.name)
+        self._run(self.app.button(key='create_user').click())
+        yield self._think()
+        self._run(self.app.button(key='start_learning').click())
+        yield self._think()
+        self._run(self.app.button(key='activity_letter_sounds').click())
+        for _ in range(self.clicks):
+            yield self._think()
+            key = 'speak_letter' if self.rng.random() < 0.7 else 'next_letter'
+            self._run(self.app.button(key=key).click())
+        yield self._think()
+        self._run(self.app.button(key='back_to_menu').click())
+
+
+def run_worker(workdir, child_indices, children, clicks, think_time, timeout, ramp):
+    """Interleave several children in one process, each rerun at its scheduled time
+
+    AppTest drives one script run at a time per process, so concurrency comes from
+    worker processes sharing one database, like app workers on a node.
+    """
+    os.chdir(workdir)
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    recorder = Recorder()
+    instrument_storage(recorder)
+
+    started = time.monotonic()
+    schedule = [(started + ramp * index / max(children, 1), index, None) for index in child_indices]
+    heapq.heapify(schedule)
+    while schedule:
+        due, index, steps = heapq.heappop(schedule)
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            if steps is None:
+                steps = Child(index, recorder, clicks, think_time, timeout).play()
+            think = next(steps)
+        except StopIteration:
+            continue
+        except Exception as e:
+            recorder.app_error(f"{type(e).__name__}: {e}")
+            continue
+        heapq.heappush(schedule, (time.monotonic() + think, index, steps))
+
+    for journal in recorder.journals:
+        journal.flush()
+    return recorder.as_dict()
+
+
+def run_benchmark(children, clicks, think_time, timeout, ramp, workers, workdir):
+    """Run a classroom of concurrent children across worker processes and merge the results"""
+    workers = max(1, min(workers, children))
+    assignments = [list(range(worker, children, workers)) for worker in range(workers)]
+    context = multiprocessing.get_context('spawn')
+
+    started = time.perf_counter()
+    with context.Pool(workers) as pool:
+        parts = pool.starmap(run_worker, [
+            (workdir, indices, children, clicks, think_time, timeout, ramp) for indices in assignments
+        ])
+    wall = time.perf_counter() - started
+
+    screens = defaultdict(list)
+    db_writes = []
+    app_errors = []
+    for part in parts:
+        for screen, samples in part['screens'].items():
+            screens[screen].extend(samples)
+        db_writes.extend(part['db_writes'])
+        app_errors.extend(part['app_errors'])
+    journal = defaultdict(int)
+    for part in parts:
+        for key, value in part['journal'].items():
+            journal[key] += value
+
+    reruns = sum(len(samples) for samples in screens.values())
+    return {
+        'config': {'children': children, 'clicks': clicks, 'think_time': think_time, 'ramp': ramp,
+                   'workers': workers},
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'wall_s': round(wall, 3),
+        'reruns': reruns,
+        'reruns_per_s': round(reruns / wall, 2) if wall else None,
+        'screens': {screen: summarize(samples) for screen, samples in sorted(screens.items())},
+        'sqlite_write': summarize(db_writes),
+        'journal': dict(journal),
+        'lock_errors': sum(part['lock_errors'] for part in parts),
+        'app_errors': len(app_errors),
+        'app_error_samples': app_errors[:5],
+        'peak_rss_mb': max(part['peak_rss_mb'] for part in parts),
+        'total_peak_rss_mb': round(sum(part['peak_rss_mb'] for part in parts), 1),
+    }
+
+
+def git_commit():
+    """Current commit of the app, for comparing result files"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current):
+    """Print p95 changes per screen between two result files"""
+    print(f"\nComparison against {baseline.get('commit')}:")
+    for screen, stats in current['screens'].items():
+        before = baseline.get('screens', {}).get(screen)
+        if not before or not before.get('p95_ms') or stats['p95_ms'] is None:
+            continue
+        change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100.0
+        print(f"  {screen:<16} p95 {before['p95_ms']:>9.2f} -> {stats['p95_ms']:>9.2f} ms ({change:+.1f}%)")
+    print(f"  peak RSS {baseline.get('peak_rss_mb')} -> {current['peak_rss_mb']} MiB")
+
+
+def print_report(results):
+    print(f"{results['config']['children']} children on {results['config']['workers']} workers, "
+          f"{results['reruns']} reruns in {results['wall_s']}s "
+          f"({results['reruns_per_s']}/s)")
+    print(f"{'screen':<16} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = list(results['screens'].items()) + [('sqlite_write', results['sqlite_write'])]
+    for name, stats in rows:
+        print(f"{name:<16} {stats['count']:>6} {stats['p50_ms'] or 0:>9.2f} "
+              f"{stats['p95_ms'] or 0:>9.2f} {stats['p99_ms'] or 0:>9.2f}")
+    print(f"lock errors: {results['lock_errors']}  app errors: {results['app_errors']}  "
+          f"peak RSS per worker: {results['peak_rss_mb']} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a classroom of concurrent sessions")
+    parser.add_argument('--children', type=int, default=10)
+    parser.add_argument('--clicks', type=int, default=20, help="letter activity clicks per child")
+    parser.add_argument('--think-time', type=float, default=0.2, help="mean seconds between clicks")
+    parser.add_argument('--ramp', type=float, default=1.0, help="seconds over which children arrive")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="worker processes sharing the database")
+    parser.add_argument('--timeout', type=float, default=30.0, help="per-rerun timeout in seconds")
+    parser.add_argument('--output', help="write machine-readable results to this JSON file")
+    parser.add_argument('--compare', help="baseline results file to compare against")
+    parser.add_argument('--workdir', help="directory for the benchmark database (default: a temp dir)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix='phonics-bench-'))
+
+    results = run_benchmark(args.children, args.clicks, args.think_time, args.timeout, args.ramp,
+                            args.workers, workdir)
+    print_report(results)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if baseline:
+        with open(baseline) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# phonics_config.py - Deployment settings read from the environment
+import os
+
+# Directory of the app's modules; default paths to shipped files resolve against it
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def env_flag(name, default=False):
+    """Read a boolean environment variable such as PHONICS_SKIP_SPLASH=1"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Skip the splash screen entirely (kiosk deployments)
+SKIP_SPLASH = env_flag('PHONICS_SKIP_SPLASH')
+
+# Offline text-to-speech voice and on-disk clip cache
+TTS_VOICE = os.environ.get('PHONICS_TTS_VOICE', 'en-us')
+AUDIO_CACHE_DIR = os.environ.get('PHONICS_AUDIO_CACHE_DIR', 'audio_cache')
+AUDIO_CACHE_BYTES = int(os.environ.get('PHONICS_AUDIO_CACHE_MB', '64')) * 1024 * 1024
+
+# Timing instrumentation: histograms, /metrics endpoint or textfile, debug overlay
+METRICS_ENABLED = env_flag('PHONICS_METRICS')
+METRICS_PORT = int(os.environ.get('PHONICS_METRICS_PORT', '0'))
+METRICS_FILE = os.environ.get('PHONICS_METRICS_FILE')
+DEBUG_OVERLAY = env_flag('PHONICS_DEBUG_OVERLAY')
+
+# Where compaction writes archived raw progress (date-partitioned gzip NDJSON)
+ARCHIVE_DIR = os.environ.get('PHONICS_ARCHIVE_DIR', 'archive')
+
+# Content packs: source directory, compiled word-list cache, and how often to check for edits
+CONTENT_DIR = os.environ.get('PHONICS_CONTENT_DIR', os.path.join(APP_DIR, 'content'))
+CONTENT_CACHE_DIR = os.environ.get('PHONICS_CONTENT_CACHE_DIR', os.path.join(APP_DIR, 'content_cache'))
+CONTENT_RELOAD_SECONDS = float(os.environ.get('PHONICS_CONTENT_RELOAD_SECONDS', '2'))
+
+# Sharded storage: path to a shards.json naming the shard databases (unset: one database)
+SHARD_CONFIG = os.environ.get('PHONICS_SHARDS')
+
+# Touched once the process has warmed up (exec readiness probe); unset: no file
+READY_FILE = os.environ.get('PHONICS_READY_FILE')
+
+# Session state: unset keeps it in each worker; a SQLite path shares it between workers
+SESSION_STORE = os.environ.get('PHONICS_SESSION_STORE')
+SESSION_TTL_HOURS = float(os.environ.get('PHONICS_SESSION_TTL_HOURS', '12'))
@@ -0,0 +1,300 @@
+# phonics_content.py - Content packs on disk, validated and compiled once per process
+#
+#     python phonics_content.py check
+#
+# Each pack is one file under content/: themes.json, letters.json, phonemes.json,
+# blends.json and words.tsv. Packs are compiled the first time an activity asks for
+# them into read-only objects shared by every session, and recompiled when their file
+# changes. Word lists compile to a sorted, offset-indexed binary in content_cache/
+# that workers memory-map, so a large dictionary lives once in the page cache.
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from types import MappingProxyType
+
+from phonics_config import CONTENT_DIR, CONTENT_CACHE_DIR, CONTENT_RELOAD_SECONDS
+from phonics_styles import THEME_KEYS
+
+logger = logging.getLogger(__name__)
+
+_COLOR = re.compile(r'^#[0-9A-Fa-f]{6}$')
+_WORD = re.compile(r"^[a-z']+$")
+_WORDS_HEADER = struct.Struct('<4sII')
+_WORDS_MAGIC = b'PHWL'
+_WORDS_VERSION = 1
+
+
+class ContentError(ValueError):
+    """A content pack is malformed"""
+
+
+class ThemePack:
+    """Theme colours, chooser labels and mascot messages"""
+
+    __slots__ = ('themes', 'names', 'labels', 'mascot_messages')
+
+    def __init__(self, themes, labels, mascot_messages):
+        self.themes = MappingProxyType({name: MappingProxyType(colors) for name, colors in themes.items()})
+        self.names = tuple(themes)
+        self.labels = MappingProxyType({name: labels.get(name, name.title()) for name in themes})
+        self.mascot_messages = tuple(mascot_messages)
+
+
+class SoundPack:
+    """Graphemes (letters, phonemes or blends) and the sound each one makes"""
+
+    __slots__ = ('sounds', 'items')
+
+    def __init__(self, sounds):
+        self.sounds = MappingProxyType(dict(sounds))
+        self.items = tuple(sounds)
+
+
+class WordList:
+    """Memory-mapped, sorted word list; records are decoded only when read
+
+    File layout: header (magic, version, count), count + 1 native uint32 offsets,
+    then UTF-8 records "word<TAB>grapheme grapheme ...".
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = _WORDS_HEADER.unpack_from(self._map, 0)
+        if magic != _WORDS_MAGIC or version != _WORDS_VERSION:
+            raise ContentError(f"{path} is not a compiled word list")
+        self._count = count
+        index_end = _WORDS_HEADER.size + 4 * (count + 1)
+        self._offsets = memoryview(self._map)[_WORDS_HEADER.size:index_end].cast('I')
+        self._base = index_end
+
+    def _record(self, i):
+        return self._map[self._base + self._offsets[i]:self._base + self._offsets[i + 1]]
+
+    def _key(self, i):
+        record = self._record(i)
+        return record[:record.index(b'\t')]
+
+    def word(self, i):
+        return self._key(i).decode('utf-8')
+
+    def __getitem__(self, i):
+        """Return (word, graphemes) for the i-th word in sorted order"""
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        word, graphemes = self._record(i).decode('utf-8').split('\t')
+        return word, tuple(graphemes.split(' '))
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+    def _bisect(self, key):
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def index(self, word):
+        """Position of word, or -1"""
+        key = word.encode('utf-8')
+        i = self._bisect(key)
+        return i if i < self._count and self._key(i) == key else -1
+
+    def __contains__(self, word):
+        return self.index(word) >= 0
+
+    def prefix_range(self, prefix):
+        """Return (start, stop) covering every word that starts with prefix"""
+        key = prefix.encode('utf-8')
+        return self._bisect(key), self._bisect(key + b'\xff')
+
+
+def _require(condition, message):
+    if not condition:
+        raise ContentError(message)
+
+
+def compile_themes(data):
+    themes = data.get('themes')
+    _require(isinstance(themes, dict) and themes, "themes.json needs a non-empty 'themes' object")
+    for name, colors in themes.items():
+        _require(isinstance(colors, dict) and set(colors) == set(THEME_KEYS),
+                 f"theme {name!r} needs exactly the colours {', '.join(THEME_KEYS)}")
+        for key, color in colors.items():
+            _require(isinstance(color, str) and _COLOR.match(color), f"theme {name!r} {key} is not #RRGGBB")
+    labels = data.get('labels', {})
+    _require(isinstance(labels, dict) and all(isinstance(v, str) for v in labels.values()),
+             "labels must map theme names to strings")
+    messages = data.get('mascot_messages', [])
+    _require(isinstance(messages, list) and all(isinstance(m, str) and m for m in messages),
+             "mascot_messages must be a list of strings")
+    return ThemePack(themes, labels, messages)
+
+
+def _sound_compiler(section, pattern):
+    def compile_sounds(data):
+        sounds = data.get(section)
+        _require(isinstance(sounds, dict) and sounds, f"{section} pack needs a non-empty {section!r} object")
+        for grapheme, sound in sounds.items():
+            _require(re.match(pattern, grapheme), f"{section}: {grapheme!r} is not a valid entry")
+            _require(isinstance(sound, str) and sound.strip(), f"{section}: {grapheme!r} has no sound")
+        return SoundPack(sounds)
+    return compile_sounds
+
+
+def compile_word_list(source, target, graphemes=None):
+    """Validate a word<TAB>graphemes TSV and write the indexed binary to target"""
+    entries = {}
+    with open(source, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            word, _, spelled = line.partition('\t')
+            parts = spelled.split()
+            _require(_WORD.match(word), f"{source}:{number}: {word!r} is not a lowercase word")
+            _require(''.join(parts) == word, f"{source}:{number}: graphemes {spelled!r} do not spell {word!r}")
+            _require(word not in entries, f"{source}:{number}: {word!r} is listed twice")
+            if graphemes is not None:
+                unknown = [part for part in parts if part not in graphemes]
+                _require(not unknown, f"{source}:{number}: unknown graphemes {unknown} in {word!r}")
+            entries[word] = ' '.join(parts)
+
+    records = [f"{word}\t{entries[word]}".encode('utf-8') for word in sorted(entries, key=lambda w: w.encode('utf-8'))]
+    offsets = array('I', [0])
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+    staged = f"{target}.{os.getpid()}.tmp"
+    with open(staged, 'wb') as f:
+        f.write(_WORDS_HEADER.pack(_WORDS_MAGIC, _WORDS_VERSION, len(records)))
+        f.write(offsets.tobytes())
+        for record in records:
+            f.write(record)
+    os.replace(staged, target)
+    return len(records)
+
+
+# kind -> (file name, compiler); JSON packs compile from parsed data
+PACKS = {
+    'themes': ('themes.json', compile_themes),
+    'letters': ('letters.json', _sound_compiler('letters', r'^[A-Z]$')),
+    'phonemes': ('phonemes.json', _sound_compiler('phonemes', r'^[a-z]{1,4}$')),
+    'blends': ('blends.json', _sound_compiler('blends', r'^[a-z]{2,3}$')),
+    'words': ('words.tsv', None),
+}
+
+
+class ContentStore:
+    """Lazily compiled packs shared by every session, reloaded when their file changes"""
+
+    def __init__(self, root=CONTENT_DIR, cache_dir=CONTENT_CACHE_DIR, reload_seconds=CONTENT_RELOAD_SECONDS):
+        self.root = root
+        self.cache_dir = cache_dir
+        self.reload_seconds = reload_seconds
+        # Re-entrant: compiling words reads the phonemes pack
+        self._lock = threading.RLock()
+        # kind -> (file signature, pack, monotonic time of the last check)
+        self._packs = {}
+        self.loads = 0
+        self.reloads = 0
+
+    def path(self, kind):
+        return os.path.join(self.root, PACKS[kind][0])
+
+    def get(self, kind):
+        """Return the compiled pack, checking its file at most every reload_seconds"""
+        entry = self._packs.get(kind)
+        now = time.monotonic()
+        if entry is not None and now - entry[2] < self.reload_seconds:
+            return entry[1]
+        with self._lock:
+            entry = self._packs.get(kind)
+            path = self.path(kind)
+            stat = os.stat(path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if entry is not None and entry[0] == signature:
+                self._packs[kind] = (signature, entry[1], now)
+                return entry[1]
+            try:
+                pack = self._compile(kind, path)
+            except (ValueError, OSError):
+                if entry is None:
+                    raise
+                # A bad edit must not take running sessions down; retry once the file changes again
+                logger.exception("Keeping the previous %s pack; %s failed to load", kind, path)
+                self._packs[kind] = (signature, entry[1], now)
+                return entry[1]
+            self._packs[kind] = (signature, pack, now)
+            if entry is None:
+                self.loads += 1
+            else:
+                self.reloads += 1
+            return pack
+
+    def _compile(self, kind, path):
+        if kind == 'words':
+            return self._load_words(path)
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        _require(isinstance(data, dict), f"{path} must hold a JSON object")
+        return PACKS[kind][1](data)
+
+    def _load_words(self, path):
+        """Map the compiled word list, compiling it first if no worker has yet"""
+        with open(path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:16]
+        graphemes = set(self.get('phonemes').items)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        target = os.path.join(self.cache_dir, f"{stem}-{digest}.bin")
+        if not os.path.exists(target):
+            compile_word_list(path, target, graphemes)
+            # Older builds may still be mapped by other workers; unlinking is safe
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(f"{stem}-") and name.endswith('.bin') and name != os.path.basename(target):
+                    os.remove(os.path.join(self.cache_dir, name))
+        return WordList(target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and compile the content packs")
+    parser.add_argument('command', choices=['check'])
+    parser.add_argument('--content-dir', default=CONTENT_DIR)
+    parser.add_argument('--cache-dir', default=CONTENT_CACHE_DIR)
+    args = parser.parse_args()
+
+    store = ContentStore(args.content_dir, args.cache_dir)
+    failed = False
+    for kind in PACKS:
+        try:
+            pack = store.get(kind)
+        except (ValueError, OSError) as e:
+            print(f"{kind}: FAILED {e}")
+            failed = True
+            continue
+        size = len(pack) if isinstance(pack, WordList) else len(getattr(pack, 'items', getattr(pack, 'names', ())))
+        print(f"{kind}: ok, {size} entries")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
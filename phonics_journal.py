@@ -0,0 +1,299 @@
+# phonics_journal.py - Write-behind journal that batches progress writes off the render thread
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+ProgressEvent = namedtuple(
+    'ProgressEvent',
+    ['user_name', 'activity', 'content', 'score', 'time_spent', 'date', 'stars_earned', 'user_id'],
+    defaults=[None]
+)
+
+DEFAULT_MAX_BATCH = 256
+DEFAULT_FLUSH_INTERVAL = 0.25
+DEFAULT_MAX_QUEUED = 10000
+# Backoff while the database is locked by a long writer (backfill, compaction, a shard cut-over)
+RETRY_BACKOFF_START = 0.05
+RETRY_BACKOFF_MAX = 2.0
+# Once closing, how long a locked database is retried before the batch is given up
+CLOSE_RETRY_SECONDS = 5.0
+
+
+def is_transient(error):
+    """True for SQLite errors that go away once the other writer commits"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class ProgressJournal:
+    """Queue progress events in memory and flush them in batches from a background writer"""
+
+    def __init__(self, storage, max_batch=DEFAULT_MAX_BATCH, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_queued=DEFAULT_MAX_QUEUED):
+        self.storage = storage
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._stats_lock = threading.Lock()
+        # Held while a batch is committed and its pending totals settled, so readers
+        # can combine a database row with pending_totals without double counting
+        self.flush_lock = threading.Lock()
+        self._pending = {}
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.retries = 0
+        self._listeners = []
+        self._unlock_listeners = []
+        self._drop_listeners = []
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name='progress-journal', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def record(self, user_name, activity, content, score, time_spent, stars_earned, user_id=None):
+        """Queue one progress event; returns False if it had to be dropped"""
+        event = ProgressEvent(user_name, activity, content, score, time_spent,
+                              datetime.now().isoformat(), stars_earned, user_id)
+        if self._closed:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        # Pending first: the writer may flush the event as soon as it is queued
+        with self._stats_lock:
+            points, stars = self._pending.get(user_name, (0, 0))
+            self._pending[user_name] = (points + score, stars + stars_earned)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._stats_lock:
+                self._settle((event,))
+                self.dropped += 1
+            return False
+        with self._stats_lock:
+            self.queued += 1
+        return True
+
+    def add_listener(self, callback):
+        """Call callback(batch) on the writer thread after each successful flush"""
+        self._listeners.append(callback)
+
+    def add_unlock_listener(self, callback):
+        """Call callback(unlocks) after a flush that earned achievements or level-ups
+
+        unlocks are (user_name, 'achievement' or 'level', key) tuples.
+        """
+        self._unlock_listeners.append(callback)
+
+    def add_drop_listener(self, callback):
+        """Call callback(events) for queued events that could not be written
+
+        They were rejected by the database or name a user it does not have; anything
+        that counted them in advance, like a write-through cache, should let go.
+        """
+        self._drop_listeners.append(callback)
+
+    def pending_totals(self, user_name):
+        """Return (points, stars) queued for a user but not yet written"""
+        with self._stats_lock:
+            return self._pending.get(user_name, (0, 0))
+
+    def room(self):
+        """Events that can be queued right now before the journal starts dropping"""
+        return self._queue.maxsize - self._queue.qsize()
+
+    def stats(self):
+        """Return the journal counters"""
+        with self._stats_lock:
+            return {
+                'queued': self.queued,
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+                'batches': self.batches,
+                'retries': self.retries,
+                'backlog': self._queue.qsize(),
+            }
+
+    def _take_batch(self, timeout):
+        """Block for the first event, then gather up to max_batch within the flush window"""
+        try:
+            first = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _settle(self, events):
+        """Take events out of the pending totals; call with _stats_lock held"""
+        for event in events:
+            points, stars = self._pending.get(event.user_name, (0, 0))
+            points -= event.score
+            stars -= event.stars_earned
+            if points or stars:
+                self._pending[event.user_name] = (points, stars)
+            else:
+                self._pending.pop(event.user_name, None)
+
+    def _commit(self, events, unlocks, skipped, written):
+        """Write events, waiting out a locked database
+
+        Written events are appended to written, and events for users the database
+        does not have to skipped, where they count as dropped. A sharded storage
+        commits per shard, so a failure may leave part of the events committed; only
+        the rest are retried. Returns None once all are settled, or the error that
+        rejected the rest.
+        """
+        delay = RETRY_BACKOFF_START
+        closing_since = None
+        remaining = list(events)
+        while True:
+            # Unlocks and skips of a rolled-back attempt never happened
+            attempt = []
+            missing = []
+            committed = []
+            error = None
+            with self.flush_lock:
+                try:
+                    self.storage.record_progress_batch(remaining, skipped=missing, unlocked=attempt,
+                                                       committed=committed)
+                except Exception as e:
+                    error = e
+                else:
+                    # Everything not skipped is in, whether or not the storage listed it
+                    skipped_ids = {id(event) for event in missing}
+                    committed = [event for event in remaining if id(event) not in skipped_ids]
+                if committed or missing:
+                    self._credit(committed, missing, attempt, unlocks, skipped, written)
+            if missing:
+                logger.warning("Dropping %d progress event(s) for unknown users %s", len(missing),
+                               ', '.join(sorted({event[0] for event in missing})))
+            if error is None:
+                return None
+            if committed or missing:
+                settled = {id(event) for event in committed} | {id(event) for event in missing}
+                remaining = [event for event in remaining if id(event) not in settled]
+                if not remaining:
+                    return None
+            if not is_transient(error):
+                return error
+            if self._closed:
+                closing_since = closing_since or time.monotonic()
+                if time.monotonic() - closing_since > CLOSE_RETRY_SECONDS:
+                    return error
+            with self._stats_lock:
+                self.retries += 1
+            # Sleep without flush_lock so readers are not held up behind the other writer
+            time.sleep(delay)
+            delay = min(delay * 2, RETRY_BACKOFF_MAX)
+
+    def _credit(self, committed, missing, attempt, unlocks, skipped, written):
+        """Settle events the storage has committed or skipped; call with flush_lock held"""
+        unlocks.extend(attempt)
+        skipped.extend(missing)
+        written.extend(committed)
+        with self._stats_lock:
+            self.flushed += len(committed)
+            self.dropped += len(missing)
+            self.batches += 1
+            self._settle(committed)
+            self._settle(missing)
+
+    def _write(self, batch):
+        """Write one batch in a single transaction and settle the counters
+
+        A locked database is retried. If the batch is rejected outright, its events are
+        written one by one so only the events that fail on their own are dropped.
+        """
+        unlocks = []
+        skipped = []
+        written = []
+        error = self._commit(batch, unlocks, skipped, written)
+        dropped = list(skipped)
+        if error is not None:
+            settled = {id(event) for event in written} | {id(event) for event in skipped}
+            rest = [event for event in batch if id(event) not in settled]
+            if len(rest) > 1 and not is_transient(error):
+                for event in rest:
+                    missing = []
+                    event_error = self._commit((event,), unlocks, missing, written)
+                    dropped.extend(missing)
+                    if event_error is not None:
+                        self._reject((event,), event_error)
+                        dropped.append(event)
+            else:
+                self._reject(rest, error)
+                dropped.extend(rest)
+
+        if written:
+            for callback in self._listeners:
+                try:
+                    callback(written)
+                except Exception:
+                    logger.exception("Progress listener %r failed", callback)
+            for callback in self._unlock_listeners if unlocks else ():
+                try:
+                    callback(unlocks)
+                except Exception:
+                    logger.exception("Unlock listener %r failed", callback)
+        for callback in self._drop_listeners if dropped else ():
+            try:
+                callback(dropped)
+            except Exception:
+                logger.exception("Drop listener %r failed", callback)
+
+        for _ in batch:
+            self._queue.task_done()
+
+    def _reject(self, events, error):
+        logger.error("Dropping %d progress event(s) for %s: %s",
+                     len(events), ', '.join(sorted({e.user_name for e in events})), error)
+        with self.flush_lock, self._stats_lock:
+            self.dropped += len(events)
+            self._settle(events)
+
+    def _run(self):
+        """Background writer loop"""
+        while not (self._closed and self._queue.empty()):
+            batch = self._take_batch(timeout=self.flush_interval)
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        """Block until every queued event has been written"""
+        self._queue.join()
+
+    def close(self, timeout=CLOSE_RETRY_SECONDS + 5.0):
+        """Stop accepting events and drain the queue"""
+        if self._closed:
+            return
+        self._closed = True
+        self._writer.join(timeout)
+        # Catch events that raced with shutdown
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            self._write(leftover)
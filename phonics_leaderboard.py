@@ -0,0 +1,92 @@
+# phonics_leaderboard.py - Process-wide cached leaderboard for the character picker
+import threading
+
+DEFAULT_CACHE_SIZE = 50
+
+
+class Leaderboard:
+    """Top-N users by points, cached in memory and kept current from progress writes
+
+    With a VersionTable, the cache also remembers the table's generation when it was
+    loaded. A write from another process (a worker, the API, an import, a backfill or
+    a shard move) moves the generation and the next read reloads the top-N.
+    """
+
+    def __init__(self, storage, versions=None, cache_size=DEFAULT_CACHE_SIZE):
+        self.storage = storage
+        self.versions = versions
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._top = None
+        self._generation = None
+        self.hits = 0
+        self.misses = 0
+
+    def top(self, limit=5):
+        """Return the top users as (name, total_points, level, total_stars) rows"""
+        if limit > self.cache_size:
+            return self.storage.top_users(limit)
+        generation = self.versions.generation() if self.versions is not None else None
+        with self._lock:
+            if self._top is not None and self._generation == generation:
+                self.hits += 1
+                return self._top[:limit]
+        # Read before the query: a write racing with it moves the generation again
+        rows = self.storage.top_users(self.cache_size)
+        with self._lock:
+            self.misses += 1
+            self._top = rows
+            self._generation = generation
+            return rows[:limit]
+
+    def page(self, page, page_size=20):
+        """Return one page of the full leaderboard, served from the cache when it covers it"""
+        offset = page * page_size
+        if offset + page_size <= self.cache_size:
+            cached = self.top(self.cache_size)
+            return cached[offset:offset + page_size]
+        return self.storage.top_users(page_size, offset)
+
+    def search(self, prefix, limit=10):
+        """Find characters by name prefix without loading the whole table"""
+        prefix = prefix.strip()
+        if not prefix:
+            return []
+        return self.storage.search_users(prefix, limit)
+
+    def invalidate(self):
+        """Drop the cached top-N; the next read reloads it"""
+        with self._lock:
+            self._top = None
+
+    def on_user_created(self, name, generation=None):
+        """New users start at zero points, so they only matter while the board is short"""
+        with self._lock:
+            if self._top is not None and len(self._top) < self.cache_size:
+                self._top = None
+            elif generation is not None and self._generation == generation[0]:
+                self._generation = generation[1]
+
+    def on_progress_batch(self, batch, generation=None):
+        """Merge freshly written totals into the cache
+
+        Points only ever grow, so only users touched by the batch can move into the
+        top-N. Their new totals are fetched by name and merged with the cached rows.
+        generation is the (before, after) of this batch's version bump; the cache
+        adopts it only if nothing else moved the generation since it was loaded.
+        """
+        with self._lock:
+            if self._top is None:
+                return
+            cached = {row[0]: row for row in self._top}
+        touched = {event.user_name for event in batch}
+        fresh = self.storage.get_users(touched)
+        merged = dict(cached)
+        for row in fresh:
+            merged[row[0]] = row
+        rows = sorted(merged.values(), key=lambda row: row[1], reverse=True)[:self.cache_size]
+        with self._lock:
+            if self._top is not None:
+                self._top = rows
+                if generation is not None and self._generation == generation[0]:
+                    self._generation = generation[1]
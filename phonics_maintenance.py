@@ -0,0 +1,200 @@
+# phonics_maintenance.py - Retention, compaction and archival of the progress table
+#
+#     python phonics_maintenance.py compact --keep-days 90
+#     python phonics_maintenance.py reconcile
+#     python phonics_maintenance.py vacuum --enable-incremental
+#
+# Compaction folds raw progress rows older than the retention window into
+# progress_daily (one row per user, day and content), writes the raw rows to
+# date-partitioned gzip NDJSON files and deletes them in short transactions so
+# live writers are only blocked for one chunk at a time.
+import argparse
+import gzip
+import json
+import os
+import time
+from datetime import date, timedelta
+
+from phonics_config import ARCHIVE_DIR
+from phonics_storage import PhonicsStorage, DEFAULT_DB_PATH
+
+DEFAULT_KEEP_DAYS = 90
+DEFAULT_CHUNK_ROWS = 5000
+PROGRESS_COLUMNS = ('id', 'user_id', 'activity', 'content', 'score', 'time_spent', 'date', 'stars_earned')
+
+
+def write_archive_part(archive_dir, day, rows):
+    """Write one gzip NDJSON part under archive_dir/progress/day=YYYY-MM-DD/ atomically"""
+    partition = os.path.join(archive_dir, 'progress', f'day={day}')
+    os.makedirs(partition, exist_ok=True)
+    first_id, last_id = rows[0][0], rows[-1][0]
+    path = os.path.join(partition, f'part-{first_id:012d}-{last_id:012d}.ndjson.gz')
+    staged = path + '.tmp'
+    with gzip.open(staged, 'wt', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(PROGRESS_COLUMNS, row)), separators=(',', ':')))
+            f.write('\n')
+    with open(staged, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(staged, path)
+    return path
+
+
+def count_archive_rows(path):
+    """Re-read an archive part and return its row count"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return sum(1 for _ in f)
+
+
+def reconcile(storage):
+    """Return users whose totals differ from live progress plus compacted aggregates
+
+    Each entry is (user_id, name, total_points, counted_points, total_stars, counted_stars).
+    """
+    with storage.connection() as conn:
+        return conn.execute("""
+            SELECT u.id, u.name, u.total_points, COALESCE(p.score, 0) + COALESCE(d.score, 0),
+                   u.total_stars, COALESCE(p.stars, 0) + COALESCE(d.stars, 0)
+            FROM users AS u
+            LEFT JOIN (SELECT user_id, SUM(score) AS score, SUM(stars_earned) AS stars
+                       FROM progress GROUP BY user_id) AS p ON p.user_id = u.id
+            LEFT JOIN (SELECT user_id, SUM(score) AS score, SUM(stars) AS stars
+                       FROM progress_daily GROUP BY user_id) AS d ON d.user_id = u.id
+            WHERE u.total_points != COALESCE(p.score, 0) + COALESCE(d.score, 0)
+               OR u.total_stars != COALESCE(p.stars, 0) + COALESCE(d.stars, 0)
+        """).fetchall()
+
+
+def compact(storage, keep_days=DEFAULT_KEEP_DAYS, archive_dir=ARCHIVE_DIR, chunk_rows=DEFAULT_CHUNK_ROWS,
+            pause=0.05, today=None):
+    """Fold, archive and delete progress rows older than keep_days; returns a summary dict"""
+    cutoff = ((today or date.today()) - timedelta(days=keep_days)).isoformat()
+    mismatched_before = {row[0] for row in reconcile(storage)}
+    summary = {'cutoff': cutoff, 'rows': 0, 'chunks': 0, 'files': [], 'started': time.time()}
+
+    last_id = 0
+    while True:
+        with storage.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT {', '.join(PROGRESS_COLUMNS)} FROM progress
+                WHERE date < ? AND id > ? ORDER BY id LIMIT ?
+            """, (cutoff, last_id, chunk_rows)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        # Archive first: rows are only deleted once they are safely on disk
+        by_day = {}
+        for row in rows:
+            by_day.setdefault((row[6] or '')[:10] or 'unknown', []).append(row)
+        for day, day_rows in sorted(by_day.items()):
+            path = write_archive_part(archive_dir, day, day_rows)
+            if count_archive_rows(path) != len(day_rows):
+                raise RuntimeError(f"Archive part {path} is incomplete; compaction stopped")
+            summary['files'].append(path)
+
+        aggregates = {}
+        for _, user_id, activity, content, score, time_spent, day_date, stars in rows:
+            key = (user_id, (day_date or '')[:10], activity or '', content or '')
+            events, total_score, total_stars, spent = aggregates.get(key, (0, 0, 0, 0))
+            aggregates[key] = (events + 1, total_score + (score or 0), total_stars + (stars or 0),
+                               spent + (time_spent or 0))
+
+        with storage.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO progress_daily (user_id, day, activity, content, events, score, stars, time_spent)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, day, activity, content) DO UPDATE SET
+                    events = events + excluded.events, score = score + excluded.score,
+                    stars = stars + excluded.stars, time_spent = time_spent + excluded.time_spent
+            """, [key + value for key, value in aggregates.items()])
+            conn.executemany("DELETE FROM progress WHERE id = ?", [(row[0],) for row in rows])
+
+        summary['rows'] += len(rows)
+        summary['chunks'] += 1
+        # Give live writers the lock between chunks
+        time.sleep(pause)
+
+    mismatched_after = {row[0] for row in reconcile(storage)}
+    summary['new_mismatches'] = sorted(mismatched_after - mismatched_before)
+    summary['preexisting_mismatches'] = len(mismatched_before)
+    summary['seconds'] = round(time.time() - summary.pop('started'), 3)
+    return summary
+
+
+def vacuum(storage, enable_incremental=False, pages_per_step=1000, pause=0.05):
+    """Reclaim free pages in small incremental steps; returns pages freed
+
+    Incremental vacuum needs auto_vacuum=INCREMENTAL, which an existing database
+    only picks up after one full VACUUM. That one-off rebuild blocks writers, so it
+    only runs when enable_incremental is passed.
+    """
+    with storage.connection() as conn:
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if mode != 2:
+            if not enable_incremental:
+                raise RuntimeError("auto_vacuum is not INCREMENTAL; rerun with --enable-incremental "
+                                   "during a quiet period to convert the database once")
+            with storage._write_lock:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+
+    freed = 0
+    while True:
+        with storage.transaction() as conn:
+            free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free_before:
+                break
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages_per_step)})").fetchall()
+            free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        freed += free_before - free_after
+        if free_after == free_before:
+            break
+        time.sleep(pause)
+
+    with storage.connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    return freed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Progress retention, compaction and archival")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    compact_parser = sub.add_parser('compact', help="fold and archive progress older than the window")
+    compact_parser.add_argument('--keep-days', type=int, default=DEFAULT_KEEP_DAYS)
+    compact_parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    compact_parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    compact_parser.add_argument('--vacuum', action='store_true', help="run an incremental vacuum afterwards")
+
+    sub.add_parser('reconcile', help="list users whose totals do not match their progress")
+
+    vacuum_parser = sub.add_parser('vacuum', help="reclaim free pages incrementally")
+    vacuum_parser.add_argument('--enable-incremental', action='store_true',
+                               help="convert the database to incremental auto_vacuum (one full VACUUM)")
+
+    args = parser.parse_args()
+    storage = PhonicsStorage(args.db)
+
+    if args.command == 'compact':
+        summary = compact(storage, args.keep_days, args.archive_dir, args.chunk_rows)
+        print(f"Compacted {summary['rows']} rows older than {summary['cutoff']} in {summary['chunks']} "
+              f"chunks ({summary['seconds']}s), {len(summary['files'])} archive parts")
+        if summary['new_mismatches']:
+            print(f"WARNING: totals no longer reconcile for user ids {summary['new_mismatches']}")
+            raise SystemExit(1)
+        if args.vacuum:
+            print(f"Freed {vacuum(storage)} pages")
+    elif args.command == 'reconcile':
+        mismatches = reconcile(storage)
+        for user_id, name, points, counted_points, stars, counted_stars in mismatches:
+            print(f"{name} (id {user_id}): points {points} vs {counted_points}, stars {stars} vs {counted_stars}")
+        print(f"{len(mismatches)} users do not reconcile")
+        raise SystemExit(1 if mismatches else 0)
+    else:
+        print(f"Freed {vacuum(storage, args.enable_incremental)} pages")
+
+
+if __name__ == '__main__':
+    main()
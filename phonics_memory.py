@@ -0,0 +1,101 @@
+# phonics_memory.py - Per-session memory profile and budget check
+#
+#     python phonics_memory.py --sessions 30 --budget-kb 64
+#
+# Drives many sessions through the app in one process under tracemalloc, keeps
+# them all alive, and reports the memory each one retains plus the top allocation
+# sites. Only allocations made by the app's own modules count towards the budget;
+# the test harness keeps a copy of every rendered page, which is reported
+# separately. Exits non-zero when the per-session figure is over budget, so it can
+# gate a deploy.
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(APP_DIR, 'phonics_web_app.py')
+APP_FILTER = tracemalloc.Filter(True, os.path.join(APP_DIR, 'phonics_*'))
+DEFAULT_BUDGET_KB = 64
+
+
+def play_session(user_name, timeout):
+    """One child's visit: create a character, some letters, one word"""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_FILE, default_timeout=timeout).run()
+    app.text_input(key='new_user_input').input(user_name)
+    app.button(key='create_user').click().run()
+    app.button(key='start_learning').click().run()
+    app.button(key='activity_letter_sounds').click().run()
+    for _ in range(3):
+        app.button(key='speak_letter').click().run()
+        app.button(key='next_letter').click().run()
+    app.button(key='back_to_menu').click().run()
+    app.button(key='activity_word_wizard').click().run()
+    question = app.session_state['session'].word_round[0]
+    app.button(key=f'wizard_choice_{question.choices.index(question.word)}').click().run()
+    if app.exception:
+        raise RuntimeError(f"Session for {user_name} failed: {app.exception[0].message}")
+    return app
+
+
+def profile(sessions, timeout, top):
+    """Return (app bytes per session, total bytes per session, top app allocation sites)"""
+    names = [f'memory{i:04d}' for i in range(sessions + 1)]
+    # The first session builds the process-wide caches; it is not counted
+    play_session(names[0], timeout)
+    gc.collect()
+    time.sleep(0.5)
+    baseline = tracemalloc.take_snapshot()
+
+    alive = [play_session(name, timeout) for name in names[1:]]
+    gc.collect()
+    # Let the journal flush so queued events are not counted as session memory
+    time.sleep(0.5)
+    snapshot = tracemalloc.take_snapshot()
+
+    total = sum(stat.size_diff for stat in snapshot.compare_to(baseline, 'filename'))
+    app_stats = snapshot.filter_traces([APP_FILTER]).compare_to(baseline.filter_traces([APP_FILTER]), 'lineno')
+    app_total = sum(stat.size_diff for stat in app_stats)
+    del alive
+    return app_total / sessions, total / sessions, app_stats[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory retained per session")
+    parser.add_argument('--sessions', type=int, default=30)
+    parser.add_argument('--budget-kb', type=float, default=DEFAULT_BUDGET_KB,
+                        help="fail when the app retains more than this per session")
+    parser.add_argument('--top', type=int, default=10, help="allocation sites to list")
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--workdir', help="directory for the scratch database (default: a temp dir)")
+    args = parser.parse_args()
+
+    os.environ.setdefault('PHONICS_SKIP_SPLASH', '1')
+    sys.path.insert(0, APP_DIR)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='phonics-memory-')
+    os.chdir(workdir)
+
+    tracemalloc.start(1)
+    app_bytes, total_bytes, sites = profile(args.sessions, args.timeout, args.top)
+    tracemalloc.stop()
+
+    print(f"{args.sessions} sessions")
+    print(f"  app memory per session:      {app_bytes / 1024:8.1f} KB (budget {args.budget_kb:g} KB)")
+    print(f"  all memory per session:      {total_bytes / 1024:8.1f} KB (includes the test harness)")
+    print("Top app allocation sites:")
+    for stat in sites:
+        frame = stat.traceback[0]
+        print(f"  {stat.size_diff / 1024:8.1f} KB  {stat.count_diff:6d} blocks  "
+              f"{os.path.basename(frame.filename)}:{frame.lineno}")
+    if app_bytes > args.budget_kb * 1024:
+        print(f"FAIL: {app_bytes / 1024:.1f} KB per session is over the {args.budget_kb:g} KB budget")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
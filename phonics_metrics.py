@@ -0,0 +1,284 @@
+# phonics_metrics.py - In-process timing histograms exported in Prometheus text format
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from phonics_config import METRICS_ENABLED
+
+# Latency buckets in seconds, from sub-millisecond SQL to multi-second reruns
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Sessions seen within this many seconds count as active
+ACTIVE_SESSION_WINDOW = 300
+
+
+class Histogram:
+    """Cumulative-bucket histogram for one label set"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class _NullTimer:
+    """Timer used when metrics are off; does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'labels', 'start')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Process-wide histograms, counters and gauges; near free when disabled"""
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+        self._sessions = {}
+        self._trace = threading.local()
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    # Recording
+
+    def timer(self, name, **labels):
+        """Context manager that observes elapsed seconds into a histogram"""
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+        trace = getattr(self._trace, 'entries', None)
+        if trace is not None:
+            label = ' '.join(str(v) for _, v in key[1])
+            trace.append((f"{name} {label}".strip(), value))
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge(self, name, callback):
+        """Register a function whose value is read at export time"""
+        self._gauges[name] = callback
+
+    # Per-rerun tracing for the debug overlay
+
+    def begin_rerun(self, session_id):
+        """Start collecting timings for this thread's rerun and mark the session active"""
+        if not self.enabled:
+            return
+        self._trace.entries = []
+        with self._lock:
+            _, reruns = self._sessions.get(session_id, (None, 0))
+            self._sessions[session_id] = (time.monotonic(), reruns + 1)
+        self.inc('phonics_reruns_total')
+
+    def end_rerun(self):
+        """Stop collecting and return [(label, seconds), ...] for this rerun"""
+        entries = getattr(self._trace, 'entries', None)
+        self._trace.entries = None
+        return entries or []
+
+    def active_sessions(self):
+        cutoff = time.monotonic() - ACTIVE_SESSION_WINDOW
+        with self._lock:
+            for session_id in [s for s, (seen, _) in self._sessions.items() if seen < cutoff]:
+                del self._sessions[session_id]
+            return len(self._sessions)
+
+    def session_reruns(self, session_id):
+        """Reruns counted so far for one session"""
+        with self._lock:
+            return self._sessions.get(session_id, (None, 0))[1]
+
+    def reruns_per_session(self):
+        """Mean reruns per active session"""
+        active = self.active_sessions()
+        with self._lock:
+            total = sum(reruns for _, reruns in self._sessions.values())
+        return round(total / active, 2) if active else 0
+
+    # Export
+
+    def render_prometheus(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            snapshot = [(key, list(h.counts), h.sum, h.count) for key, h in histograms]
+
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), counts, total, count in snapshot:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        gauges = dict(self._gauges)
+        gauges['phonics_active_sessions'] = self.active_sessions
+        gauges['phonics_reruns_per_session'] = self.reruns_per_session
+        for name, callback in sorted(gauges.items()):
+            header(name, 'gauge')
+            lines.append(f"{name} {callback()}")
+        return '\n'.join(lines) + '\n'
+
+    def write_file(self, path):
+        """Write the exposition atomically, e.g. for a node-exporter textfile collector"""
+        staged = f"{path}.tmp"
+        with open(staged, 'w') as f:
+            f.write(self.render_prometheus())
+        os.replace(staged, path)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    """Short label for a SQL statement: its verb and main table"""
+    words = [w for w in sql.split() if w.upper() not in ('IF', 'NOT', 'EXISTS')]
+    if not words:
+        return 'empty'
+    verb = words[0].upper()
+    upper = [w.upper() for w in words]
+    for keyword in ('FROM', 'INTO', 'UPDATE', 'TABLE', 'ON'):
+        if keyword in upper[:-1]:
+            table = words[upper.index(keyword) + 1].split('(')[0]
+            return f"{verb} {table}"
+    return verb
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection that times every execute/executemany into the registry"""
+
+    def execute(self, sql, *args):
+        with registry.timer('phonics_sql_seconds', statement=statement_label(sql)):
+            return super().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        with registry.timer('phonics_sql_seconds', statement=statement_label(sql)):
+            return super().executemany(sql, *args)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host='127.0.0.1'):
+    """Serve /metrics on a local port from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+def start_file_writer(path, interval=15.0):
+    """Rewrite the metrics file every interval seconds from a daemon thread"""
+    def loop():
+        while True:
+            registry.write_file(path)
+            time.sleep(interval)
+    thread = threading.Thread(target=loop, name='metrics-file', daemon=True)
+    thread.start()
+    return thread
+
+
+# Process-wide registry, switched on with PHONICS_METRICS
+registry = MetricsRegistry(enabled=METRICS_ENABLED)
+registry.describe('phonics_screen_seconds', "Time to render one screen method")
+registry.describe('phonics_css_seconds', "Time to emit the stylesheet")
+registry.describe('phonics_rerun_seconds', "Total script rerun time")
+registry.describe('phonics_fragment_seconds', "Time to rerun one fragment")
+registry.describe('phonics_sql_seconds', "Time spent in one SQL statement")
+registry.describe('phonics_reruns_total', "Script reruns across all sessions")
+registry.describe('phonics_active_sessions', "Sessions seen in the last five minutes")
+registry.describe('phonics_reruns_per_session', "Mean reruns per active session")
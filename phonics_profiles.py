@@ -0,0 +1,191 @@
+# phonics_profiles.py - Process-wide user profile cache with cross-process version slots
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: slot bumps are not locked across processes
+    fcntl = None
+
+VERSION_SLOTS = 4096
+_SLOT = struct.Struct('<Q')
+
+
+class VersionTable:
+    """Memory-mapped array of per-user change counters shared by every app process
+
+    Each user name hashes to a slot. A process that writes a user's row bumps the
+    slot; readers compare it with the value they loaded at, which costs one memory
+    read and no SQLite query. One extra slot after the per-user ones counts every
+    bump, for caches such as the leaderboard that span all users.
+    """
+
+    def __init__(self, path, slots=VERSION_SLOTS):
+        self.path = path
+        self.slots = slots
+        size = (slots + 1) * _SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+
+    def slot(self, name):
+        return zlib.crc32(name.encode('utf-8')) % self.slots
+
+    def read(self, name):
+        return _SLOT.unpack_from(self._map, self.slot(name) * _SLOT.size)[0]
+
+    def generation(self):
+        """Table-wide counter, moved by every bump"""
+        return _SLOT.unpack_from(self._map, self.slots * _SLOT.size)[0]
+
+    def bump(self, names):
+        """Increment the slots for the given names; returns {name: (before, after)}"""
+        return self.bump_all(names)[0]
+
+    def bump_all(self, names):
+        """Like bump, also returning the generation's (before, after)"""
+        changes = {}
+        with self._lock:
+            if fcntl is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                for name in set(names):
+                    offset = self.slot(name) * _SLOT.size
+                    before = _SLOT.unpack_from(self._map, offset)[0]
+                    _SLOT.pack_into(self._map, offset, before + 1)
+                    changes[name] = (before, before + 1)
+                offset = self.slots * _SLOT.size
+                before = _SLOT.unpack_from(self._map, offset)[0]
+                after = before + 1 if changes else before
+                _SLOT.pack_into(self._map, offset, after)
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        return changes, (before, after)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+class Profile:
+    """Cached header stats for one user"""
+
+    __slots__ = ('user_id', 'name', 'points', 'stars', 'level', 'achievements', 'version')
+
+    def __init__(self, user_id, name, points, stars, level, achievements, version):
+        self.user_id = user_id
+        self.name = name
+        self.points = points
+        self.stars = stars
+        self.level = level
+        # Achievement keys in the order they were unlocked
+        self.achievements = achievements
+        self.version = version
+
+
+class ProfileCache:
+    """Load each profile once, update it write-through, reload only when another process wrote it"""
+
+    def __init__(self, storage, journal, versions=None):
+        self.storage = storage
+        self.journal = journal
+        self.versions = versions or VersionTable(storage.db_path + '-versions')
+        self._lock = threading.Lock()
+        self._profiles = {}
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, name):
+        """Return the user's Profile, loading it only if missing or changed elsewhere"""
+        version = self.versions.read(name)
+        with self._lock:
+            profile = self._profiles.get(name)
+            if profile is not None and profile.version == version:
+                self.hits += 1
+                return profile
+        return self._load(name, version)
+
+    def _load(self, name, version):
+        # Lock order: journal flush lock, then this cache, then the journal counters
+        with self.journal.flush_lock:
+            row = self.storage.get_profile(name)
+            if row is None:
+                return None
+            user_id, points, stars, level = row
+            achievements = tuple(key for key, _ in self.storage.get_achievements(name))
+            with self._lock:
+                # Progress still queued in the journal is not in the row yet
+                pending_points, pending_stars = self.journal.pending_totals(name)
+                profile = Profile(user_id, name, points + pending_points, stars + pending_stars,
+                                  level, achievements, version)
+                self._profiles[name] = profile
+                self.loads += 1
+        return profile
+
+    def record_progress(self, name, activity, content, score, time_spent, stars_earned):
+        """Queue a result in the journal and write it through to the cached profile"""
+        with self._lock:
+            profile = self._profiles.get(name)
+            user_id = profile.user_id if profile is not None else None
+            if not self.journal.record(name, activity, content, score, time_spent, stars_earned, user_id):
+                return False
+            if profile is not None:
+                profile.points += score
+                profile.stars += stars_earned
+        return True
+
+    def set_level(self, name, level):
+        with self._lock:
+            profile = self._profiles.get(name)
+            if profile is not None:
+                profile.level = level
+
+    def on_unlocks(self, unlocks):
+        """Journal unlock listener: apply level-ups and new achievements to cached profiles"""
+        with self._lock:
+            for name, kind, key in unlocks:
+                profile = self._profiles.get(name)
+                if profile is None:
+                    continue
+                if kind == 'level':
+                    profile.level = key
+                elif key not in profile.achievements:
+                    profile.achievements += (key,)
+
+    def invalidate(self, name):
+        with self._lock:
+            self._profiles.pop(name, None)
+
+    def on_dropped(self, events):
+        """Journal drop listener: reload profiles whose write-through counted lost events"""
+        with self._lock:
+            for event in events:
+                self._profiles.pop(event.user_name, None)
+
+    def on_progress_batch(self, batch, changes=None):
+        """Journal listener: announce the write to other processes
+
+        Our cached profiles already include these events, so they adopt the new slot
+        value, unless another process bumped the slot since we loaded it. changes is
+        the bump already made for this batch, when the caller shares it with others.
+        """
+        if changes is None:
+            changes = self.versions.bump(event.user_name for event in batch)
+        with self._lock:
+            for name, (before, after) in changes.items():
+                profile = self._profiles.get(name)
+                if profile is None:
+                    continue
+                if profile.version == before:
+                    profile.version = after
+                else:
+                    del self._profiles[name]
+
+    def __len__(self):
+        return len(self._profiles)
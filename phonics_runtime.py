@@ -0,0 +1,183 @@
+# phonics_runtime.py - Process-level singletons shared by every session, built once at warm-up
+#
+# The app script runs again on every rerun; this module is imported once per process.
+# It owns the services, the speech service, the session store, the compiled stylesheet
+# and the per-theme CSS, so a rerun only binds its session state. warm_up() also
+# compiles every content pack, builds the word engine and prepares the hot SQL on
+# every pooled connection, then marks the process ready. Examples:
+#     python phonics_runtime.py warm
+#     python phonics_runtime.py serve -- --server.port 8501
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+from phonics_config import TTS_VOICE, AUDIO_CACHE_DIR, AUDIO_CACHE_BYTES, METRICS_PORT, METRICS_FILE, READY_FILE
+from phonics_assets import load_manifest, font_face_css
+from phonics_content import PACKS
+from phonics_metrics import registry as metrics, start_http_server, start_file_writer
+from phonics_services import PhonicsServices
+from phonics_session_store import open_session_store
+from phonics_storage import DEFAULT_DB_PATH
+from phonics_styles import BASE_CSS, theme_css
+from phonics_tts import EspeakEngine, AudioClipCache, SpeechService, letter_phrase
+
+logger = logging.getLogger(__name__)
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'phonics_web_app.py')
+
+
+class Runtime:
+    """Everything a rerun needs that does not belong to one session"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.services = PhonicsServices(db_path)
+        self.speech = SpeechService(EspeakEngine(TTS_VOICE), AudioClipCache(AUDIO_CACHE_DIR, AUDIO_CACHE_BYTES))
+        self.base_css = font_face_css(load_manifest()) + BASE_CSS
+        self.session_store = open_session_store()
+        # (theme pack, {theme name: css}); rebuilt when the themes pack is reloaded
+        self._theme_css = (None, {})
+        self._exporter_lock = threading.Lock()
+        self._exporter_started = False
+        self.timings = {}
+
+    def theme_css(self, name):
+        """The variables block for one theme of the current themes pack"""
+        pack = self.services.content.get('themes')
+        compiled_for, compiled = self._theme_css
+        if compiled_for is not pack:
+            compiled = {theme: theme_css(colors) for theme, colors in pack.themes.items()}
+            self._theme_css = (pack, compiled)
+        return compiled[name]
+
+    def start_metrics_exporter(self):
+        """Export metrics once per process, over HTTP and/or a textfile as configured"""
+        with self._exporter_lock:
+            if self._exporter_started:
+                return
+            self._exporter_started = True
+            journal = self.services.journal
+            metrics.gauge('phonics_journal_queued_total', lambda: journal.queued)
+            metrics.gauge('phonics_journal_flushed_total', lambda: journal.flushed)
+            metrics.gauge('phonics_journal_dropped_total', lambda: journal.dropped)
+            metrics.gauge('phonics_journal_backlog', lambda: journal.stats()['backlog'])
+            metrics.gauge('phonics_ready', lambda: int(_ready.is_set()))
+            if METRICS_PORT:
+                start_http_server(METRICS_PORT)
+            if METRICS_FILE:
+                start_file_writer(METRICS_FILE)
+
+    def warm(self):
+        """Do every first-use cost now instead of in the first child's rerun"""
+        def step(label, action):
+            start = time.perf_counter()
+            action()
+            self.timings[label] = round(time.perf_counter() - start, 4)
+
+        content = self.services.content
+        step('content', lambda: [content.get(kind) for kind in PACKS])
+        step('word_engine', self.services.word_engine)
+        step('theme_css', lambda: self.theme_css(next(iter(content.get('themes').themes))))
+        step('sql', self.services.storage.warm)
+        letters = content.get('letters').sounds
+        # Clips render in the speech service's own threads; readiness does not wait on them
+        step('speech', lambda: self.speech.prewarm([letter_phrase(letter, sound) for letter, sound in letters.items()]))
+        if metrics.enabled:
+            step('metrics', self.start_metrics_exporter)
+
+
+_lock = threading.Lock()
+_runtime = None
+_ready = threading.Event()
+_warm_lock = threading.RLock()
+_ready_hooks = []
+
+
+def get_runtime():
+    """The process's runtime, built on first use"""
+    runtime = _runtime
+    if runtime is not None:
+        return runtime
+    return _build()
+
+
+def _build():
+    global _runtime
+    with _lock:
+        if _runtime is None:
+            _runtime = Runtime()
+        return _runtime
+
+
+def warm_up():
+    """Build and warm the runtime, then run the readiness hooks; cheap once the process is warm"""
+    runtime = get_runtime()
+    if _ready.is_set():
+        return runtime
+    # Serialized so concurrent first reruns warm the process once
+    with _warm_lock:
+        if not _ready.is_set():
+            runtime.warm()
+            _ready.set()
+            for hook in _ready_hooks:
+                try:
+                    hook(runtime)
+                except Exception:
+                    logger.exception("Readiness hook %r failed", hook)
+    return runtime
+
+
+def is_ready():
+    """True once warm_up() has finished in this process"""
+    return _ready.is_set()
+
+
+def on_ready(hook):
+    """Call hook(runtime) once the process is warm (immediately if it already is)"""
+    with _warm_lock:
+        if not _ready.is_set():
+            _ready_hooks.append(hook)
+            return
+    hook(_runtime)
+
+
+def touch_ready_file(runtime, path=READY_FILE):
+    """Readiness hook: write the warm-up timings to the ready file for an exec probe"""
+    if not path:
+        return
+    with open(path, 'w') as f:
+        f.write(' '.join(f"{label}={seconds}" for label, seconds in runtime.timings.items()) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the process-level singletons, or serve the app warm")
+    parser.add_argument('command', choices=['warm', 'serve'])
+    parser.add_argument('streamlit_args', nargs=argparse.REMAINDER,
+                        help="for serve: streamlit run flags after --, e.g. -- --server.port 8501")
+    args = parser.parse_args()
+
+    if args.command == 'serve' and READY_FILE:
+        # Only a serving process may report ready; drop a file left by an earlier one
+        if os.path.exists(READY_FILE):
+            os.remove(READY_FILE)
+        on_ready(touch_ready_file)
+    start = time.perf_counter()
+    runtime = warm_up()
+    print(f"warm in {time.perf_counter() - start:.3f}s: "
+          + ', '.join(f"{label} {seconds * 1000:.1f}ms" for label, seconds in runtime.timings.items()))
+    if args.command == 'warm':
+        runtime.services.journal.close()
+        return
+
+    # Serve from this process, so the app script imports this module already warm
+    from streamlit.web import cli
+    flags = [arg for arg in args.streamlit_args if arg != '--']
+    cli.main(['run', APP_PATH, *flags], prog_name='streamlit')
+
+
+if __name__ == '__main__':
+    # Run through the importable module: the app script must find these singletons, not a copy
+    from phonics_runtime import main
+    sys.exit(main())
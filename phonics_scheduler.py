@@ -0,0 +1,299 @@
+# phonics_scheduler.py - Spaced-repetition scheduling of letters, sounds and words per child
+import heapq
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+
+# Gaps after the first few successful reviews; later gaps grow by the item's ease
+FIRST_INTERVALS = (60.0, 600.0, 3600.0)
+START_EASE = 2.5
+MIN_EASE = 1.3
+MAX_EASE = 3.0
+# Learners kept in memory per process; evicted ones are rebuilt from their saved state
+DEFAULT_MAX_LEARNERS = 2000
+
+_STATE_VERSION = 2
+# due, interval, reps, ease x 100; version 1 kept ease x 10, which lost the 0.05 steps
+_ITEM = struct.Struct('<dfHH')
+_ITEM_V1 = struct.Struct('<dfHB')
+
+
+def _timestamp(date):
+    return datetime.fromisoformat(date).timestamp()
+
+
+class ItemState:
+    """Review history of one item for one child"""
+
+    __slots__ = ('due', 'interval', 'reps', 'ease')
+
+    def __init__(self, due=0.0, interval=0.0, reps=0, ease=START_EASE):
+        self.due = due
+        self.interval = interval
+        self.reps = reps
+        self.ease = ease
+
+    def review(self, when, success):
+        """Apply one result at time when and schedule the next review"""
+        if not success:
+            self.reps = 0
+            self.interval = FIRST_INTERVALS[0]
+            # Kept to two decimals so a save and load gives back the same schedule
+            self.ease = round(max(MIN_EASE, self.ease - 0.2), 2)
+        elif self.reps and when < self.due:
+            # Practising before the item is due keeps it fresh but earns no longer gap
+            pass
+        else:
+            self.reps += 1
+            if self.reps <= len(FIRST_INTERVALS):
+                self.interval = FIRST_INTERVALS[self.reps - 1]
+            else:
+                self.interval *= self.ease
+            self.ease = round(min(MAX_EASE, self.ease + 0.05), 2)
+        self.due = when + self.interval
+
+
+class LearnerQueue:
+    """One child's items for one activity in a heap ordered by due time, then mastery
+
+    Items never seen come from the pack in order whenever nothing reviewed is due.
+    Updates push a fresh heap entry and leave the old one to be skipped on pop, so
+    each event costs O(log n) whatever the size of the pack.
+    """
+
+    def __init__(self, items, states=None, watermark=''):
+        self.items = tuple(items)
+        self.states = states or {}
+        # Date of the newest progress event already folded into states
+        self.watermark = watermark
+        # Version slot value this queue was loaded at (see ProfileCache)
+        self.version = None
+        self._heap = []
+        self._entry = {}
+        self._seq = 0
+        self._next_new = 0
+        self._lock = threading.Lock()
+        for item, state in self.states.items():
+            self._push(item, state)
+
+    def _push(self, item, state):
+        self._seq += 1
+        self._entry[item] = self._seq
+        heapq.heappush(self._heap, (state.due, state.reps, self._seq, item))
+
+    def _top(self):
+        """Return the first live heap entry, discarding stale ones"""
+        heap = self._heap
+        while heap and self._entry.get(heap[0][3]) != heap[0][2]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _peek(self, exclude):
+        top = self._top()
+        if top is None or top[3] != exclude:
+            return top
+        # Look one further without losing the excluded entry
+        held = heapq.heappop(self._heap)
+        second = self._top()
+        heapq.heappush(self._heap, held)
+        return second
+
+    def _new_item(self, exclude):
+        """First unseen pack item other than exclude; seen ones are skipped for good"""
+        items = self.items
+        while self._next_new < len(items) and items[self._next_new] in self.states:
+            self._next_new += 1
+        for index in range(self._next_new, len(items)):
+            item = items[index]
+            if item not in self.states and item != exclude:
+                return item
+        return None
+
+    def next_item(self, now=None, exclude=None):
+        """Pick what to practise next: due reviews first, then new items, then the soonest due"""
+        now = time.time() if now is None else now
+        with self._lock:
+            top = self._peek(exclude)
+            if top is not None and top[0] <= now:
+                return top[3]
+            new = self._new_item(exclude)
+            if new is not None:
+                return new
+            if top is not None:
+                return top[3]
+            return exclude if exclude in self.states or exclude in self.items else None
+
+    def review(self, item, when, success=True, date=None):
+        """Fold one result into the queue; date advances the watermark"""
+        with self._lock:
+            if date is not None and date > self.watermark:
+                self.watermark = date
+            state = self.states.get(item)
+            if state is None:
+                state = self.states[item] = ItemState()
+            state.review(when, success)
+            self._push(item, state)
+            # Stale entries pile up under heavy practice; rebuild once they dominate
+            if len(self._heap) > 4 * len(self.states) + 64:
+                self._heap = [(s.due, s.reps, self._entry[i], i) for i, s in self.states.items()]
+                heapq.heapify(self._heap)
+
+    def set_items(self, items):
+        """Swap in a new pack item list, keeping every review already made"""
+        with self._lock:
+            self.items = tuple(items)
+            self._next_new = 0
+
+    def mastery(self, item):
+        state = self.states.get(item)
+        return state.reps if state else 0
+
+    def encode(self):
+        """Return (watermark, blob) with the states packed and zlib-compressed"""
+        with self._lock:
+            watermark = self.watermark
+            names = list(self.states)
+            body = b''.join(_ITEM.pack(s.due, s.interval, min(s.reps, 0xFFFF), int(round(s.ease * 100)))
+                            for s in (self.states[n] for n in names))
+            header = '\x1f'.join(names).encode('utf-8')
+        return watermark, bytes([_STATE_VERSION]) + zlib.compress(struct.pack('<I', len(header)) + header + body)
+
+    @staticmethod
+    def decode(blob):
+        """Inverse of encode; returns {item: ItemState}"""
+        if not blob or blob[0] not in (1, _STATE_VERSION):
+            return {}
+        item, scale = (_ITEM, 100) if blob[0] == _STATE_VERSION else (_ITEM_V1, 10)
+        raw = zlib.decompress(blob[1:])
+        size = struct.unpack_from('<I', raw)[0]
+        names = raw[4:4 + size].decode('utf-8').split('\x1f') if size else []
+        states = {}
+        offset = 4 + size
+        for name in names:
+            due, interval, reps, ease = item.unpack_from(raw, offset)
+            offset += item.size
+            states[name] = ItemState(due, interval, reps, ease / scale)
+        return states
+
+    def __len__(self):
+        return len(self.states)
+
+
+class Scheduler:
+    """Process-wide learner queues, built once per child and saved after journal flushes
+
+    With a VersionTable, each queue remembers the slot value it was loaded at, like
+    ProfileCache does. A queue whose child was written by another process since then
+    is rebuilt from the saved state before it is used or saved again.
+    """
+
+    def __init__(self, storage, versions=None, max_learners=DEFAULT_MAX_LEARNERS):
+        self.storage = storage
+        self.versions = versions
+        self.max_learners = max_learners
+        self._lock = threading.Lock()
+        self._learners = OrderedDict()
+        self.loads = 0
+        self.conflicts = 0
+
+    def _version(self, user_name):
+        return self.versions.read(user_name) if self.versions is not None else None
+
+    def learner(self, user_name, activity, items):
+        """Return the child's queue for an activity, building it on first use"""
+        key = (user_name, activity)
+        version = self._version(user_name)
+        with self._lock:
+            learner = self._learners.get(key)
+            if learner is not None and learner.version == version:
+                self._learners.move_to_end(key)
+                if learner.items is not items and learner.items != tuple(items):
+                    learner.set_items(items)
+                return learner
+        learner = self._load(user_name, activity, items, version)
+        with self._lock:
+            current = self._learners.get(key)
+            # Another session may have loaded it meanwhile; keep the first unless it is stale
+            if current is not None and current.version == version:
+                learner = current
+            self._learners[key] = learner
+            self._learners.move_to_end(key)
+            while len(self._learners) > self.max_learners:
+                self._learners.popitem(last=False)
+        return learner
+
+    def _load(self, user_name, activity, items, version, unsaved=()):
+        """Start from the saved state and replay the progress written after it
+
+        unsaved are events this process wrote that the saved state may predate but
+        whose dates are not after its watermark, so the replay would skip them.
+        """
+        saved = self.storage.load_learner_state(user_name, activity)
+        watermark, states = ('', {}) if saved is None else (saved[0], LearnerQueue.decode(saved[1]))
+        learner = LearnerQueue(items, states, watermark)
+        learner.version = version
+        for event in unsaved:
+            if event.content is not None and event.date <= watermark:
+                learner.review(event.content, _timestamp(event.date), event.score > 0)
+        for content, date, score in self.storage.progress_history(user_name, activity, watermark or None):
+            if content is not None:
+                learner.review(content, _timestamp(date), score > 0, date)
+        self.loads += 1
+        return learner
+
+    def next_item(self, user_name, activity, items, exclude=None):
+        """Pick the child's next item without touching the database once loaded"""
+        return self.learner(user_name, activity, items).next_item(exclude=exclude)
+
+    def record(self, user_name, activity, items, content, score):
+        """Fold a result in; call after the progress event is queued so its date sorts first"""
+        learner = self.learner(user_name, activity, items)
+        now = datetime.now()
+        learner.review(content, now.timestamp(), score > 0, now.isoformat())
+
+    def forget(self, user_name):
+        with self._lock:
+            for key in [k for k in self._learners if k[0] == user_name]:
+                del self._learners[key]
+
+    def on_progress_batch(self, batch, changes=None):
+        """Journal listener: save the queues of children whose progress was just written
+
+        changes is the {name: (before, after)} of the version bump for this batch. A
+        queue loaded at `before` is current and adopts `after`; any other queue missed
+        another process's write, so it is rebuilt, with this batch folded in, before saving.
+        """
+        with self._lock:
+            touched = [(key, self._learners[key]) for key in {(e.user_name, e.activity) for e in batch}
+                       if key in self._learners]
+        if not touched:
+            return
+        rows = []
+        rebuilt = []
+        for (user_name, activity), learner in touched:
+            change = changes.get(user_name) if changes else None
+            if change is None or learner.version == change[0]:
+                if change is not None:
+                    learner.version = change[1]
+            else:
+                self.conflicts += 1
+                events = [e for e in batch if e.user_name == user_name and e.activity == activity]
+                learner = self._load(user_name, activity, learner.items, self._version(user_name), events)
+                rebuilt.append(((user_name, activity), learner))
+            rows.append((user_name, activity) + learner.encode())
+        self.storage.save_learner_states(rows)
+        if rebuilt:
+            # The rebuilt state supersedes whatever the other process saved; make it reload
+            bumped = self.versions.bump(user_name for (user_name, _), _ in rebuilt)
+            with self._lock:
+                for key, learner in rebuilt:
+                    before, after = bumped[key[0]]
+                    if learner.version == before:
+                        learner.version = after
+                    self._learners[key] = learner
+
+    def __len__(self):
+        return len(self._learners)
@@ -0,0 +1,102 @@
+# phonics_services.py - The app's shared engines and the actions both front ends call
+#
+# One PhonicsServices per process owns the storage engine, the write-behind journal
+# and the caches fed from it. The Streamlit UI and the JSON API (phonics_api.py) go
+# through the same methods, so a result recorded from a tablet scores, schedules and
+# caches exactly like a click in the browser.
+import threading
+
+from phonics_config import CONTENT_DIR, SHARD_CONFIG
+from phonics_content import ContentStore
+from phonics_journal import ProgressJournal
+from phonics_leaderboard import Leaderboard
+from phonics_profiles import ProfileCache, VersionTable
+from phonics_scheduler import Scheduler
+from phonics_shards import ShardRouter
+from phonics_storage import PhonicsStorage, DEFAULT_DB_PATH
+from phonics_words import WordEngine
+
+# Activities whose items come from a sound pack, and so have a practice queue
+SCHEDULED_ACTIVITIES = {'letter_sounds': 'letters'}
+
+
+def stars_for(score):
+    """Stars earned for one result"""
+    return max(1, score // 5)
+
+
+class PhonicsServices:
+    """Storage, journal, caches and content for one process"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, content_dir=CONTENT_DIR, shard_config=SHARD_CONFIG):
+        # With a shard config, db_path is unused: users live in the configured shards
+        self.storage = ShardRouter.from_config(shard_config) if shard_config else PhonicsStorage(db_path)
+        self.journal = ProgressJournal(self.storage)
+        # Per-user change counters shared with every other process on this database
+        self.versions = VersionTable(self.storage.db_path + '-versions')
+        self.leaderboard = Leaderboard(self.storage, self.versions)
+        self.profiles = ProfileCache(self.storage, self.journal, self.versions)
+        self.scheduler = Scheduler(self.storage, self.versions)
+        self.journal.add_listener(self.on_progress_batch)
+        self.journal.add_unlock_listener(self.profiles.on_unlocks)
+        self.journal.add_drop_listener(self.profiles.on_dropped)
+        self.content = ContentStore(content_dir)
+        self._engine_lock = threading.Lock()
+        self._engine = None
+
+    def on_progress_batch(self, batch):
+        """Journal listener: bump the written users' slots once, then update every cache"""
+        changes, generation = self.versions.bump_all(event.user_name for event in batch)
+        self.leaderboard.on_progress_batch(batch, generation)
+        self.profiles.on_progress_batch(batch, changes)
+        self.scheduler.on_progress_batch(batch, changes)
+
+    def word_engine(self):
+        """Word engine for the current word list; rebuilt only when the list is reloaded"""
+        words = self.content.get('words')
+        engine = self._engine
+        if engine is not None and engine.words is words:
+            return engine
+        with self._engine_lock:
+            if self._engine is None or self._engine.words is not words:
+                self._engine = WordEngine(words)
+            return self._engine
+
+    def items(self, activity):
+        """Items a scheduled activity practises, in pack order; () for other activities"""
+        kind = SCHEDULED_ACTIVITIES.get(activity)
+        return self.content.get(kind).items if kind else ()
+
+    def create_user(self, name, theme='rainbow', favorite_activity='letter_sounds', classroom=None):
+        """Add a character; raises sqlite3.IntegrityError if the name is taken"""
+        user_id = self.storage.create_user(name, theme, favorite_activity, classroom)
+        # Other processes' leaderboards pick the newcomer up from the generation
+        changes, generation = self.versions.bump_all([name])
+        self.leaderboard.on_user_created(name, generation)
+        return user_id
+
+    def login(self, name):
+        """Load a character's profile and practice queue; None if there is no such character"""
+        profile = self.profiles.get(name)
+        if profile is not None:
+            self.scheduler.learner(name, 'letter_sounds', self.items('letter_sounds'))
+        return profile
+
+    def record_progress(self, name, activity, content, score, time_spent):
+        """Queue one result and fold it into the cached profile and practice queue
+
+        Returns False if the journal was full and the result was dropped.
+        """
+        if not self.profiles.record_progress(name, activity, content, score, time_spent, stars_for(score)):
+            return False
+        items = self.items(activity)
+        if items:
+            self.scheduler.record(name, activity, items, content, score)
+        return True
+
+    def next_item(self, name, activity, exclude=None):
+        """The item the child's practice queue says is due next, or None"""
+        items = self.items(activity)
+        if not items:
+            return None
+        return self.scheduler.next_item(name, activity, items, exclude=exclude)
@@ -0,0 +1,86 @@
+# phonics_session.py - Compact per-session state kept between reruns
+import json
+import time
+
+from phonics_words import Question
+
+
+class SessionModel:
+    """Everything one browser session remembers between reruns
+
+    Stored as a single st.session_state entry. Content (themes, sounds, words) is
+    referenced by key and resolved against the shared packs, never copied in.
+    """
+
+    __slots__ = ('screen', 'user', 'theme', 'score', 'letter', 'activity_start', 'celebrate',
+                 'splash_done', 'word_round', 'word_index', 'word_built', 'word_used', 'word_feedback',
+                 'last_rerun_timings', 'token', 'stored')
+
+    # Fields written to the session store; the timing trace stays with the worker that made it
+    SHARED = ('screen', 'user', 'theme', 'score', 'letter', 'activity_start', 'celebrate',
+              'splash_done', 'word_round', 'word_index', 'word_built', 'word_used', 'word_feedback')
+
+    def __init__(self, screen, theme='rainbow'):
+        self.screen = screen
+        self.user = None
+        self.theme = theme
+        self.score = 0
+        self.letter = None
+        self.activity_start = time.time()
+        self.celebrate = False
+        self.splash_done = False
+        # Word activities: the pre-generated round, position, tiles placed so far
+        self.word_round = ()
+        self.word_index = 0
+        self.word_built = ()
+        self.word_used = ()
+        self.word_feedback = None
+        self.last_rerun_timings = None
+        # Session store key, and the shared values as last written there
+        self.token = None
+        self.stored = (None,) * len(self.SHARED)
+
+    def start_activity(self, screen):
+        """Enter an activity screen with a fresh score and timer"""
+        self.screen = screen
+        self.activity_start = time.time()
+        self.score = 0
+
+    @classmethod
+    def restore(cls, token, values):
+        """Rebuild a session from the encoded fields a store returned"""
+        session = cls('user_selection')
+        for key, value in values.items():
+            if key in _DECODERS:
+                setattr(session, key, _DECODERS[key](json.loads(value)))
+        session.token = token
+        session.stored = tuple(getattr(session, key) for key in cls.SHARED)
+        return session
+
+    def changes(self):
+        """Encode the shared fields changed since the last call, and mark them stored
+
+        Field values are immutable, so the snapshot holds references, not copies.
+        """
+        current = tuple(getattr(self, key) for key in self.SHARED)
+        if current == self.stored:
+            return {}
+        changed = {key: json.dumps(value, separators=(',', ':')).encode('utf-8')
+                   for key, value, before in zip(self.SHARED, current, self.stored) if value != before}
+        self.stored = current
+        return changed
+
+
+def _tuple_or_none(value):
+    return None if value is None else tuple(value)
+
+
+# JSON has no tuples; these turn each stored field back into what the app assigns
+_DECODERS = dict.fromkeys(SessionModel.SHARED, lambda value: value)
+_DECODERS.update({
+    'word_round': lambda value: tuple(Question(kind, word, tuple(graphemes), tuple(choices))
+                                      for kind, word, graphemes, choices in value),
+    'word_built': tuple,
+    'word_used': tuple,
+    'word_feedback': _tuple_or_none,
+})
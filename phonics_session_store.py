@@ -0,0 +1,191 @@
+# phonics_session_store.py - Where session state lives between reruns, keyed by a URL token
+#
+# Each browser keeps a random token in its ?s= query parameter. A session's changed
+# fields are written to the store at the end of every rerun, so after a worker
+# restart or a reconnect to another worker the child carries on where they were.
+# The default store is in-process; point PHONICS_SESSION_STORE at a SQLite file to
+# share sessions between every worker on the node. Examples:
+#     python phonics_session_store.py stats --store sessions.db
+#     python phonics_session_store.py purge --store sessions.db
+import argparse
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from phonics_config import SESSION_STORE, SESSION_TTL_HOURS
+
+TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+DEFAULT_MAX_SESSIONS = 10000
+# Expired sessions are purged every this many saves
+PURGE_EVERY = 500
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, touched REAL NOT NULL) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS idx_sessions_touched ON sessions(touched)",
+    '''
+    CREATE TABLE IF NOT EXISTS session_values (
+        sid TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value BLOB NOT NULL,
+        PRIMARY KEY (sid, key)
+    ) WITHOUT ROWID
+    ''',
+)
+
+
+def new_token():
+    return secrets.token_urlsafe(16)
+
+
+def valid_token(token):
+    return isinstance(token, str) and TOKEN_PATTERN.match(token) is not None
+
+
+class MemorySessionStore:
+    """Sessions in this process only: they survive a page reload, not a worker restart"""
+
+    def __init__(self, ttl=SESSION_TTL_HOURS * 3600, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        # token -> (monotonic time last written, {key: encoded value}), oldest first
+        self._sessions = OrderedDict()
+
+    def load(self, token):
+        """{key: encoded value} for a live session, or None"""
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                return None
+            return dict(entry[1])
+
+    def save(self, token, changes):
+        """Merge changed fields into a session, creating it if needed"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.pop(token, None)
+            values = entry[1] if entry else {}
+            values.update(changes)
+            self._sessions[token] = (now, values)
+            while self._sessions:
+                oldest, (touched, _) = next(iter(self._sessions.items()))
+                if len(self._sessions) <= self.max_sessions and now - touched <= self.ttl:
+                    break
+                del self._sessions[oldest]
+
+    def stats(self):
+        with self._lock:
+            return {'sessions': len(self._sessions),
+                    'bytes': sum(len(v) for _, values in self._sessions.values() for v in values.values())}
+
+    def close(self):
+        pass
+
+
+class SqliteSessionStore:
+    """Sessions in a SQLite file that every worker on the node opens"""
+
+    def __init__(self, path, ttl=SESSION_TTL_HOURS * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._saves = 0
+        with self._transaction() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA busy_timeout = 5000")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def load(self, token):
+        """{key: encoded value} for a live session, or None"""
+        conn = self._connection()
+        row = conn.execute("SELECT touched FROM sessions WHERE sid = ?", (token,)).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+        return dict(conn.execute("SELECT key, value FROM session_values WHERE sid = ?", (token,)))
+
+    def save(self, token, changes):
+        """Write only the changed fields, in one short transaction"""
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (sid, touched) VALUES (?, ?)", (token, time.time()))
+            conn.executemany("INSERT OR REPLACE INTO session_values (sid, key, value) VALUES (?, ?, ?)",
+                             [(token, key, value) for key, value in changes.items()])
+        with self._lock:
+            self._saves += 1
+            purge = self._saves % PURGE_EVERY == 0
+        if purge:
+            self.purge()
+
+    def purge(self):
+        """Delete sessions idle for longer than the TTL; returns how many"""
+        cutoff = time.time() - self.ttl
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM session_values WHERE sid IN (SELECT sid FROM sessions WHERE touched < ?)",
+                         (cutoff,))
+            return conn.execute("DELETE FROM sessions WHERE touched < ?", (cutoff,)).rowcount
+
+    def stats(self):
+        conn = self._connection()
+        sessions = conn.execute("SELECT count(*) FROM sessions").fetchone()[0]
+        size = conn.execute("SELECT coalesce(sum(length(value)), 0) FROM session_values").fetchone()[0]
+        return {'sessions': sessions, 'bytes': size}
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def open_session_store(spec=SESSION_STORE):
+    """The in-process store when spec is unset or 'memory', else a shared SQLite file"""
+    if not spec or spec == 'memory':
+        return MemorySessionStore()
+    return SqliteSessionStore(spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or purge a shared session store")
+    parser.add_argument('command', choices=['stats', 'purge'])
+    parser.add_argument('--store', default=SESSION_STORE, required=not SESSION_STORE,
+                        help="session store file (default: PHONICS_SESSION_STORE)")
+    args = parser.parse_args()
+
+    store = SqliteSessionStore(args.store)
+    if args.command == 'purge':
+        print(f"purged {store.purge()} expired sessions")
+    stats = store.stats()
+    print(f"{stats['sessions']} sessions, {stats['bytes']} bytes of state")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
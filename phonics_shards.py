@@ -0,0 +1,638 @@
+# phonics_shards.py - Per-school shard databases behind the storage interface
+#
+#     python phonics_shards.py status
+#     python phonics_shards.py adopt
+#     python phonics_shards.py move-classroom room-4b s2
+#     python phonics_shards.py move-user Ana s0
+#     python phonics_shards.py repair
+#
+# PHONICS_SHARDS points at a shards.json; relative paths are from its directory:
+#
+#     {"directory": "directory.db",
+#      "shards": {"s0": "s0.db", "s1": "s1.db", "s2": "s2.db"},
+#      "classrooms": {"room-4b": "s1"}}
+#
+# Every shard is an ordinary app database with its own writer lock. The directory is
+# a small SQLite file recording which shard each user lives on; it is written when a
+# user is created or moved, and read only when a process has not seen the user yet.
+# A new user goes to their classroom's shard (pinned in the config, otherwise chosen
+# by a consistent hash of the classroom when its first child joins), or by a hash of
+# their own name without a classroom. Reads across users, like the leaderboard, ask
+# every shard and merge. To split an existing database, list it as one shard, run
+# adopt once, then move classrooms off it. A move that dies before its cut-over leaves
+# copies the directory does not point at; the next move of those users, or repair,
+# deletes them.
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from phonics_config import SHARD_CONFIG
+from phonics_profiles import VersionTable
+from phonics_storage import PhonicsStorage
+
+DEFAULT_REPLICAS = 64
+DEFAULT_MAX_PLACEMENTS = 100000
+DEFAULT_COPY_ROWS = 5000
+MAX_CATCH_UP_PASSES = 10
+
+USER_COLUMNS = ('name', 'created_date', 'total_points', 'level', 'theme', 'total_stars',
+                'favorite_activity', 'classroom')
+# Per-user tables copied whole at cut-over; daily_content_rollup stays behind, since
+# summing it across shards gives the same totals wherever the events were counted
+PER_USER_TABLES = {
+    'daily_user_rollup': ('day', 'activity', 'events', 'points', 'stars', 'time_spent'),
+    'progress_daily': ('day', 'activity', 'content', 'events', 'score', 'stars', 'time_spent'),
+    'learner_state': ('activity', 'watermark', 'state'),
+    'user_counters': ('state',),
+    'achievements': ('achievement', 'unlocked_at'),
+}
+_IDS = "(SELECT value FROM json_each(?))"
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hash of tenant keys onto shard names
+
+    Adding a shard takes over about 1/N of the keys. Only new tenants are placed by
+    the ring; existing ones stay where the directory says until they are moved.
+    """
+
+    def __init__(self, shards, replicas=DEFAULT_REPLICAS):
+        points = sorted((_hash(f"{shard}#{i}"), shard) for shard in shards for i in range(replicas))
+        self._hashes = [h for h, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard(self, key):
+        return self._shards[bisect(self._hashes, _hash(key)) % len(self._hashes)]
+
+
+class ShardDirectory:
+    """Which shard each user lives on, and which shard each classroom's new users join"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        for statement in (
+            "PRAGMA journal_mode = WAL",
+            "PRAGMA busy_timeout = 5000",
+            "CREATE TABLE IF NOT EXISTS placements (name TEXT PRIMARY KEY, shard TEXT NOT NULL) WITHOUT ROWID",
+            "CREATE TABLE IF NOT EXISTS classrooms (classroom TEXT PRIMARY KEY, shard TEXT NOT NULL) WITHOUT ROWID",
+        ):
+            self._conn.execute(statement)
+
+    def lookup(self, names):
+        """Return {name: shard} for the names that have been placed"""
+        names = list(names)
+        found = {}
+        with self._lock:
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                found.update(self._conn.execute(
+                    f"SELECT name, shard FROM placements WHERE name IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        return found
+
+    def place(self, name, shard):
+        """Claim a name on a shard; raises sqlite3.IntegrityError if any shard has it"""
+        with self._lock:
+            self._conn.execute("INSERT INTO placements (name, shard) VALUES (?, ?)", (name, shard))
+
+    def place_many(self, names, shard, replace=True):
+        """Point names at a shard in one transaction; without replace, keep existing placements"""
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.executemany(
+                    f"{verb} INTO placements (name, shard) VALUES (?, ?)", [(name, shard) for name in names]
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return cursor.rowcount
+
+    def remove(self, name):
+        with self._lock:
+            self._conn.execute("DELETE FROM placements WHERE name = ?", (name,))
+
+    def classroom(self, classroom, default=None):
+        """The classroom's shard; with a default, the first caller settles it for good"""
+        with self._lock:
+            if default is not None:
+                self._conn.execute("INSERT OR IGNORE INTO classrooms (classroom, shard) VALUES (?, ?)",
+                                   (classroom, default))
+            row = self._conn.execute("SELECT shard FROM classrooms WHERE classroom = ?", (classroom,)).fetchone()
+        return row[0] if row else None
+
+    def set_classroom(self, classroom, shard):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO classrooms (classroom, shard) VALUES (?, ?)",
+                               (classroom, shard))
+
+    def counts(self):
+        """Return {shard: placed users}"""
+        with self._lock:
+            return dict(self._conn.execute("SELECT shard, COUNT(*) FROM placements GROUP BY shard").fetchall())
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ShardRouter:
+    """The PhonicsStorage interface over several shard databases
+
+    Per-user calls go to the user's shard. Placements are cached per process; a
+    user who has moved is not found on the old shard, which sends the router back
+    to the directory, so a stale cache costs one extra query and never a lost write.
+    """
+
+    def __init__(self, shards, directory, pins=None, max_placements=DEFAULT_MAX_PLACEMENTS):
+        self.shards = shards
+        self.directory = directory
+        self.pins = dict(pins or {})
+        self.ring = HashRing(shards)
+        # Profile version slots sit next to the directory, shared by every process
+        self.db_path = directory.path
+        self.max_placements = max_placements
+        self._lock = threading.Lock()
+        self._placements = OrderedDict()
+        self._pool = ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix='shard-gather')
+        self.lookups = 0
+
+    @classmethod
+    def from_config(cls, path):
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        base = os.path.dirname(os.path.abspath(path))
+
+        def resolve(name):
+            return name if os.path.isabs(name) else os.path.join(base, name)
+
+        shards = config.get('shards')
+        if not isinstance(shards, dict) or not shards:
+            raise ValueError(f"{path} needs a non-empty 'shards' object")
+        pins = config.get('classrooms', {})
+        unknown = set(pins.values()) - set(shards)
+        if unknown:
+            raise ValueError(f"{path} pins classrooms to unknown shards {sorted(unknown)}")
+        directory = ShardDirectory(resolve(config.get('directory', 'directory.db')))
+        return cls({name: PhonicsStorage(resolve(db)) for name, db in shards.items()}, directory, pins)
+
+    # Placement
+
+    def _remember(self, placements):
+        with self._lock:
+            for name, shard in placements.items():
+                self._placements[name] = shard
+                self._placements.move_to_end(name)
+            while len(self._placements) > self.max_placements:
+                self._placements.popitem(last=False)
+
+    def forget(self, names):
+        with self._lock:
+            for name in names:
+                self._placements.pop(name, None)
+
+    def locate(self, names, refresh=False):
+        """Return {name: shard name}; names never placed fall back to the hash of the name"""
+        found = {}
+        if not refresh:
+            with self._lock:
+                for name in names:
+                    shard = self._placements.get(name)
+                    if shard is not None:
+                        found[name] = shard
+        missing = [name for name in names if name not in found]
+        if missing:
+            self.lookups += 1
+            placed = self.directory.lookup(missing)
+            fresh = {name: placed.get(name) or self.ring.shard(name) for name in missing}
+            self._remember(fresh)
+            found.update(fresh)
+        return found
+
+    def shard_of(self, name):
+        return self.shards[self.locate([name])[name]]
+
+    def _routed(self, method, name, *args):
+        """Call a per-user method on the user's shard; on a miss, check they have not moved"""
+        shard = self.locate([name])[name]
+        result = getattr(self.shards[shard], method)(name, *args)
+        if not result:
+            fresh = self.locate([name], refresh=True)[name]
+            if fresh != shard:
+                result = getattr(self.shards[fresh], method)(name, *args)
+        return result
+
+    def _gather(self, method, *args):
+        """Run a read on every shard in parallel and return the per-shard results"""
+        futures = [self._pool.submit(getattr(shard, method), *args) for shard in self.shards.values()]
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _unique(rows):
+        """Drop repeated names; a user being moved is briefly on two shards"""
+        seen = set()
+        unique = []
+        for row in rows:
+            if row[0] not in seen:
+                seen.add(row[0])
+                unique.append(row)
+        return unique
+
+    # Users
+
+    def create_user(self, name, theme='rainbow', favorite_activity='letter_sounds', classroom=None):
+        """Place the user, then create them on that shard; the directory keeps names unique"""
+        if classroom:
+            default = self.pins.get(classroom) or self.ring.shard(classroom)
+            shard = self.directory.classroom(classroom, default)
+        else:
+            shard = self.ring.shard(name)
+        self.directory.place(name, shard)
+        try:
+            user_id = self.shards[shard].create_user(name, theme, favorite_activity, classroom)
+        except BaseException:
+            self.directory.remove(name)
+            raise
+        self._remember({name: shard})
+        return user_id
+
+    def get_user_id(self, name):
+        return self._routed('get_user_id', name)
+
+    def get_profile(self, name):
+        return self._routed('get_profile', name)
+
+    def get_achievements(self, name):
+        return self._routed('get_achievements', name)
+
+    def top_users(self, limit, offset=0):
+        per_shard = self._gather('top_users', limit + offset)
+        rows = self._unique(heapq.merge(*per_shard, key=lambda row: row[1], reverse=True))
+        return rows[offset:offset + limit]
+
+    def get_users(self, names):
+        names = list(names)
+        placements = self.locate(names)
+        rows = []
+        for shard, group in _group(names, placements).items():
+            rows.extend(self.shards[shard].get_users(group))
+        missing = set(names) - {row[0] for row in rows}
+        if missing:
+            fresh = self.locate(missing, refresh=True)
+            moved = [name for name in missing if fresh[name] != placements[name]]
+            for shard, group in _group(moved, fresh).items():
+                rows.extend(self.shards[shard].get_users(group))
+        return rows
+
+    def search_users(self, prefix, limit=10):
+        rows = [row for part in self._gather('search_users', prefix, limit) for row in part]
+        return self._unique(sorted(rows, key=lambda row: row[0].lower()))[:limit]
+
+    # Progress
+
+    def record_progress(self, user_name, activity, content, score, time_spent, stars_earned, date=None):
+        event = (user_name, activity, content, score, time_spent, date or datetime.now().isoformat(), stars_earned)
+        return self.record_progress_batch([event]) == 1
+
+    def record_progress_batch(self, events, update_totals=True, skipped=None, unlocked=None, committed=None):
+        """Write each shard's share of the batch in one transaction per shard
+
+        User ids are local to a shard, so events are always matched by name. Events
+        a shard skips for a user it no longer has are re-routed once. Shards commit
+        one at a time, so if one fails the shards before it stay written: their events
+        are in committed, and a caller retrying the batch must resend only the rest.
+        """
+        if not events:
+            return 0
+        placements = self.locate({event[0] for event in events})
+        groups = {}
+        for event in events:
+            groups.setdefault(placements[event[0]], []).append(event)
+        written = 0
+        missed = []
+        for shard, group in groups.items():
+            written += self._write_shard(shard, group, update_totals, missed, unlocked, committed)
+        if missed:
+            fresh = self.locate({event[0] for event in missed}, refresh=True)
+            retry = {}
+            for event in missed:
+                if fresh[event[0]] != placements[event[0]]:
+                    retry.setdefault(fresh[event[0]], []).append(event)
+                elif skipped is not None:
+                    skipped.append(event)
+            for shard, group in retry.items():
+                written += self._write_shard(shard, group, update_totals, skipped, unlocked, committed)
+        return written
+
+    def _write_shard(self, shard, events, update_totals, skipped, unlocked, committed):
+        """Write events to one shard; skips, unlocks and committed events are reported once it commits"""
+        packed = [tuple(event[:7]) for event in events]
+        originals = {id(row): event for row, event in zip(packed, events)}
+        missing = []
+        earned = []
+        written = self.shards[shard].record_progress_batch(packed, update_totals, missing, earned)
+        missing_ids = {id(row) for row in missing}
+        if skipped is not None:
+            skipped.extend(originals[id(row)] for row in missing)
+        if unlocked is not None:
+            unlocked.extend(earned)
+        if committed is not None:
+            committed.extend(originals[id(row)] for row in packed if id(row) not in missing_ids)
+        return written
+
+    def progress_history(self, user_name, activity, since=None):
+        return self._routed('progress_history', user_name, activity, since)
+
+    def load_learner_state(self, user_name, activity):
+        return self._routed('load_learner_state', user_name, activity)
+
+    def save_learner_states(self, rows):
+        placements = self.locate({row[0] for row in rows})
+        groups = {}
+        for row in rows:
+            groups.setdefault(placements[row[0]], []).append(row)
+        for shard, group in groups.items():
+            self.shards[shard].save_learner_states(group)
+
+    # Reports
+
+    def child_daily_totals(self, user_name, since_day):
+        return self._routed('child_daily_totals', user_name, since_day)
+
+    def class_daily_totals(self, since_day, limit=50):
+        per_shard = self._gather('class_daily_totals', since_day, limit)
+        return self._unique(heapq.merge(*per_shard, key=lambda row: row[2], reverse=True))[:limit]
+
+    def content_daily_totals(self, activity, since_day):
+        totals = {}
+        for part in self._gather('content_daily_totals', activity, since_day):
+            for day, content, events, stars in part:
+                before = totals.get((day, content), (0, 0))
+                totals[(day, content)] = (before[0] + events, before[1] + stars)
+        return [key + value for key, value in sorted(totals.items())]
+
+    def migrate(self):
+        for shard in self.shards.values():
+            shard.migrate()
+
+    def warm(self):
+        return sum(shard.warm() for shard in self.shards.values())
+
+    def close(self):
+        self._pool.shutdown()
+        for shard in self.shards.values():
+            shard.close()
+        self.directory.close()
+
+
+def _group(names, placements):
+    groups = {}
+    for name in names:
+        groups.setdefault(placements[name], []).append(name)
+    return groups
+
+
+# Rebalancing
+
+def _copy_progress(source, target, ids, after, copy_rows):
+    """Copy the moved users' progress rows with ids after `after`; returns (rows, last id)"""
+    old_ids = json.dumps(list(ids))
+    copied = 0
+    while True:
+        with source.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT id, user_id, activity, content, score, time_spent, date, stars_earned FROM progress
+                WHERE id > ? AND user_id IN {_IDS} ORDER BY id LIMIT ?
+            """, (after, old_ids, copy_rows)).fetchall()
+        if not rows:
+            return copied, after
+        with target.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO progress (user_id, activity, content, score, time_spent, date, stars_earned)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(ids[row[1]],) + tuple(row[2:]) for row in rows])
+        copied += len(rows)
+        after = rows[-1][0]
+        if len(rows) < copy_rows:
+            return copied, after
+
+
+def _strays(router, shard_name, names=None):
+    """Return {user id: name} for users in a shard's database that the directory places elsewhere
+
+    These are copies left by a move that stopped before its cut-over (on the target)
+    or during it (on the source); the placed shard holds everything the user wrote.
+    Users with no placement yet are not strays: adopt has not seen them.
+    """
+    with router.shards[shard_name].connection() as conn:
+        if names is None:
+            rows = conn.execute("SELECT id, name FROM users").fetchall()
+        else:
+            rows = conn.execute(
+                f"SELECT id, name FROM users WHERE name IN ({','.join('?' * len(names))})", names
+            ).fetchall()
+    placements = router.directory.lookup(name for _, name in rows)
+    return {user_id: name for user_id, name in rows if placements.get(name, shard_name) != shard_name}
+
+
+def _discard(shard, ids):
+    """Delete users and every row keyed by their ids from one shard"""
+    ids = json.dumps(list(ids))
+    with shard.transaction() as conn:
+        for table in list(PER_USER_TABLES) + ['progress']:
+            conn.execute(f"DELETE FROM {table} WHERE user_id IN {_IDS}", (ids,))
+        conn.execute(f"DELETE FROM users WHERE id IN {_IDS}", (ids,))
+
+
+def _move(router, source_name, target_name, names, copy_rows, log):
+    source = router.shards[source_name]
+    target = router.shards[target_name]
+    placeholders = ','.join('?' * len(names))
+    with source.connection() as conn:
+        users = conn.execute(
+            f"SELECT id, {', '.join(USER_COLUMNS)} FROM users WHERE name IN ({placeholders})", names
+        ).fetchall()
+    if not users:
+        return 0
+    strays = _strays(router, target_name, [row[1] for row in users])
+    if strays:
+        # An earlier move stopped before its cut-over; the source still has the originals
+        _discard(target, strays)
+        log(f"{source_name} -> {target_name}: discarded {len(strays)} users left by an interrupted move")
+    clash = target.get_users([row[1] for row in users])
+    if clash:
+        raise ValueError(f"{source_name} -> {target_name}: {clash[0][0]!r} already exists on the target")
+
+    # 1. Users and their history so far, without holding the source's writer lock
+    ids = {}
+    with target.transaction() as conn:
+        for row in users:
+            ids[row[0]] = conn.execute(
+                f"INSERT INTO users ({', '.join(USER_COLUMNS)}) VALUES ({','.join('?' * len(USER_COLUMNS))})",
+                row[1:]
+            ).lastrowid
+    copied, last = _copy_progress(source, target, ids, 0, copy_rows)
+    log(f"{source_name} -> {target_name}: copied {len(users)} users, {copied} progress rows")
+
+    # 2. Catch up with progress written meanwhile until one pass has little left
+    for _ in range(MAX_CATCH_UP_PASSES):
+        copied, last = _copy_progress(source, target, ids, last, copy_rows)
+        if copied < copy_rows:
+            break
+
+    # 3. Cut over while the source's writers wait, usually for a few milliseconds
+    started = time.perf_counter()
+    old_ids = json.dumps(list(ids))
+    with source.transaction() as src:
+        copied, last = _copy_progress(source, target, ids, last, copy_rows)
+        totals = src.execute(
+            f"SELECT id, total_points, total_stars, level FROM users WHERE id IN {_IDS}", (old_ids,)
+        ).fetchall()
+        tables = {
+            table: src.execute(f"SELECT user_id, {', '.join(columns)} FROM {table} WHERE user_id IN {_IDS}",
+                               (old_ids,)).fetchall()
+            for table, columns in PER_USER_TABLES.items()
+        }
+        with target.transaction() as dst:
+            dst.executemany("UPDATE users SET total_points = ?, total_stars = ?, level = ? WHERE id = ?",
+                            [(points, stars, level, ids[old]) for old, points, stars, level in totals])
+            new_ids = json.dumps(list(ids.values()))
+            for table, columns in PER_USER_TABLES.items():
+                dst.execute(f"DELETE FROM {table} WHERE user_id IN {_IDS}", (new_ids,))
+                dst.executemany(
+                    f"INSERT INTO {table} (user_id, {', '.join(columns)}) "
+                    f"VALUES ({','.join('?' * (len(columns) + 1))})",
+                    [(ids[row[0]],) + tuple(row[1:]) for row in tables[table]]
+                )
+        router.directory.place_many([row[1] for row in users], target_name)
+        for table in list(PER_USER_TABLES) + ['progress']:
+            src.execute(f"DELETE FROM {table} WHERE user_id IN {_IDS}", (old_ids,))
+        src.execute(f"DELETE FROM users WHERE id IN {_IDS}", (old_ids,))
+    log(f"{source_name} -> {target_name}: cut over in {(time.perf_counter() - started) * 1000:.1f} ms "
+        f"({copied} late progress rows)")
+    return len(users)
+
+
+def move_users(router, names, target, copy_rows=DEFAULT_COPY_ROWS, log=print):
+    """Move users to the target shard while the app keeps serving them
+
+    Users and their progress are copied in chunks, progress written meanwhile is
+    copied in catch-up passes, and the last few rows, totals and per-user rollups
+    move in one write transaction on the source that also repoints the directory
+    and deletes the originals. A process still sending a moved user's progress to
+    the source has it skipped there and re-routed, so nothing is lost.
+    """
+    if target not in router.shards:
+        raise ValueError(f"Unknown shard {target!r}")
+    names = list(names)
+    moved = 0
+    for source, group in _group(names, router.locate(names, refresh=True)).items():
+        if source != target:
+            for start in range(0, len(group), 500):
+                moved += _move(router, source, target, group[start:start + 500], copy_rows, log)
+    router.forget(names)
+    # Cached profiles elsewhere hold the old shard's user ids; make them reload
+    versions = VersionTable(router.db_path + '-versions')
+    versions.bump(names)
+    versions.close()
+    return moved
+
+
+def move_classroom(router, classroom, target, copy_rows=DEFAULT_COPY_ROWS, log=print):
+    """Move a classroom's children to target; its new children join target from now on"""
+    if target not in router.shards:
+        raise ValueError(f"Unknown shard {target!r}")
+    router.directory.set_classroom(classroom, target)
+    names = [name for part in router._gather('classroom_members', classroom) for name in part]
+    return move_users(router, names, target, copy_rows, log)
+
+
+def repair(router):
+    """Delete the stray copies interrupted moves left behind; returns {shard: users deleted}
+
+    Run it while no move is in progress, since a running move's copy is a stray until
+    its cut-over.
+    """
+    repaired = {}
+    for shard_name, shard in router.shards.items():
+        strays = _strays(router, shard_name)
+        if strays:
+            _discard(shard, strays)
+        repaired[shard_name] = len(strays)
+    return repaired
+
+
+def adopt(router):
+    """Record placements for users already in the shard databases, e.g. after splitting one"""
+    placed = {}
+    for shard_name, shard in router.shards.items():
+        with shard.connection() as conn:
+            rows = conn.execute("SELECT name, classroom FROM users").fetchall()
+        placed[shard_name] = router.directory.place_many([name for name, _ in rows], shard_name, replace=False)
+        for classroom in {classroom for _, classroom in rows if classroom}:
+            router.directory.classroom(classroom, shard_name)
+    return placed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shard placement and rebalancing")
+    parser.add_argument('--config', default=SHARD_CONFIG, help="shards.json (default: $PHONICS_SHARDS)")
+    parser.add_argument('--copy-rows', type=int, default=DEFAULT_COPY_ROWS)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status', help="users per shard")
+    sub.add_parser('adopt', help="place users already in the shard databases")
+    classroom_parser = sub.add_parser('move-classroom', help="move a classroom to another shard online")
+    classroom_parser.add_argument('classroom')
+    classroom_parser.add_argument('shard')
+    user_parser = sub.add_parser('move-user', help="move one user to another shard online")
+    user_parser.add_argument('name')
+    user_parser.add_argument('shard')
+    sub.add_parser('repair', help="delete copies left by interrupted moves (not while a move runs)")
+    args = parser.parse_args()
+    if not args.config:
+        parser.error("set PHONICS_SHARDS or pass --config")
+
+    router = ShardRouter.from_config(args.config)
+    try:
+        if args.command == 'status':
+            placed = router.directory.counts()
+            for name, shard in router.shards.items():
+                with shard.connection() as conn:
+                    users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+                size = os.path.getsize(shard.db_path) / 1e6
+                print(f"{name}: {users} users ({placed.get(name, 0)} placed), {size:.1f} MB  {shard.db_path}")
+        elif args.command == 'adopt':
+            for name, count in adopt(router).items():
+                print(f"{name}: placed {count} users")
+        elif args.command == 'repair':
+            for name, count in repair(router).items():
+                print(f"{name}: deleted {count} stray users")
+        elif args.command == 'move-classroom':
+            moved = move_classroom(router, args.classroom, args.shard, args.copy_rows)
+            print(f"moved {moved} users of {args.classroom} to {args.shard}")
+        else:
+            moved = move_users(router, [args.name], args.shard, args.copy_rows)
+            print(f"moved {moved} users to {args.shard}")
+    finally:
+        router.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# phonics_startup.py - Cold-start benchmark: import time, first rerun and steady-state reruns
+#
+# Each run starts a fresh interpreter in an empty working directory, so the database,
+# compiled word list and clip cache are all built from nothing, as on a new pod. The
+# 'serve' start warms the process first (python phonics_runtime.py serve); the 'lazy'
+# start leaves warm-up to the first rerun (plain streamlit run). Examples:
+#     python phonics_startup.py --runs 5 --output startup.json
+#     python phonics_startup.py --runs 5 --compare startup.json
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from phonics_bench import APP_DIR, APP_PATH, git_commit, summarize
+
+STARTS = ('serve', 'lazy')
+
+
+def child(start, reruns):
+    """Measure one process start; runs inside the fresh interpreter"""
+    started = time.perf_counter()
+    import streamlit  # noqa: F401
+    from streamlit.testing.v1 import AppTest
+    streamlit_s = time.perf_counter() - started
+    import phonics_runtime
+    import_s = time.perf_counter() - started
+
+    warm_s = None
+    if start == 'serve':
+        began = time.perf_counter()
+        phonics_runtime.warm_up()
+        warm_s = time.perf_counter() - began
+
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+    began = time.perf_counter()
+    app.run()
+    first_s = time.perf_counter() - began
+    errors = [exc.message for exc in app.exception]
+
+    app.text_input(key='new_user_input').input('startup-child')
+    app.button(key='create_user').click().run()
+    app.button(key='start_learning').click().run()
+    app.button(key='activity_letter_sounds').click().run()
+    samples = []
+    for i in range(reruns):
+        action = app.button(key='speak_letter' if i % 3 else 'next_letter').click()
+        began = time.perf_counter()
+        action.run()
+        samples.append(time.perf_counter() - began)
+        errors.extend(exc.message for exc in app.exception)
+    phonics_runtime.get_runtime().services.journal.close()
+
+    return {
+        'streamlit_import_s': streamlit_s,
+        'import_s': import_s,
+        'warm_s': warm_s,
+        'warm_steps': phonics_runtime.get_runtime().timings,
+        'first_rerun_s': first_s,
+        'reruns': samples,
+        'errors': errors[:5],
+    }
+
+
+def measure(start, reruns):
+    """Run one fresh process in an empty directory and return its measurements"""
+    workdir = tempfile.mkdtemp(prefix='phonics-startup-')
+    env = dict(os.environ)
+    env['PHONICS_SKIP_SPLASH'] = '1'
+    # A new pod has no compiled word list yet
+    env['PHONICS_CONTENT_CACHE_DIR'] = os.path.join(workdir, 'content_cache')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [APP_DIR, env.get('PYTHONPATH')]))
+    began = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', start, '--reruns', str(reruns)],
+        cwd=workdir, env=env, capture_output=True, text=True
+    )
+    if result.returncode:
+        raise RuntimeError(f"{start} start failed:\n{result.stderr[-2000:]}")
+    part = json.loads(result.stdout.splitlines()[-1])
+    part['process_s'] = time.perf_counter() - began
+    return part
+
+
+def _median_ms(parts, key):
+    values = [part[key] for part in parts if part[key] is not None]
+    return round(statistics.median(values) * 1000.0, 3) if values else None
+
+
+def run_benchmark(runs, reruns):
+    results = {
+        'config': {'runs': runs, 'reruns': reruns},
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'starts': {},
+    }
+    for start in STARTS:
+        parts = [measure(start, reruns) for _ in range(runs)]
+        results['starts'][start] = {
+            'streamlit_import_ms': _median_ms(parts, 'streamlit_import_s'),
+            'import_ms': _median_ms(parts, 'import_s'),
+            'warm_ms': _median_ms(parts, 'warm_s'),
+            'first_rerun_ms': _median_ms(parts, 'first_rerun_s'),
+            # Time from interpreter start until the first child sees a screen
+            'time_to_first_screen_ms': round(statistics.median(
+                part['import_s'] + (part['warm_s'] or 0) + part['first_rerun_s'] for part in parts) * 1000.0, 3),
+            'steady_rerun': summarize([sample for part in parts for sample in part['reruns']]),
+            'warm_steps_ms': {label: round(statistics.median(part['warm_steps'].get(label, 0) for part in parts)
+                                           * 1000.0, 3) for label in parts[0]['warm_steps']},
+            'errors': [error for part in parts for error in part['errors']][:5],
+        }
+    return results
+
+
+def print_report(results):
+    print(f"{results['config']['runs']} fresh processes per start, "
+          f"{results['config']['reruns']} steady reruns each (medians)")
+    print(f"{'start':<6} {'import ms':>10} {'warm ms':>9} {'1st rerun':>10} {'to screen':>10} "
+          f"{'p50 ms':>8} {'p95 ms':>8}")
+    for start, stats in results['starts'].items():
+        print(f"{start:<6} {stats['import_ms']:>10.1f} {stats['warm_ms'] or 0:>9.1f} "
+              f"{stats['first_rerun_ms']:>10.1f} {stats['time_to_first_screen_ms']:>10.1f} "
+              f"{stats['steady_rerun']['p50_ms'] or 0:>8.2f} {stats['steady_rerun']['p95_ms'] or 0:>8.2f}")
+        if stats['warm_steps_ms']:
+            print('       warm-up: ' + ', '.join(f"{label} {ms:.1f}" for label, ms in stats['warm_steps_ms'].items()))
+        for error in stats['errors']:
+            print(f"       error: {error}")
+
+
+def compare(baseline, current):
+    """Print changes in the startup figures between two result files"""
+    print(f"\nComparison against {baseline.get('commit')}:")
+    for start, stats in current['starts'].items():
+        before = baseline.get('starts', {}).get(start)
+        if not before:
+            continue
+        rows = [(key, before.get(key), stats[key]) for key in ('import_ms', 'first_rerun_ms', 'time_to_first_screen_ms')]
+        rows.append(('steady p95_ms', before.get('steady_rerun', {}).get('p95_ms'), stats['steady_rerun']['p95_ms']))
+        for key, old, new in rows:
+            if not old or new is None:
+                continue
+            print(f"  {start:<6} {key:<24} {old:>9.2f} -> {new:>9.2f} ({(new - old) / old * 100.0:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start and steady-state rerun latency")
+    parser.add_argument('--runs', type=int, default=3, help="fresh processes per start mode")
+    parser.add_argument('--reruns', type=int, default=30, help="steady-state reruns per process")
+    parser.add_argument('--output', help="write machine-readable results to this JSON file")
+    parser.add_argument('--compare', help="baseline results file to compare against")
+    parser.add_argument('--child', choices=STARTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.child, args.reruns)))
+        return
+
+    results = run_benchmark(args.runs, args.reruns)
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,500 @@
+# phonics_storage.py - Process-wide SQLite storage engine for the phonics app
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from phonics_achievements import apply_progress
+from phonics_metrics import registry, TimedConnection
+
+DEFAULT_DB_PATH = 'phonics_kids_web.db'
+DEFAULT_POOL_SIZE = 8
+
+# Connection pragmas applied to every pooled connection
+PRAGMAS = (
+    # Takes effect on new databases; older ones convert with phonics_maintenance.py vacuum
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",
+)
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    (1, [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE,
+            created_date TEXT,
+            total_points INTEGER DEFAULT 0,
+            level TEXT DEFAULT 'beginner',
+            theme TEXT DEFAULT 'rainbow',
+            total_stars INTEGER DEFAULT 0,
+            favorite_activity TEXT DEFAULT 'letter_sounds'
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS progress (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            activity TEXT,
+            content TEXT,
+            score INTEGER,
+            time_spent INTEGER,
+            date TEXT,
+            stars_earned INTEGER DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+    ]),
+    (2, [
+        "CREATE INDEX IF NOT EXISTS idx_users_total_points ON users (total_points DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_users_name_nocase ON users (name COLLATE NOCASE)",
+    ]),
+    (3, [
+        "CREATE INDEX IF NOT EXISTS idx_progress_user_date ON progress (user_id, date)",
+        "CREATE INDEX IF NOT EXISTS idx_progress_activity_date ON progress (activity, date)",
+        '''
+        CREATE TABLE IF NOT EXISTS daily_user_rollup (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            activity TEXT NOT NULL,
+            events INTEGER NOT NULL DEFAULT 0,
+            points INTEGER NOT NULL DEFAULT 0,
+            stars INTEGER NOT NULL DEFAULT 0,
+            time_spent INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, activity)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS daily_content_rollup (
+            day TEXT NOT NULL,
+            activity TEXT NOT NULL,
+            content TEXT NOT NULL,
+            events INTEGER NOT NULL DEFAULT 0,
+            points INTEGER NOT NULL DEFAULT 0,
+            stars INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, activity, content)
+        ) WITHOUT ROWID
+        ''',
+        # Backfill the rollups from whatever progress already exists
+        '''
+        INSERT OR REPLACE INTO daily_user_rollup (user_id, day, activity, events, points, stars, time_spent)
+        SELECT user_id, substr(date, 1, 10), activity, COUNT(*), SUM(score), SUM(stars_earned), SUM(time_spent)
+        FROM progress WHERE user_id IS NOT NULL AND activity IS NOT NULL
+        GROUP BY user_id, substr(date, 1, 10), activity
+        ''',
+        '''
+        INSERT OR REPLACE INTO daily_content_rollup (day, activity, content, events, points, stars)
+        SELECT substr(date, 1, 10), activity, content, COUNT(*), SUM(score), SUM(stars_earned)
+        FROM progress WHERE activity IS NOT NULL AND content IS NOT NULL
+        GROUP BY substr(date, 1, 10), activity, content
+        ''',
+    ]),
+    (4, [
+        "CREATE INDEX IF NOT EXISTS idx_progress_date ON progress (date)",
+        # Raw progress folded away by compaction, one row per user, day and content
+        '''
+        CREATE TABLE IF NOT EXISTS progress_daily (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            activity TEXT NOT NULL,
+            content TEXT NOT NULL,
+            events INTEGER NOT NULL DEFAULT 0,
+            score INTEGER NOT NULL DEFAULT 0,
+            stars INTEGER NOT NULL DEFAULT 0,
+            time_spent INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, activity, content)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (5, [
+        # Packed spaced-repetition queues; watermark is the newest progress date folded in
+        '''
+        CREATE TABLE IF NOT EXISTS learner_state (
+            user_id INTEGER NOT NULL,
+            activity TEXT NOT NULL,
+            watermark TEXT NOT NULL,
+            state BLOB NOT NULL,
+            PRIMARY KEY (user_id, activity)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (6, [
+        # Tenant key for sharding: a classroom's children live on one shard
+        "ALTER TABLE users ADD COLUMN classroom TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_users_classroom ON users (classroom)",
+    ]),
+    (7, [
+        # Packed per-user counters the achievement rules read (see phonics_achievements.py)
+        "CREATE TABLE IF NOT EXISTS user_counters (user_id INTEGER PRIMARY KEY, state BLOB NOT NULL)",
+        '''
+        CREATE TABLE IF NOT EXISTS achievements (
+            user_id INTEGER NOT NULL,
+            achievement TEXT NOT NULL,
+            unlocked_at TEXT,
+            PRIMARY KEY (user_id, achievement)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+]
+
+
+class PhonicsStorage:
+    """Thread-safe storage engine shared by every session in the process"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, pool_size=DEFAULT_POOL_SIZE):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._created = 0
+        self._pool_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self.migrate()
+
+    def _open_connection(self):
+        """Open a new connection with the app pragmas applied"""
+        factory = TimedConnection if registry.enabled else sqlite3.Connection
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, factory=factory)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out of the pool for the current thread"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            # Re-entrant use on the same thread shares the checked-out connection
+            yield held
+            return
+
+        conn = None
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                if self._created < self.pool_size:
+                    self._created += 1
+                    conn = self._open_connection()
+            if conn is None:
+                conn = self._pool.get()
+
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Run a write transaction, serialized across threads in this process"""
+        with self._write_lock, self.connection() as conn:
+            if conn.in_transaction:
+                # Nested call joins the outer transaction
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def migrate(self):
+        """Bring the schema up to the latest migration"""
+        with self.transaction() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, statements in MIGRATIONS:
+                if target <= version:
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {int(target)}")
+
+    def warm(self):
+        """Open the whole pool and prepare the hot read statements on every connection
+
+        sqlite3 caches compiled statements per connection, keyed by SQL text, so running
+        each hot query once per pooled connection means no rerun pays to compile them.
+        """
+        with self._pool_lock:
+            while self._created < self.pool_size:
+                self._created += 1
+                self._pool.put(self._open_connection())
+        conns = []
+        while True:
+            try:
+                conns.append(self._pool.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            for conn in conns:
+                # Holding the connection makes the read methods below run on it
+                self._local.conn = conn
+                try:
+                    self.get_user_id('')
+                    self.get_profile('')
+                    self.get_achievements('')
+                    self.top_users(1)
+                    self.search_users('', 1)
+                finally:
+                    self._local.conn = None
+        finally:
+            for conn in conns:
+                self._pool.put(conn)
+        return len(conns)
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._pool_lock:
+            while True:
+                try:
+                    self._pool.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._created = 0
+
+    # Users
+
+    def create_user(self, name, theme='rainbow', favorite_activity='letter_sounds', classroom=None):
+        """Insert a new user; raises sqlite3.IntegrityError if the name exists"""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO users (name, created_date, theme, favorite_activity, classroom) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (name, datetime.now().isoformat(), theme, favorite_activity, classroom)
+            )
+            return cursor.lastrowid
+
+    def get_user_id(self, name):
+        """Look up a user's id by name"""
+        with self.connection() as conn:
+            row = conn.execute("SELECT id FROM users WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def get_profile(self, name):
+        """Return (id, total_points, total_stars, level) for a user, or None"""
+        with self.connection() as conn:
+            return conn.execute(
+                "SELECT id, total_points, total_stars, level FROM users WHERE name = ?", (name,)
+            ).fetchone()
+
+    def top_users(self, limit, offset=0):
+        """Return a page of (name, total_points, level, total_stars) rows ordered by points"""
+        with self.connection() as conn:
+            return conn.execute(
+                "SELECT name, total_points, level, total_stars FROM users "
+                "ORDER BY total_points DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+
+    def get_users(self, names):
+        """Return (name, total_points, level, total_stars) rows for the given names"""
+        names = list(names)
+        rows = []
+        with self.connection() as conn:
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows.extend(conn.execute(
+                    "SELECT name, total_points, level, total_stars FROM users "
+                    f"WHERE name IN ({placeholders})", chunk
+                ).fetchall())
+        return rows
+
+    def search_users(self, prefix, limit=10):
+        """Return users whose name starts with prefix (case-insensitive) via the name index"""
+        with self.connection() as conn:
+            return conn.execute(
+                "SELECT name, total_points, level, total_stars FROM users "
+                "WHERE name >= ? COLLATE NOCASE AND name < ? COLLATE NOCASE "
+                "ORDER BY name COLLATE NOCASE LIMIT ?",
+                (prefix, prefix + '\U0010ffff', limit)
+            ).fetchall()
+
+    def get_achievements(self, name):
+        """Return (achievement, unlocked_at) rows for a user, oldest first"""
+        with self.connection() as conn:
+            return conn.execute("""
+                SELECT a.achievement, a.unlocked_at FROM achievements AS a JOIN users ON users.id = a.user_id
+                WHERE users.name = ? ORDER BY a.unlocked_at, a.achievement
+            """, (name,)).fetchall()
+
+    def classroom_members(self, classroom):
+        """Names of the users in a classroom"""
+        with self.connection() as conn:
+            return [row[0] for row in conn.execute("SELECT name FROM users WHERE classroom = ?", (classroom,))]
+
+    # Progress
+
+    def record_progress(self, user_name, activity, content, score, time_spent, stars_earned, date=None):
+        """Record one activity result and update the user's totals atomically"""
+        event = (user_name, activity, content, score, time_spent, date or datetime.now().isoformat(), stars_earned)
+        return self.record_progress_batch([event]) == 1
+
+    def record_progress_batch(self, events, update_totals=True, skipped=None, unlocked=None, committed=None):
+        """Record many progress events in one transaction
+
+        Each event is a (user_name, activity, content, score, time_spent, date, stars_earned)
+        sequence, optionally followed by a known user_id that saves the name lookup.
+        Events for unknown users are skipped, and appended to the skipped list if one is
+        given. Returns the number written. Pass update_totals=False for history whose
+        points are already in users.total_points. Achievements and level-ups earned by
+        the batch are written in the same transaction and appended to unlocked. The
+        written events are appended to committed once the transaction commits.
+        """
+        if not events:
+            return 0
+        with self.transaction() as conn:
+            names = list({event[0] for event in events if len(event) < 8 or event[7] is None})
+            user_ids = {}
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                user_ids.update(conn.execute(
+                    f"SELECT name, id FROM users WHERE name IN ({placeholders})", chunk
+                ).fetchall())
+
+            rows = []
+            totals = {}
+            names = {}
+            for event in events:
+                user_name, activity, content, score, time_spent, date, stars_earned = event[:7]
+                user_id = event[7] if len(event) > 7 and event[7] is not None else user_ids.get(user_name)
+                if user_id is None:
+                    if skipped is not None:
+                        skipped.append(event)
+                    continue
+                rows.append((user_id, activity, content, score, time_spent, date, stars_earned))
+                names[user_id] = user_name
+                points, stars = totals.get(user_id, (0, 0))
+                totals[user_id] = (points + score, stars + stars_earned)
+
+            conn.executemany("""
+                INSERT INTO progress (user_id, activity, content, score, time_spent, date, stars_earned)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            if update_totals:
+                conn.executemany(
+                    "UPDATE users SET total_points = total_points + ?, total_stars = total_stars + ? WHERE id = ?",
+                    [(points, stars, user_id) for user_id, (points, stars) in totals.items()]
+                )
+            self._update_rollups(conn, rows)
+            if rows:
+                apply_progress(conn, rows, names, unlocked)
+        if committed is not None:
+            missing = {id(event) for event in skipped} if skipped else set()
+            committed.extend(event for event in events if id(event) not in missing)
+        return len(rows)
+
+    def _update_rollups(self, conn, rows):
+        """Fold freshly inserted progress rows into the daily rollup tables"""
+        per_user = {}
+        per_content = {}
+        for user_id, activity, content, score, time_spent, date, stars_earned in rows:
+            day = date[:10]
+            events, points, stars, spent = per_user.get((user_id, day, activity), (0, 0, 0, 0))
+            per_user[(user_id, day, activity)] = (events + 1, points + score, stars + stars_earned,
+                                                  spent + time_spent)
+            if content is None:
+                # Same as the migration's backfill: the content rollup is keyed by content
+                continue
+            events, points, stars = per_content.get((day, activity, content), (0, 0, 0))
+            per_content[(day, activity, content)] = (events + 1, points + score, stars + stars_earned)
+
+        conn.executemany("""
+            INSERT INTO daily_user_rollup (user_id, day, activity, events, points, stars, time_spent)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, day, activity) DO UPDATE SET
+                events = events + excluded.events, points = points + excluded.points,
+                stars = stars + excluded.stars, time_spent = time_spent + excluded.time_spent
+        """, [key + value for key, value in per_user.items()])
+        conn.executemany("""
+            INSERT INTO daily_content_rollup (day, activity, content, events, points, stars)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (day, activity, content) DO UPDATE SET
+                events = events + excluded.events, points = points + excluded.points,
+                stars = stars + excluded.stars
+        """, [key + value for key, value in per_content.items()])
+
+    def progress_history(self, user_name, activity, since=None):
+        """Return (content, date, score) for a user's activity in date order
+
+        With since, only rows written after that date. Without it, days already folded
+        away by compaction come first, one row per day and item.
+        """
+        with self.connection() as conn:
+            user_id = conn.execute("SELECT id FROM users WHERE name = ?", (user_name,)).fetchone()
+            if user_id is None:
+                return []
+            rows = []
+            if since is None:
+                rows.extend(conn.execute("""
+                    SELECT content, day, score FROM progress_daily
+                    WHERE user_id = ? AND activity = ? ORDER BY day
+                """, (user_id[0], activity)).fetchall())
+            rows.extend(conn.execute("""
+                SELECT content, date, score FROM progress
+                WHERE user_id = ? AND date > ? AND activity = ? ORDER BY date
+            """, (user_id[0], since or '', activity)).fetchall())
+            return rows
+
+    # Spaced-repetition state
+
+    def load_learner_state(self, user_name, activity):
+        """Return (watermark, state) saved for a user's activity, or None"""
+        with self.connection() as conn:
+            return conn.execute("""
+                SELECT s.watermark, s.state FROM learner_state AS s JOIN users ON users.id = s.user_id
+                WHERE users.name = ? AND s.activity = ?
+            """, (user_name, activity)).fetchone()
+
+    def save_learner_states(self, rows):
+        """Upsert (user_name, activity, watermark, state) rows in one transaction"""
+        with self.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO learner_state (user_id, activity, watermark, state)
+                SELECT id, ?, ?, ? FROM users WHERE name = ?
+                ON CONFLICT (user_id, activity) DO UPDATE SET
+                    watermark = excluded.watermark, state = excluded.state
+            """, [(activity, watermark, state, user_name) for user_name, activity, watermark, state in rows])
+
+    # Reports, served from the daily rollups only
+
+    def child_daily_totals(self, user_name, since_day):
+        """Return (day, events, points, stars, time_spent) per day for one child"""
+        with self.connection() as conn:
+            return conn.execute("""
+                SELECT r.day, SUM(r.events), SUM(r.points), SUM(r.stars), SUM(r.time_spent)
+                FROM daily_user_rollup AS r JOIN users ON users.id = r.user_id
+                WHERE users.name = ? AND r.day >= ?
+                GROUP BY r.day ORDER BY r.day
+            """, (user_name, since_day)).fetchall()
+
+    def class_daily_totals(self, since_day, limit=50):
+        """Return (name, events, stars, active_days) per child since a day, most stars first"""
+        with self.connection() as conn:
+            return conn.execute("""
+                SELECT users.name, SUM(r.events), SUM(r.stars), COUNT(DISTINCT r.day)
+                FROM daily_user_rollup AS r JOIN users ON users.id = r.user_id
+                WHERE r.day >= ?
+                GROUP BY r.user_id ORDER BY SUM(r.stars) DESC LIMIT ?
+            """, (since_day, limit)).fetchall()
+
+    def content_daily_totals(self, activity, since_day):
+        """Return (day, content, events, stars) for one activity since a day"""
+        with self.connection() as conn:
+            return conn.execute("""
+                SELECT day, content, events, stars FROM daily_content_rollup
+                WHERE day >= ? AND activity = ?
+                ORDER BY day, content
+            """, (since_day, activity)).fetchall()
@@ -0,0 +1,174 @@
+# phonics_styles.py - Precompiled stylesheets for the phonics app
+from functools import lru_cache
+
+# Theme colour keys, each exposed to the stylesheet as var(--theme-<key>)
+THEME_KEYS = ('bg', 'primary', 'secondary', 'accent', 'text', 'button')
+
+# Shared stylesheet, identical for every theme; colours come from the theme variables block
+BASE_CSS = """<style>
+.stApp {
+    background: linear-gradient(135deg, var(--theme-bg), var(--theme-secondary));
+    font-family: 'Comic Neue', 'Comic Sans MS', cursive;
+}
+
+.main-title {
+    font-size: 3rem;
+    font-weight: bold;
+    text-align: center;
+    background: linear-gradient(45deg, #FF0000, #FF7F00, #FFFF00, #00FF00, #0000FF, #4B0082, #9400D3);
+    -webkit-background-clip: text;
+    -webkit-text-fill-color: transparent;
+    background-clip: text;
+    margin-bottom: 2rem;
+    animation: rainbow 3s ease-in-out infinite alternate;
+}
+
+.magic-card {
+    background: linear-gradient(135deg, var(--theme-primary), var(--theme-accent));
+    border-radius: 20px;
+    padding: 2rem;
+    box-shadow: 0 8px 32px rgba(0,0,0,0.3);
+    border: 3px solid var(--theme-accent);
+    text-align: center;
+    transition: transform 0.3s ease;
+    margin: 1rem;
+}
+
+.magic-card:hover {
+    transform: translateY(-10px) scale(1.02);
+    box-shadow: 0 12px 40px rgba(0,0,0,0.4);
+}
+
+.letter-bubble {
+    background: linear-gradient(135deg, #FFD700, #FFA500);
+    border-radius: 50%;
+    width: 200px;
+    height: 200px;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    margin: 2rem auto;
+    box-shadow: 0 8px 32px rgba(255,215,0,0.5);
+    animation: float 3s ease-in-out infinite;
+}
+
+.letter-text {
+    font-size: 6rem;
+    font-weight: bold;
+    color: var(--theme-button);
+    text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
+}
+
+.celebration {
+    animation: celebrate 1s ease-in-out;
+}
+
+.sound-row {
+    text-align: center;
+    margin: 2rem 0;
+}
+
+.sound-tile {
+    display: inline-block;
+    min-width: 4rem;
+    padding: 0.5rem 1rem;
+    margin: 0.3rem;
+    border-radius: 15px;
+    background: linear-gradient(135deg, #FFD700, #FFA500);
+    box-shadow: 0 4px 16px rgba(255,215,0,0.5);
+    font-size: 2.5rem;
+    font-weight: bold;
+    color: var(--theme-button);
+}
+
+.sound-tile.empty {
+    background: rgba(255,255,255,0.5);
+    color: transparent;
+}
+
+.achievement-row {
+    text-align: center;
+    margin: 1rem 0;
+}
+
+.achievement-badge {
+    display: inline-block;
+    padding: 0.4rem 1rem;
+    margin: 0.3rem;
+    border-radius: 20px;
+    background: linear-gradient(135deg, #FFD700, #FFA500);
+    color: white;
+    font-weight: bold;
+    box-shadow: 0 4px 12px rgba(255,165,0,0.4);
+}
+
+.score-display {
+    background: linear-gradient(135deg, var(--theme-accent), var(--theme-primary));
+    color: white;
+    padding: 1rem 2rem;
+    border-radius: 25px;
+    font-size: 1.5rem;
+    font-weight: bold;
+    text-align: center;
+    box-shadow: 0 4px 16px rgba(0,0,0,0.3);
+    margin: 1rem;
+}
+
+.mascot-speech {
+    background: white;
+    border: 3px solid var(--theme-primary);
+    border-radius: 20px;
+    padding: 1rem;
+    position: relative;
+    box-shadow: 0 4px 16px rgba(0,0,0,0.2);
+    margin: 1rem;
+}
+
+@keyframes rainbow {
+    0% { filter: hue-rotate(0deg); }
+    100% { filter: hue-rotate(360deg); }
+}
+
+@keyframes float {
+    0%, 100% { transform: translateY(0px); }
+    50% { transform: translateY(-20px); }
+}
+
+@keyframes celebrate {
+    0% { transform: scale(1) rotate(0deg); }
+    25% { transform: scale(1.1) rotate(5deg); }
+    50% { transform: scale(1.2) rotate(-5deg); }
+    75% { transform: scale(1.1) rotate(5deg); }
+    100% { transform: scale(1) rotate(0deg); }
+}
+
+.stButton > button {
+    background: linear-gradient(135deg, var(--theme-button), var(--theme-primary));
+    color: white;
+    border: none;
+    border-radius: 25px;
+    padding: 0.75rem 2rem;
+    font-size: 1.2rem;
+    font-weight: bold;
+    font-family: 'Comic Neue', 'Comic Sans MS', cursive;
+    box-shadow: 0 4px 16px rgba(0,0,0,0.3);
+    transition: all 0.3s ease;
+}
+
+.stButton > button:hover {
+    transform: translateY(-3px);
+    box-shadow: 0 8px 24px rgba(0,0,0,0.4);
+}
+</style>"""
+
+
+@lru_cache(maxsize=None)
+def _compile_theme_css(colors):
+    """Build the per-theme variables block from (key, colour) pairs"""
+    declarations = ' '.join(f'--theme-{key}: {color};' for key, color in colors)
+    return f'<style>:root {{ {declarations} }}</style>'
+
+
+def theme_css(theme):
+    """Return the small, memoized variables block for one theme dict"""
+    return _compile_theme_css(tuple((key, theme[key]) for key in THEME_KEYS))
@@ -0,0 +1,315 @@
+# phonics_transfer.py - Streaming bulk export and import of users and progress
+#
+#     python phonics_transfer.py export users --format csv --output users.csv
+#     python phonics_transfer.py export progress --format ndjson --output - | gzip > progress.ndjson.gz
+#     python phonics_transfer.py import users roster.csv
+#     python phonics_transfer.py import progress history.ndjson
+#     python phonics_transfer.py export progress_daily --output daily.csv
+#
+# Exports read through one cursor with fetchmany, so memory stays flat whatever
+# the table size. Imports insert in large executemany batches; users whose name
+# already exists are skipped, just as the UNIQUE constraint on users.name does.
+# Progress that compaction folded into progress_daily is exported separately; a
+# full copy is users, then progress_daily, then progress. Imports bump the users'
+# version slots so running apps reload their cached profiles and leaderboard.
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+
+from phonics_profiles import VersionTable
+from phonics_storage import PhonicsStorage, DEFAULT_DB_PATH
+
+DEFAULT_CHUNK_ROWS = 5000
+
+USER_COLUMNS = ('id', 'name', 'created_date', 'total_points', 'level', 'theme', 'total_stars',
+                'favorite_activity', 'classroom')
+PROGRESS_COLUMNS = ('id', 'user_name', 'activity', 'content', 'score', 'time_spent', 'date', 'stars_earned')
+DAILY_COLUMNS = ('user_name', 'day', 'activity', 'content', 'events', 'score', 'stars', 'time_spent')
+
+EXPORT_QUERIES = {
+    'users': f"SELECT {', '.join(USER_COLUMNS)} FROM users ORDER BY id",
+    # Progress is exported with the user's name so it can be imported into another database
+    'progress': """
+        SELECT progress.id, users.name, progress.activity, progress.content, progress.score,
+               progress.time_spent, progress.date, progress.stars_earned
+        FROM progress LEFT JOIN users ON users.id = progress.user_id
+        ORDER BY progress.id
+    """,
+    'progress_daily': """
+        SELECT users.name, progress_daily.day, progress_daily.activity, progress_daily.content,
+               progress_daily.events, progress_daily.score, progress_daily.stars, progress_daily.time_spent
+        FROM progress_daily LEFT JOIN users ON users.id = progress_daily.user_id
+        ORDER BY progress_daily.user_id, progress_daily.day
+    """,
+}
+EXPORT_COLUMNS = {'users': USER_COLUMNS, 'progress': PROGRESS_COLUMNS, 'progress_daily': DAILY_COLUMNS}
+TABLES = tuple(EXPORT_QUERIES)
+
+
+def iter_rows(storage, table, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield rows of users or progress, fetching chunk_rows at a time from one cursor"""
+    with storage.connection() as conn:
+        cursor = conn.execute(EXPORT_QUERIES[table])
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+
+def export_table(storage, table, out, fmt='csv', chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Stream a table to a text file object as CSV or NDJSON; returns rows written"""
+    columns = EXPORT_COLUMNS[table]
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        for row in iter_rows(storage, table, chunk_rows):
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in iter_rows(storage, table, chunk_rows):
+            out.write(json.dumps(dict(zip(columns, row)), separators=(',', ':')))
+            out.write('\n')
+            count += 1
+    return count
+
+
+def read_records(source, fmt):
+    """Yield dict records from a CSV or NDJSON text file object"""
+    if fmt == 'csv':
+        yield from csv.DictReader(source)
+    else:
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _int(value, default=0):
+    if value in (None, ''):
+        return default
+    return int(value)
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def compacted_rows(storage):
+    """Rows compaction has folded into progress_daily, which a progress export leaves out"""
+    with storage.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM progress_daily").fetchone()[0]
+
+
+def _announce(versions, names):
+    """Bump the slots of changed users so running apps drop their cached copies"""
+    if versions is not None and names:
+        versions.bump(names)
+
+
+def import_users(storage, records, batch_rows=DEFAULT_CHUNK_ROWS, versions=None):
+    """Insert roster rows; existing names are skipped. Returns (inserted, skipped)"""
+    inserted = skipped = 0
+    now = datetime.now().isoformat()
+    for batch in _batches(records, batch_rows):
+        rows = [(
+            record['name'].strip(),
+            record.get('created_date') or now,
+            _int(record.get('total_points')),
+            record.get('level') or 'beginner',
+            record.get('theme') or 'rainbow',
+            _int(record.get('total_stars')),
+            record.get('favorite_activity') or 'letter_sounds',
+            record.get('classroom') or None,
+        ) for record in batch if (record.get('name') or '').strip()]
+        skipped += len(batch) - len(rows)
+        with storage.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany("""
+                INSERT OR IGNORE INTO users
+                    (name, created_date, total_points, level, theme, total_stars, favorite_activity, classroom)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            added = conn.total_changes - before
+        inserted += added
+        skipped += len(rows) - added
+        _announce(versions, [row[0] for row in rows])
+    return inserted, skipped
+
+
+def import_progress(storage, records, batch_rows=DEFAULT_CHUNK_ROWS, update_totals=True, versions=None):
+    """Insert migrated history matched to users by name. Returns (inserted, skipped)
+
+    With update_totals the users' points and stars grow with the imported rows, exactly
+    as if the activity had happened in the app. Turn it off when the users were imported
+    from an export that already carries their totals. The daily rollups are always updated.
+    """
+    inserted = skipped = 0
+    for batch in _batches(records, batch_rows):
+        events = [(
+            record.get('user_name') or record.get('name'),
+            record.get('activity') or 'letter_sounds',
+            record.get('content'),
+            _int(record.get('score')),
+            _int(record.get('time_spent')),
+            record.get('date') or datetime.now().isoformat(),
+            _int(record.get('stars_earned')),
+        ) for record in batch]
+        written = storage.record_progress_batch(events, update_totals=update_totals)
+        inserted += written
+        skipped += len(events) - written
+        _announce(versions, {event[0] for event in events if event[0]})
+    return inserted, skipped
+
+
+def import_progress_daily(storage, records, batch_rows=DEFAULT_CHUNK_ROWS, update_totals=True, versions=None):
+    """Add compacted day totals matched to users by name. Returns (inserted, skipped)
+
+    The dashboard rollups grow with them, as they did when the raw rows were first
+    written; update_totals works as for import_progress.
+    """
+    inserted = skipped = 0
+    for batch in _batches(records, batch_rows):
+        rows = [(
+            record.get('day'),
+            record.get('activity') or 'letter_sounds',
+            record.get('content') or '',
+            _int(record.get('events')),
+            _int(record.get('score')),
+            _int(record.get('stars')),
+            _int(record.get('time_spent')),
+            record.get('user_name') or record.get('name'),
+        ) for record in batch if record.get('day') and (record.get('user_name') or record.get('name'))]
+        skipped += len(batch) - len(rows)
+        with storage.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany("""
+                INSERT INTO progress_daily (user_id, day, activity, content, events, score, stars, time_spent)
+                SELECT id, ?, ?, ?, ?, ?, ?, ? FROM users WHERE name = ?
+                ON CONFLICT (user_id, day, activity, content) DO UPDATE SET
+                    events = events + excluded.events, score = score + excluded.score,
+                    stars = stars + excluded.stars, time_spent = time_spent + excluded.time_spent
+            """, rows)
+            added = conn.total_changes - before
+            conn.executemany("""
+                INSERT INTO daily_user_rollup (user_id, day, activity, events, points, stars, time_spent)
+                SELECT id, ?, ?, ?, ?, ?, ? FROM users WHERE name = ?
+                ON CONFLICT (user_id, day, activity) DO UPDATE SET
+                    events = events + excluded.events, points = points + excluded.points,
+                    stars = stars + excluded.stars, time_spent = time_spent + excluded.time_spent
+            """, [(day, activity, events, score, stars, spent, name)
+                  for day, activity, _, events, score, stars, spent, name in rows])
+            conn.executemany("""
+                INSERT INTO daily_content_rollup (day, activity, content, events, points, stars)
+                SELECT ?, ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM users WHERE name = ?)
+                ON CONFLICT (day, activity, content) DO UPDATE SET
+                    events = events + excluded.events, points = points + excluded.points,
+                    stars = stars + excluded.stars
+            """, [(day, activity, content, events, score, stars, name)
+                  for day, activity, content, events, score, stars, _, name in rows if content])
+            if update_totals:
+                conn.executemany("""
+                    UPDATE users SET total_points = total_points + ?, total_stars = total_stars + ?
+                    WHERE name = ?
+                """, [(score, stars, name) for _, _, _, _, score, stars, _, name in rows])
+        inserted += added
+        skipped += len(rows) - added
+        _announce(versions, {row[-1] for row in rows})
+    return inserted, skipped
+
+
+def _open_output(path):
+    if path in (None, '-'):
+        return sys.stdout, False
+    return open(path, 'w', newline='', encoding='utf-8'), True
+
+
+def _open_input(path):
+    if path in (None, '-'):
+        return sys.stdin, False
+    return open(path, newline='', encoding='utf-8'), True
+
+
+def _guess_format(path, fmt):
+    if fmt:
+        return fmt
+    return 'ndjson' if path and path.endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk export and import of users and progress")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = sub.add_parser('export')
+    export_parser.add_argument('table', choices=TABLES)
+    export_parser.add_argument('--format', choices=['csv', 'ndjson'])
+    export_parser.add_argument('--output', default='-')
+
+    import_parser = sub.add_parser('import')
+    import_parser.add_argument('table', choices=TABLES)
+    import_parser.add_argument('input', nargs='?', default='-')
+    import_parser.add_argument('--format', choices=['csv', 'ndjson'])
+    import_parser.add_argument('--no-update-totals', action='store_true',
+                               help="do not add imported progress to user totals (they came with the users export)")
+
+    args = parser.parse_args()
+    storage = PhonicsStorage(args.db)
+    started = time.perf_counter()
+
+    if args.command == 'export':
+        if args.table == 'progress':
+            compacted = compacted_rows(storage)
+            if compacted:
+                print(f"Note: {compacted} compacted daily rows are not in this export; "
+                      f"export them with 'export progress_daily'", file=sys.stderr)
+        out, close = _open_output(args.output)
+        try:
+            count = export_table(storage, args.table, out, _guess_format(args.output, args.format), args.chunk_rows)
+        finally:
+            if close:
+                out.close()
+        elapsed = time.perf_counter() - started
+        print(f"Exported {count} {args.table} rows in {elapsed:.2f}s "
+              f"({count / elapsed if elapsed else 0:.0f} rows/s)", file=sys.stderr)
+    else:
+        source, close = _open_input(args.input)
+        # Slots live next to the database, where the running apps read them
+        versions = VersionTable(storage.db_path + '-versions')
+        try:
+            records = read_records(source, _guess_format(args.input, args.format))
+            if args.table == 'users':
+                inserted, skipped = import_users(storage, records, args.chunk_rows, versions)
+            elif args.table == 'progress':
+                inserted, skipped = import_progress(storage, records, args.chunk_rows,
+                                                    update_totals=not args.no_update_totals, versions=versions)
+            else:
+                inserted, skipped = import_progress_daily(storage, records, args.chunk_rows,
+                                                          update_totals=not args.no_update_totals,
+                                                          versions=versions)
+        finally:
+            versions.close()
+            if close:
+                source.close()
+        elapsed = time.perf_counter() - started
+        total = inserted + skipped
+        print(f"Imported {inserted} {args.table} rows, skipped {skipped}, in {elapsed:.2f}s "
+              f"({total / elapsed if elapsed else 0:.0f} rows/s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+# phonics_tts.py - Offline text-to-speech with a content-addressed on-disk clip cache
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VOICE = 'en-us'
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class EspeakEngine:
+    """Local speech synthesis through the espeak-ng (or espeak) command line tool"""
+
+    name = 'espeak'
+
+    def __init__(self, voice=DEFAULT_VOICE, speed=130):
+        self.voice = voice
+        self.speed = speed
+        self.binary = shutil.which('espeak-ng') or shutil.which('espeak')
+
+    @property
+    def available(self):
+        return self.binary is not None
+
+    def synthesize(self, text):
+        """Return WAV bytes for the given text"""
+        result = subprocess.run(
+            [self.binary, '-v', self.voice, '-s', str(self.speed), '--stdout', text],
+            check=True, capture_output=True
+        )
+        return result.stdout
+
+
+def compress_wav(wav_bytes):
+    """Encode WAV bytes as Ogg/Opus with ffmpeg; returns (bytes, extension, mime)"""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        return wav_bytes, '.wav', 'audio/wav'
+    result = subprocess.run(
+        [ffmpeg, '-loglevel', 'error', '-f', 'wav', '-i', 'pipe:0',
+         '-c:a', 'libopus', '-b:a', '24k', '-f', 'ogg', 'pipe:1'],
+        input=wav_bytes, check=True, capture_output=True
+    )
+    return result.stdout, '.ogg', 'audio/ogg'
+
+
+class AudioClipCache:
+    """Size-bounded directory of audio clips keyed by content hash, evicted least recently used"""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Index clips already on disk, oldest access first"""
+        found = []
+        for filename in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, filename)
+            if os.path.isfile(path) and not filename.startswith('.'):
+                stat = os.stat(path)
+                found.append((stat.st_mtime, filename, stat.st_size))
+        for _, filename, size in sorted(found):
+            key = os.path.splitext(filename)[0]
+            self._entries[key] = (filename, size)
+            self._size += size
+        self._evict()
+
+    def get(self, key):
+        """Return the path of a cached clip and mark it recently used, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        path = os.path.join(self.cache_dir, entry[0])
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._drop(key)
+            return None
+        return path
+
+    def put(self, key, data, extension):
+        """Store a clip atomically and evict old clips past the size bound"""
+        filename = key + extension
+        fd, staged = tempfile.mkstemp(dir=self.cache_dir, prefix='.staged-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(staged, os.path.join(self.cache_dir, filename))
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (filename, len(data))
+            self._size += len(data)
+            self._evict()
+        return os.path.join(self.cache_dir, filename)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def _evict(self):
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key, (filename, size) = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, filename))
+            except FileNotFoundError:
+                pass
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SpeechService:
+    """Synthesize each phrase once, cache it on disk, and never make a click wait"""
+
+    def __init__(self, engine, cache, workers=2):
+        self.engine = engine
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tts')
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return self.engine.available
+
+    def clip_key(self, text):
+        """Content hash of everything that determines the audio"""
+        source = '\0'.join([self.engine.name, self.engine.voice, str(self.engine.speed), text])
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    def _synthesize(self, key, text):
+        try:
+            data, extension, _ = compress_wav(self.engine.synthesize(text))
+            return self.cache.put(key, data, extension)
+        except Exception:
+            logger.exception("Speech synthesis failed for %r", text)
+            return None
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def request(self, text):
+        """Schedule synthesis in the background if the clip is not cached yet"""
+        key = self.clip_key(text)
+        if self.cache.get(key) is not None:
+            return None
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._synthesize, key, text)
+                self._inflight[key] = future
+        return future
+
+    def clip(self, text):
+        """Return the cached clip path for text, or None while it is still being made"""
+        if not self.available:
+            return None
+        path = self.cache.get(self.clip_key(text))
+        if path is None:
+            self.request(text)
+        return path
+
+    def prewarm(self, texts):
+        """Queue synthesis for every phrase that is not cached yet"""
+        if not self.available:
+            return []
+        return [future for future in (self.request(text) for text in texts) if future is not None]
+
+
+def clip_mime_type(path):
+    """Return the MIME type st.audio needs for a cached clip"""
+    return 'audio/ogg' if path.endswith('.ogg') else 'audio/wav'
+
+
+def letter_phrase(letter, sound):
+    """The sentence spoken for one letter"""
+    return f"The letter {letter} says {sound}!"
+
+
+def word_phrase(word, sounds):
+    """The sentence spoken for a word: its sounds one by one, then blended"""
+    return f"{', '.join(sounds)}. {word}!"
@@ -3,8 +3,19 @@ import streamlit as st
 import sqlite3
 import random
 import json
-from datetime import datetime
 import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from phonics_config import SKIP_SPLASH, DEBUG_OVERLAY
+from phonics_metrics import registry as metrics
+from phonics_session import SessionModel
+from phonics_session_store import new_token, valid_token
+from phonics_achievements import ACHIEVEMENTS_BY_KEY
+from phonics_runtime import warm_up
+from phonics_tts import clip_mime_type, letter_phrase, word_phrase
 
 # Configure page
 st.set_page_config(
@@ -14,235 +25,97 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Client-side loading animation: each step fades in for a second, the last one stays
+SPLASH_LOADER_HTML = """
+<style>
+.splash-loader { position: relative; height: 5rem; text-align: center; }
+.splash-step { position: absolute; left: 0; right: 0; margin: 0; font-size: 1.3rem; opacity: 0;
+               animation: splash-step 1s ease-in-out both; }
+.splash-step.final { font-size: 2rem; margin: 1rem 0; animation-name: splash-final; }
+@keyframes splash-step { 0%, 100% { opacity: 0; } 15%, 85% { opacity: 1; } }
+@keyframes splash-final { 0% { opacity: 0; } 100% { opacity: 1; } }
+</style>
+<div class="splash-loader">
+    <p class="splash-step" style="animation-delay: 0s;">🌟 Loading magical adventures... 🌟</p>
+    <p class="splash-step" style="animation-delay: 1s;">🦄 Preparing your kingdom... 🦄</p>
+    <p class="splash-step" style="animation-delay: 2s;">✨ Almost ready for magic! ✨</p>
+    <p class="splash-step final" style="animation-delay: 3s;">⭐ ✨ 🌟 ✨ ⭐</p>
+</div>
+"""
+
 class PhonicsWebApp:
-    def __init__(self):
+    def __init__(self, runtime):
+        # Process-level singletons; warm_up() built them before the first rerun
+        self.runtime = runtime
+        self.speech = runtime.speech
+        # Set while run() draws the whole page; fragment reruns happen outside it
+        self.in_full_rerun = False
         self.init_session_state()
         self.init_database()
         self.init_phonics_data()
-        self.load_custom_css()
 
     def init_session_state(self):
-        """Initialize Streamlit session state"""
-        if 'current_screen' not in st.session_state:
-            st.session_state.current_screen = 'splash'
-        if 'current_user' not in st.session_state:
-            st.session_state.current_user = None
-        if 'current_theme' not in st.session_state:
-            st.session_state.current_theme = 'rainbow'
-        if 'score' not in st.session_state:
-            st.session_state.score = 0
-        if 'current_letter' not in st.session_state:
-            st.session_state.current_letter = 'A'
-        if 'activity_start_time' not in st.session_state:
-            st.session_state.activity_start_time = time.time()
-        if 'show_celebration' not in st.session_state:
-            st.session_state.show_celebration = False
-        if 'splash_complete' not in st.session_state:
-            st.session_state.splash_complete = False
+        """Attach this session's state model, restoring it from the session store on the first run"""
+        if 'session' not in st.session_state:
+            st.session_state.session = self.restore_session()
+        self.session = st.session_state.session
+
+    def restore_session(self):
+        """Pick up the state saved under the browser's ?s= token, or start a new session"""
+        store = self.runtime.session_store
+        token = st.query_params.get('s')
+        values = store.load(token) if valid_token(token) else None
+        if values:
+            return SessionModel.restore(token, values)
+        session = SessionModel('user_selection' if SKIP_SPLASH else 'splash')
+        session.token = new_token()
+        st.query_params['s'] = session.token
+        return session
+
+    def save_session(self):
+        """Write the fields this rerun changed, so any worker can serve the next one"""
+        changes = self.session.changes()
+        if changes:
+            with metrics.timer('phonics_session_save_seconds'):
+                self.runtime.session_store.save(self.session.token, changes)
+
+    @contextmanager
+    def fragment_run(self, fragment):
+        """Time a fragment and, when it reruns on its own, save what it changed"""
+        with metrics.timer('phonics_fragment_seconds', fragment=fragment):
+            try:
+                yield
+            finally:
+                # A full rerun saves once at its end instead
+                if not self.in_full_rerun:
+                    self.save_session()
 
     def init_database(self):
-        """Initialize SQLite database"""
-        self.conn = sqlite3.connect('phonics_kids_web.db', check_same_thread=False)
-        self.cursor = self.conn.cursor()
-        
-        # Create tables
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY,
-                name TEXT UNIQUE,
-                created_date TEXT,
-                total_points INTEGER DEFAULT 0,
-                level TEXT DEFAULT 'beginner',
-                theme TEXT DEFAULT 'rainbow',
-                total_stars INTEGER DEFAULT 0,
-                favorite_activity TEXT DEFAULT 'letter_sounds'
-            )
-        ''')
-        
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS progress (
-                id INTEGER PRIMARY KEY,
-                user_id INTEGER,
-                activity TEXT,
-                content TEXT,
-                score INTEGER,
-                time_spent INTEGER,
-                date TEXT,
-                stars_earned INTEGER DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        self.conn.commit()
+        """Attach to the process-wide storage engine"""
+        self.services = self.runtime.services
+        self.storage = self.services.storage
+        self.journal = self.services.journal
+        self.leaderboard = self.services.leaderboard
+        self.profiles = self.services.profiles
+        self.scheduler = self.services.scheduler
 
     def init_phonics_data(self):
-        """Initialize all phonics data from original app"""
-        self.themes = {
-            'rainbow': {
-                'bg': '#FFB6C1', 'primary': '#FF69B4', 'secondary': '#98FB98',
-                'accent': '#FFD700', 'text': '#FFFFFF', 'button': '#FF1493'
-            },
-            'ocean': {
-                'bg': '#87CEEB', 'primary': '#00CED1', 'secondary': '#B0E0E6',
-                'accent': '#FF6347', 'text': '#FFFFFF', 'button': '#1E90FF'
-            },
-            'forest': {
-                'bg': '#98FB98', 'primary': '#32CD32', 'secondary': '#90EE90',
-                'accent': '#FFD700', 'text': '#FFFFFF', 'button': '#228B22'
-            },
-            'space': {
-                'bg': '#9370DB', 'primary': '#8A2BE2', 'secondary': '#DDA0DD',
-                'accent': '#FFD700', 'text': '#FFFFFF', 'button': '#4B0082'
-            },
-            'candy': {
-                'bg': '#FFB6C1', 'primary': '#FF69B4', 'secondary': '#FFC0CB',
-                'accent': '#98FB98', 'text': '#FFFFFF', 'button': '#DC143C'
-            }
-        }
-
-        self.letter_sounds = {
-            'A': 'ay', 'B': 'buh', 'C': 'kuh', 'D': 'duh', 'E': 'eh',
-            'F': 'fuh', 'G': 'guh', 'H': 'huh', 'I': 'ih', 'J': 'juh',
-            'K': 'kuh', 'L': 'luh', 'M': 'muh', 'N': 'nuh', 'O': 'oh',
-            'P': 'puh', 'Q': 'kwuh', 'R': 'ruh', 'S': 'suh', 'T': 'tuh',
-            'U': 'uh', 'V': 'vuh', 'W': 'wuh', 'X': 'ks', 'Y': 'yuh', 'Z': 'zuh'
-        }
-
-        self.mascot_messages = [
-            "You're doing GREAT! 🌟",
-            "Keep up the awesome work! 🎈",
-            "I'm so proud of you! 💖",
-            "You're a phonics superstar! ⭐",
-            "Learning is fun with you! 🦄",
-            "Wow! You're amazing! 🎉"
-        ]
+        """Attach to the shared content packs; each is compiled once per process"""
+        self.content = self.services.content
+        theme_pack = self.content.get('themes')
+        self.themes = theme_pack.themes
+        self.mascot_messages = theme_pack.mascot_messages
+        letters = self.content.get('letters')
+        self.letter_sounds = letters.sounds
+        self.letter_items = letters.items
+        # A reloaded pack may have dropped the theme this session was using
+        if self.session.theme not in self.themes:
+            self.session.theme = theme_pack.names[0]
 
     def load_custom_css(self):
-        """Load custom CSS for kid-friendly styling"""
-        theme = self.themes[st.session_state.current_theme]
-        
-        css = f"""
-        <style>
-        @import url('https://fonts.googleapis.com/css2?family=Comic+Neue:wght@400;700&display=swap');
-        
-        .stApp {{
-            background: linear-gradient(135deg, {theme['bg']}, {theme['secondary']});
-            font-family: 'Comic Neue', 'Comic Sans MS', cursive;
-        }}
-        
-        .main-title {{
-            font-size: 3rem;
-            font-weight: bold;
-            text-align: center;
-            background: linear-gradient(45deg, #FF0000, #FF7F00, #FFFF00, #00FF00, #0000FF, #4B0082, #9400D3);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            background-clip: text;
-            margin-bottom: 2rem;
-            animation: rainbow 3s ease-in-out infinite alternate;
-        }}
-        
-        .magic-card {{
-            background: linear-gradient(135deg, {theme['primary']}, {theme['accent']});
-            border-radius: 20px;
-            padding: 2rem;
-            box-shadow: 0 8px 32px rgba(0,0,0,0.3);
-            border: 3px solid {theme['accent']};
-            text-align: center;
-            transition: transform 0.3s ease;
-            margin: 1rem;
-        }}
-        
-        .magic-card:hover {{
-            transform: translateY(-10px) scale(1.02);
-            box-shadow: 0 12px 40px rgba(0,0,0,0.4);
-        }}
-        
-        .letter-bubble {{
-            background: linear-gradient(135deg, #FFD700, #FFA500);
-            border-radius: 50%;
-            width: 200px;
-            height: 200px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            margin: 2rem auto;
-            box-shadow: 0 8px 32px rgba(255,215,0,0.5);
-            animation: float 3s ease-in-out infinite;
-        }}
-        
-        .letter-text {{
-            font-size: 6rem;
-            font-weight: bold;
-            color: {theme['button']};
-            text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-        }}
-        
-        .celebration {{
-            animation: celebrate 1s ease-in-out;
-        }}
-        
-        .score-display {{
-            background: linear-gradient(135deg, {theme['accent']}, {theme['primary']});
-            color: white;
-            padding: 1rem 2rem;
-            border-radius: 25px;
-            font-size: 1.5rem;
-            font-weight: bold;
-            text-align: center;
-            box-shadow: 0 4px 16px rgba(0,0,0,0.3);
-            margin: 1rem;
-        }}
-        
-        .mascot-speech {{
-            background: white;
-            border: 3px solid {theme['primary']};
-            border-radius: 20px;
-            padding: 1rem;
-            position: relative;
-            box-shadow: 0 4px 16px rgba(0,0,0,0.2);
-            margin: 1rem;
-        }}
-        
-        @keyframes rainbow {{
-            0% {{ filter: hue-rotate(0deg); }}
-            100% {{ filter: hue-rotate(360deg); }}
-        }}
-        
-        @keyframes float {{
-            0%, 100% {{ transform: translateY(0px); }}
-            50% {{ transform: translateY(-20px); }}
-        }}
-        
-        @keyframes celebrate {{
-            0% {{ transform: scale(1) rotate(0deg); }}
-            25% {{ transform: scale(1.1) rotate(5deg); }}
-            50% {{ transform: scale(1.2) rotate(-5deg); }}
-            75% {{ transform: scale(1.1) rotate(5deg); }}
-            100% {{ transform: scale(1) rotate(0deg); }}
-        }}
-        
-        .stButton > button {{
-            background: linear-gradient(135deg, {theme['button']}, {theme['primary']});
-            color: white;
-            border: none;
-            border-radius: 25px;
-            padding: 0.75rem 2rem;
-            font-size: 1.2rem;
-            font-weight: bold;
-            font-family: 'Comic Neue', cursive;
-            box-shadow: 0 4px 16px rgba(0,0,0,0.3);
-            transition: all 0.3s ease;
-        }}
-        
-        .stButton > button:hover {{
-            transform: translateY(-3px);
-            box-shadow: 0 8px 24px rgba(0,0,0,0.4);
-        }}
-        </style>
-        """
-        
-        st.markdown(css, unsafe_allow_html=True)
+        """Send the shared stylesheet and the current theme's variables block"""
+        st.markdown(self.runtime.base_css, unsafe_allow_html=True)
+        st.markdown(self.runtime.theme_css(self.session.theme), unsafe_allow_html=True)
 
     def show_splash_screen(self):
         """Magical splash screen"""
@@ -250,48 +123,21 @@ class PhonicsWebApp:
         st.markdown('<h1 class="main-title">🌈 PHONICS ADVENTURE KINGDOM 🏰</h1>', unsafe_allow_html=True)
         st.markdown('<h2 style="text-align: center; color: #FF1493; font-size: 1.8rem;">✨ Where Learning is Pure Magic! ✨</h2>', unsafe_allow_html=True)
         
-        # Animated loading
-        if not st.session_state.splash_complete:
-            with st.empty():
-                for i in range(4):
-                    if i == 0:
-                        st.markdown('<p style="text-align: center; font-size: 1.3rem;">🌟 Loading magical adventures... 🌟</p>', unsafe_allow_html=True)
-                    elif i == 1:
-                        st.markdown('<p style="text-align: center; font-size: 1.3rem;">🦄 Preparing your kingdom... 🦄</p>', unsafe_allow_html=True)
-                    elif i == 2:
-                        st.markdown('<p style="text-align: center; font-size: 1.3rem;">✨ Almost ready for magic! ✨</p>', unsafe_allow_html=True)
-                    else:
-                        st.markdown('<p style="text-align: center; font-size: 2rem; margin: 2rem 0;">⭐ ✨ 🌟 ✨ ⭐</p>', unsafe_allow_html=True)
-                    time.sleep(1)
-            
-            st.session_state.splash_complete = True
-            st.rerun()
+        # Animated loading runs in the browser so the server returns immediately
+        if not self.session.splash_done:
+            st.markdown(SPLASH_LOADER_HTML, unsafe_allow_html=True)
+            self.session.splash_done = True
         
         if st.button("🚀 Enter the Kingdom! 🚀", key="enter_kingdom"):
-            st.session_state.current_screen = 'user_selection'
+            self.session.screen = 'user_selection'
             st.rerun()
 
     def show_user_selection(self):
         """User selection with theme chooser"""
         st.markdown('<h1 class="main-title">🌟 Welcome to the Magic Kingdom! 🌟</h1>', unsafe_allow_html=True)
         
-        # Theme selector
-        st.markdown('<h3 style="text-align: center; color: #FF1493;">🎨 Choose Your Magical Theme! 🎨</h3>', unsafe_allow_html=True)
-        
-        theme_cols = st.columns(5)
-        theme_info = {
-            'rainbow': ('🌈 Rainbow Magic', '#FF69B4'),
-            'ocean': ('🌊 Ocean Adventure', '#1E90FF'), 
-            'forest': ('🌲 Forest Friends', '#228B22'),
-            'space': ('🚀 Space Explorer', '#4B0082'),
-            'candy': ('🍭 Candy Kingdom', '#DC143C')
-        }
-        
-        for i, (theme_name, (display_name, color)) in enumerate(theme_info.items()):
-            with theme_cols[i]:
-                if st.button(display_name, key=f"theme_{theme_name}"):
-                    st.session_state.current_theme = theme_name
-                    st.rerun()
+        # Theme selector reruns on its own; only its block and the theme variables are resent
+        self.show_theme_chooser()
 
         st.markdown("---")
         
@@ -304,19 +150,22 @@ class PhonicsWebApp:
             
             # Get existing users
             try:
-                self.cursor.execute("SELECT name, total_points, level, total_stars FROM users ORDER BY total_points DESC")
-                users = self.cursor.fetchall()
+                users = self.leaderboard.top(5)  # Show top 5 users
                 
                 if users:
-                    for user in users[:5]:  # Show top 5 users
-                        user_name, points, level, stars = user
-                        if st.button(f"🦄 {user_name} - 🏆{points} ⭐{stars} 🎯{level.title()}", 
-                                   key=f"user_{user_name}"):
-                            st.session_state.current_user = user_name
-                            st.session_state.current_screen = 'main_menu'
-                            st.rerun()
+                    self.show_user_buttons(users, "user")
                 else:
                     st.info("No existing characters found. Create your first character!")
+
+                # Find my character
+                search = st.text_input("🔍 Find my character", placeholder="Type the start of your name...",
+                                       key="find_user_input")
+                if search.strip():
+                    matches = self.leaderboard.search(search, limit=5)
+                    if matches:
+                        self.show_user_buttons(matches, "found")
+                    else:
+                        st.info("No characters start with that name yet!")
                     
             except Exception as e:
                 st.error(f"Database error: {e}")
@@ -339,22 +188,54 @@ class PhonicsWebApp:
             if st.button("🚀 Start My Adventure!", key="create_user"):
                 if new_user_name.strip():
                     if self.create_new_user(new_user_name.strip()):
-                        st.session_state.current_user = new_user_name.strip()
-                        st.session_state.current_screen = 'welcome'
+                        self.session.user = new_user_name.strip()
+                        self.profiles.get(self.session.user)
+                        self.session.screen = 'welcome'
                         st.rerun()
                 else:
                     st.error("Please enter your magical name!")
             
             st.markdown('</div>', unsafe_allow_html=True)
 
+        st.markdown("---")
+        if st.button("👩‍🏫 Teacher Dashboard", key="teacher_dashboard"):
+            self.session.screen = 'teacher_dashboard'
+            st.rerun()
+
+    @st.fragment
+    def show_theme_chooser(self):
+        """Theme buttons plus the active theme's variables block"""
+        with self.fragment_run('theme_chooser'):
+            st.markdown('<h3 style="text-align: center; color: #FF1493;">🎨 Choose Your Magical Theme! 🎨</h3>', unsafe_allow_html=True)
+            
+            labels = self.content.get('themes').labels
+            theme_cols = st.columns(len(labels))
+            for i, (theme_name, display_name) in enumerate(labels.items()):
+                with theme_cols[i]:
+                    st.button(display_name, key=f"theme_{theme_name}", on_click=self.set_theme, args=(theme_name,))
+
+            # Later :root block overrides the one sent with the page stylesheet
+            st.markdown(self.runtime.theme_css(self.session.theme), unsafe_allow_html=True)
+
+    def set_theme(self, theme_name):
+        self.session.theme = theme_name
+
+    def show_user_buttons(self, users, key_prefix):
+        """Render one login button per (name, points, level, stars) row"""
+        for user in users:
+            user_name, points, level, stars = user
+            if st.button(f"🦄 {user_name} - 🏆{points} ⭐{stars} 🎯{level.title()}", 
+                       key=f"{key_prefix}_{user_name}"):
+                self.session.user = user_name
+                # Load the profile and practice queue at login so no click waits on history
+                self.services.login(user_name)
+                self.session.screen = 'main_menu'
+                st.rerun()
+
     def create_new_user(self, name):
         """Create new user in database"""
         try:
-            self.cursor.execute(
-                "INSERT INTO users (name, created_date, theme, favorite_activity) VALUES (?, ?, ?, ?)",
-                (name, datetime.now().isoformat(), st.session_state.current_theme, 'letter_sounds')
-            )
-            self.conn.commit()
+            self.services.create_user(name, self.session.theme, 'letter_sounds')
             return True
         except sqlite3.IntegrityError:
             st.error("This magical name already exists! Try a different one!")
@@ -363,11 +244,59 @@ class PhonicsWebApp:
             st.error(f"Something magical went wrong: {e}")
             return False
 
+    def show_teacher_dashboard(self):
+        """Per-child and per-letter trends, read only from the daily rollups"""
+        st.markdown('<h1 class="main-title">👩‍🏫 Teacher Dashboard</h1>', unsafe_allow_html=True)
+
+        window = st.selectbox("Show the last", [7, 30, 90], format_func=lambda days: f"{days} days",
+                              key="dashboard_window")
+        since_day = (date.today() - timedelta(days=window - 1)).isoformat()
+
+        try:
+            # Class overview
+            st.markdown('<h3>🏫 Class overview</h3>', unsafe_allow_html=True)
+            class_rows = self.storage.class_daily_totals(since_day)
+            if class_rows:
+                st.dataframe(
+                    [{'Child': name, 'Activities': events, 'Stars': stars, 'Active days': days}
+                     for name, events, stars, days in class_rows],
+                    hide_index=True, use_container_width=True
+                )
+            else:
+                st.info("No activity in this window yet.")
+
+            # Per-child trend
+            if class_rows:
+                child = st.selectbox("Child", [row[0] for row in class_rows], key="dashboard_child")
+                profile = self.profiles.get(child)
+                if profile:
+                    days = self.storage.child_daily_totals(child, since_day)
+                    st.markdown(f'<h3>⭐ Stars per day for {child}</h3>', unsafe_allow_html=True)
+                    st.bar_chart({'Stars': {day: stars for day, _, _, stars, _ in days}})
+
+            # Per-letter trends
+            letter_rows = self.storage.content_daily_totals('letter_sounds', since_day)
+            if letter_rows:
+                per_letter = {}
+                per_day = {}
+                for day, letter, events, stars in letter_rows:
+                    per_letter[letter] = per_letter.get(letter, 0) + events
+                    per_day.setdefault(letter, {})[day] = events
+                st.markdown('<h3>🔤 Letter practice</h3>', unsafe_allow_html=True)
+                st.bar_chart({'Times heard': per_letter})
+                st.line_chart(per_day)
+        except Exception as e:
+            st.error(f"Database error: {e}")
+
+        if st.button("🏠 Back to Character Selection", key="dashboard_back"):
+            self.session.screen = 'user_selection'
+            st.rerun()
+
     def show_welcome_screen(self):
         """Welcome new user"""
         st.markdown('<div style="text-align: center; padding: 4rem 2rem;">', unsafe_allow_html=True)
         st.markdown('<h1 style="text-align: center; color: #FF1493;">🎊 Welcome to the Adventure! 🎊</h1>', unsafe_allow_html=True)
-        st.markdown(f'<h2 style="text-align: center; color: #4B0082;">Hello, {st.session_state.current_user}! 🦄</h2>', unsafe_allow_html=True)
+        st.markdown(f'<h2 style="text-align: center; color: #4B0082;">Hello, {self.session.user}! 🦄</h2>', unsafe_allow_html=True)
         
         st.markdown("""
         <div style="text-align: center; font-size: 1.3rem; color: #FF1493; margin: 2rem 0;">
@@ -381,25 +310,24 @@ class PhonicsWebApp:
         st.markdown('</div>', unsafe_allow_html=True)
         
         if st.button("🎮 Let's Start Learning! 🎮", key="start_learning"):
-            st.session_state.current_screen = 'main_menu'
+            self.session.screen = 'main_menu'
             st.rerun()
 
     def show_main_menu(self):
         """Main menu with activities"""
         # Header with user info
         try:
-            self.cursor.execute("SELECT total_points, total_stars, level FROM users WHERE name = ?", 
-                              (st.session_state.current_user,))
-            result = self.cursor.fetchone()
-            if result:
-                points, stars, level = result
+            profile = self.profiles.get(self.session.user)
+            if profile:
+                points, stars, level = profile.points, profile.stars, profile.level
+                earned = profile.achievements
             else:
-                points, stars, level = 0, 0, 'beginner'
+                points, stars, level, earned = 0, 0, 'beginner', ()
         except:
-            points, stars, level = 0, 0, 'beginner'
+            points, stars, level, earned = 0, 0, 'beginner', ()
 
         # Header
-        st.markdown(f'<h1 class="main-title">🌟 Welcome back, {st.session_state.current_user}! 🌟</h1>', unsafe_allow_html=True)
+        st.markdown(f'<h1 class="main-title">🌟 Welcome back, {self.session.user}! 🌟</h1>', unsafe_allow_html=True)
         
         # Stats
         col1, col2, col3, col4 = st.columns(4)
@@ -411,10 +339,19 @@ class PhonicsWebApp:
             st.markdown(f'<div class="score-display">🎯 Level: {level.title()}</div>', unsafe_allow_html=True)
         with col4:
             if st.button("🚪 Switch Character", key="logout"):
-                st.session_state.current_user = None
-                st.session_state.current_screen = 'user_selection'
+                self.session.user = None
+                self.session.screen = 'user_selection'
                 st.rerun()
 
+        # Achievements come with the cached profile, so showing them costs no query
+        if earned:
+            badges = ''.join(
+                f'<span class="achievement-badge" title="{ACHIEVEMENTS_BY_KEY[key].description}">'
+                f'{ACHIEVEMENTS_BY_KEY[key].icon} {ACHIEVEMENTS_BY_KEY[key].title}</span>'
+                for key in earned if key in ACHIEVEMENTS_BY_KEY
+            )
+            st.markdown(f'<div class="achievement-row">{badges}</div>', unsafe_allow_html=True)
+
         st.markdown('<h2 style="text-align: center; color: #FF1493; margin: 2rem 0;">🎮 Choose Your Learning Adventure! 🎮</h2>', unsafe_allow_html=True)
         
         # Activity grid - Letter Sounds (working) and placeholders
@@ -422,7 +359,7 @@ class PhonicsWebApp:
         
         with col1:
             st.markdown(f"""
-            <div class="magic-card" style="background: linear-gradient(135deg, #FF69B4, {self.themes[st.session_state.current_theme]['accent']});">
+            <div class="magic-card" style="background: linear-gradient(135deg, #FF69B4, {self.themes[self.session.theme]['accent']});">
                 <div style="font-size: 4rem; margin-bottom: 1rem;">🔤</div>
                 <h3 style="color: white; margin-bottom: 1rem;">Letter Magic</h3>
                 <p style="color: white; margin-bottom: 1.5rem;">Learn magical letter sounds!</p>
@@ -430,14 +367,15 @@ class PhonicsWebApp:
             """, unsafe_allow_html=True)
             
             if st.button("Play Letter Magic!", key="activity_letter_sounds"):
-                st.session_state.current_screen = 'letter_sounds'
-                st.session_state.activity_start_time = time.time()
-                st.session_state.score = 0
+                self.session.start_activity('letter_sounds')
+                # Start on whatever is due, even the letter the last round ended on
+                self.session.letter = None
+                self.next_letter()
                 st.rerun()
         
         with col2:
             st.markdown(f"""
-            <div class="magic-card" style="background: linear-gradient(135deg, #FFD700, {self.themes[st.session_state.current_theme]['accent']});">
+            <div class="magic-card" style="background: linear-gradient(135deg, #FFD700, {self.themes[self.session.theme]['accent']});">
                 <div style="font-size: 4rem; margin-bottom: 1rem;">🔨</div>
                 <h3 style="color: white; margin-bottom: 1rem;">Word Wizard</h3>
                 <p style="color: white; margin-bottom: 1.5rem;">Blend sounds like magic!</p>
@@ -445,11 +383,12 @@ class PhonicsWebApp:
             """, unsafe_allow_html=True)
             
             if st.button("Play Word Wizard!", key="activity_word_wizard"):
-                st.info("Word Wizard adventure coming soon! 🌟")
+                self.start_word_activity('word_wizard')
+                st.rerun()
         
         with col3:
             st.markdown(f"""
-            <div class="magic-card" style="background: linear-gradient(135deg, #32CD32, {self.themes[st.session_state.current_theme]['accent']});">
+            <div class="magic-card" style="background: linear-gradient(135deg, #32CD32, {self.themes[self.session.theme]['accent']});">
                 <div style="font-size: 4rem; margin-bottom: 1rem;">🏗️</div>
                 <h3 style="color: white; margin-bottom: 1rem;">Word Builder</h3>
                 <p style="color: white; margin-bottom: 1.5rem;">Build amazing words!</p>
@@ -457,7 +396,8 @@ class PhonicsWebApp:
             """, unsafe_allow_html=True)
             
             if st.button("Play Word Builder!", key="activity_word_builder"):
-                st.info("Word Builder quest coming soon! 🌟")
+                self.start_word_activity('word_builder')
+                st.rerun()
 
         # Mascot in sidebar
         with st.sidebar:
@@ -467,7 +407,7 @@ class PhonicsWebApp:
 
     def show_letter_sounds_activity(self):
         """Letter sounds activity"""
-        theme = self.themes[st.session_state.current_theme]
+        theme = self.themes[self.session.theme]
         
         # Header
         st.markdown(f"""
@@ -477,113 +417,300 @@ class PhonicsWebApp:
         </div>
         """, unsafe_allow_html=True)
 
-        # Score display
-        st.markdown(f'<div class="score-display">⭐ Stars: {st.session_state.score}</div>', unsafe_allow_html=True)
+        # Letter bubble, sound and controls rerun on their own on each click
+        self.show_letter_panel()
 
-        # Letter display
-        if 'current_letter' not in st.session_state:
-            st.session_state.current_letter = random.choice(list(self.letter_sounds.keys()))
-        
-        current_sound = self.letter_sounds[st.session_state.current_letter]
-        
-        # Show celebration if triggered
-        celebration_class = "celebration" if st.session_state.show_celebration else ""
-        
-        st.markdown(f"""
-        <div class="letter-bubble {celebration_class}">
-            <div class="letter-text">{st.session_state.current_letter}</div>
-        </div>
-        """, unsafe_allow_html=True)
+        # Back button
+        if st.button("🏠 Back to Adventure Map", key="back_to_menu"):
+            self.session.screen = 'main_menu'
+            st.rerun()
 
-        # Sound information
-        st.markdown(f'<h2 style="text-align: center; color: {theme["button"]}; margin: 2rem 0;">✨ This letter says: {current_sound} ✨</h2>', unsafe_allow_html=True)
+    @st.fragment
+    def show_letter_panel(self):
+        """Score, letter bubble and controls; a click re-executes only this fragment"""
+        with self.fragment_run('letter_panel'):
+            theme = self.themes[self.session.theme]
 
-        # Control buttons
-        col1, col2, col3 = st.columns([1, 2, 1])
-        
-        with col2:
-            if st.button("🔊 Hear the Magic Sound!", key="speak_letter"):
-                self.speak_letter_sound()
+            # Score display
+            st.markdown(f'<div class="score-display">⭐ Stars: {self.session.score}</div>', unsafe_allow_html=True)
+
+            # Letter display
+            if self.session.letter not in self.letter_sounds:
+                self.next_letter()
             
-            if st.button("➡️ Next Letter Adventure!", key="next_letter"):
-                st.session_state.current_letter = random.choice(list(self.letter_sounds.keys()))
-                st.rerun()
+            current_sound = self.letter_sounds[self.session.letter]
+            
+            # Show celebration if triggered
+            celebration_class = "celebration" if self.session.celebrate else ""
+            
+            st.markdown(f"""
+            <div class="letter-bubble {celebration_class}">
+                <div class="letter-text">{self.session.letter}</div>
+            </div>
+            """, unsafe_allow_html=True)
 
-        # Back button
-        if st.button("🏠 Back to Adventure Map", key="back_to_menu"):
-            st.session_state.current_screen = 'main_menu'
-            st.rerun()
+            # Sound information
+            st.markdown(f'<h2 style="text-align: center; color: {theme["button"]}; margin: 2rem 0;">✨ This letter says: {current_sound} ✨</h2>', unsafe_allow_html=True)
 
-        # Reset celebration state
-        if st.session_state.show_celebration:
-            st.session_state.show_celebration = False
+            # Control buttons; callbacks update state before the fragment redraws
+            col1, col2, col3 = st.columns([1, 2, 1])
+            
+            with col2:
+                st.button("🔊 Hear the Magic Sound!", key="speak_letter", on_click=self.speak_letter_sound)
+                if self.session.celebrate:
+                    self.show_sound_feedback()
+                
+                st.button("➡️ Next Letter Adventure!", key="next_letter", on_click=self.next_letter)
+
+            # Reset celebration state
+            if self.session.celebrate:
+                self.session.celebrate = False
+
+    def next_letter(self):
+        """Move to the letter the child's practice queue says is due next"""
+        user = self.session.user
+        current = self.session.letter
+        letter = None
+        if user:
+            letter = self.services.next_item(user, 'letter_sounds', exclude=current)
+        self.session.letter = letter or random.choice(self.letter_items)
 
     def speak_letter_sound(self):
         """Handle letter sound with celebration"""
         # Update score
-        st.session_state.score += 5
+        self.session.score += 5
         
         # Trigger celebration
-        st.session_state.show_celebration = True
+        self.session.celebrate = True
         
         # Save progress
-        self.save_activity_progress("letter_sounds", st.session_state.current_letter, 5)
-        
+        self.save_activity_progress("letter_sounds", self.session.letter, 5)
+
+    def show_sound_feedback(self):
+        """Praise and play the letter sound after a click"""
         # Show success message
         st.success("⭐ Great Job! Awesome listening! You earned a star! ⭐")
         
-        # Text-to-speech simulation (you can integrate real TTS here)
-        sound = self.letter_sounds[st.session_state.current_letter]
-        st.info(f"🔊 Speaking: The letter {st.session_state.current_letter} says {sound}!")
+        # Play the pre-synthesized clip; fall back to text while it is still being made
+        sound = self.letter_sounds[self.session.letter]
+        st.info(f"🔊 Speaking: The letter {self.session.letter} says {sound}!")
+        clip = self.speech.clip(letter_phrase(self.session.letter, sound))
+        if clip:
+            st.audio(clip, format=clip_mime_type(clip), autoplay=True)
+
+    # Word Wizard and Word Builder
+
+    def word_engine(self):
+        """Word engine for the current word list, built on first use by any session"""
+        return self.services.word_engine()
+
+    def start_word_activity(self, activity):
+        """Open a word activity with a freshly generated round"""
+        self.session.start_activity(activity)
+        self.new_word_round()
+
+    def new_word_round(self, size=10):
+        """Pre-generate a whole round of questions and queue their audio"""
+        kind = 'wizard' if self.session.screen == 'word_wizard' else 'builder'
+        questions = self.word_engine().rounds(kind, size)
+        sounds = self.content.get('phonemes').sounds
+        self.speech.prewarm([word_phrase(q.word, [sounds.get(g, g) for g in q.graphemes]) for q in questions])
+        self.session.word_round = tuple(questions)
+        self.session.word_index = 0
+        self.reset_word_question()
+
+    def reset_word_question(self):
+        self.session.word_built = ()
+        self.session.word_used = ()
+        self.session.word_feedback = None
+
+    def current_word_question(self):
+        return self.session.word_round[self.session.word_index]
+
+    def show_word_activity(self):
+        """Word Wizard or Word Builder screen"""
+        theme = self.themes[self.session.theme]
+        wizard = self.session.screen == 'word_wizard'
+        title = "🔨 Word Wizard: Blend the Sounds! 🔨" if wizard else "🏗️ Word Builder: Build the Word! 🏗️"
+
+        st.markdown(f"""
+        <div style="background: linear-gradient(135deg, {theme['primary']}, {theme['accent']}); 
+                    padding: 2rem; border-radius: 15px; text-align: center; margin-bottom: 2rem;">
+            <h1 style="color: white; margin: 0;">{title}</h1>
+        </div>
+        """, unsafe_allow_html=True)
+
+        if not self.session.word_round:
+            st.info("No words to play with yet! Ask a grown-up to add a word list. 🌟")
+        elif wizard:
+            self.show_word_wizard_panel()
+        else:
+            self.show_word_builder_panel()
+
+        if st.button("🏠 Back to Adventure Map", key="back_to_menu"):
+            self.session.screen = 'main_menu'
+            st.rerun()
+
+    @st.fragment
+    def show_word_wizard_panel(self):
+        """Sounds of one word and the words to choose from"""
+        with self.fragment_run('word_wizard'):
+            question = self.current_word_question()
+            sounds = self.content.get('phonemes').sounds
+            theme = self.themes[self.session.theme]
+
+            st.markdown(f'<div class="score-display">⭐ Stars: {self.session.score}</div>', unsafe_allow_html=True)
+            tiles = ''.join(f'<span class="sound-tile">{g}</span>' for g in question.graphemes)
+            st.markdown(f'<div class="sound-row">{tiles}</div>', unsafe_allow_html=True)
+            spoken = ' ... '.join(sounds.get(g, g) for g in question.graphemes)
+            st.markdown(f'<h2 style="text-align: center; color: {theme["button"]};">✨ {spoken} ✨</h2>', unsafe_allow_html=True)
+
+            columns = st.columns(len(question.choices))
+            for i, choice in enumerate(question.choices):
+                with columns[i]:
+                    st.button(f"🪄 {choice}", key=f"wizard_choice_{i}", on_click=self.answer_word_wizard, args=(choice,))
+
+            self.show_word_feedback(question)
+            st.button("➡️ Next Word Adventure!", key="next_word", on_click=self.next_word)
+
+    def answer_word_wizard(self, choice):
+        question = self.current_word_question()
+        if self.session.word_feedback and self.session.word_feedback[0] == 'success':
+            return
+        if choice == question.word:
+            self.complete_word(question, "⭐ Magic blending! You read the word! ⭐")
+        else:
+            self.session.word_feedback = ('retry', f"Hmm, that says {choice}. Blend the sounds and try again! 💪")
+
+    @st.fragment
+    def show_word_builder_panel(self):
+        """Empty slots for the word and the sound tiles to build it from"""
+        with self.fragment_run('word_builder'):
+            question = self.current_word_question()
+            built = self.session.word_built
+            theme = self.themes[self.session.theme]
+
+            st.markdown(f'<div class="score-display">⭐ Stars: {self.session.score}</div>', unsafe_allow_html=True)
+            st.markdown(f'<h2 style="text-align: center; color: {theme["button"]};">Build the word: {question.word}</h2>', unsafe_allow_html=True)
+            slots = ''.join(
+                f'<span class="sound-tile">{built[i]}</span>' if i < len(built) else '<span class="sound-tile empty">_</span>'
+                for i in range(len(question.graphemes))
+            )
+            st.markdown(f'<div class="sound-row">{slots}</div>', unsafe_allow_html=True)
+
+            columns = st.columns(len(question.choices))
+            for i, tile in enumerate(question.choices):
+                with columns[i]:
+                    st.button(tile, key=f"builder_tile_{i}", on_click=self.place_tile, args=(i,),
+                              disabled=i in self.session.word_used)
+
+            self.show_word_feedback(question)
+            st.button("➡️ Next Word Adventure!", key="next_word", on_click=self.next_word)
+
+    def place_tile(self, index):
+        question = self.current_word_question()
+        built = self.session.word_built
+        if len(built) >= len(question.graphemes):
+            return
+        tile = question.choices[index]
+        if tile != question.graphemes[len(built)]:
+            self.session.word_feedback = ('retry', f"Oops! {tile} doesn't go there. Try another sound! 💪")
+            return
+        built = self.session.word_built = built + (tile,)
+        self.session.word_used += (index,)
+        self.session.word_feedback = None
+        if len(built) == len(question.graphemes):
+            others = [w for w in self.word_engine().words_from(question.choices, limit=6) if w != question.word]
+            extra = f" You could also make: {', '.join(others[:5])}!" if others else ""
+            self.complete_word(question, f"⭐ You built {question.word}!{extra} ⭐")
+
+    def complete_word(self, question, message):
+        """Score, celebrate and record a finished word"""
+        self.session.score += 10
+        self.session.word_feedback = ('success', message)
+        self.save_activity_progress(self.session.screen, question.word, 10)
+
+    def show_word_feedback(self, question):
+        feedback = self.session.word_feedback
+        if not feedback:
+            return
+        kind, message = feedback
+        if kind == 'retry':
+            st.warning(message)
+            return
+        st.success(message)
+        sounds = self.content.get('phonemes').sounds
+        clip = self.speech.clip(word_phrase(question.word, [sounds.get(g, g) for g in question.graphemes]))
+        if clip:
+            st.audio(clip, format=clip_mime_type(clip), autoplay=True)
+
+    def next_word(self):
+        """Move on in the pre-generated round, starting a new round at the end"""
+        if self.session.word_index + 1 < len(self.session.word_round):
+            self.session.word_index += 1
+            self.reset_word_question()
+        else:
+            self.new_word_round()
 
     def save_activity_progress(self, activity, content, score):
         """Save user progress to database"""
-        if st.session_state.current_user:
+        if self.session.user:
             try:
-                # Get user ID
-                self.cursor.execute("SELECT id FROM users WHERE name = ?", (st.session_state.current_user,))
-                result = self.cursor.fetchone()
-                
-                if result:
-                    user_id = result[0]
-                    time_spent = int(time.time() - st.session_state.activity_start_time)
-                    stars_earned = max(1, score // 5)
-                    
-                    # Save progress
-                    self.cursor.execute("""
-                        INSERT INTO progress (user_id, activity, content, score, time_spent, date, stars_earned)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """, (user_id, activity, content, score, time_spent, datetime.now().isoformat(), stars_earned))
-                    
-                    # Update user totals
-                    self.cursor.execute(
-                        "UPDATE users SET total_points = total_points + ?, total_stars = total_stars + ? WHERE id = ?",
-                        (score, stars_earned, user_id)
-                    )
-                    
-                    self.conn.commit()
-                    
+                time_spent = int(time.time() - self.session.activity_start)
+                # Queued for the background writer and written through to the cached profile
+                self.services.record_progress(self.session.user, activity, content, score, time_spent)
             except Exception as e:
                 st.error(f"Error saving progress: {e}")
 
     def run(self):
         """Main application runner"""
-        # Load CSS for current theme
-        self.load_custom_css()
-        
-        # Route to appropriate screen
-        if st.session_state.current_screen == 'splash':
-            self.show_splash_screen()
-        elif st.session_state.current_screen == 'user_selection':
-            self.show_user_selection()
-        elif st.session_state.current_screen == 'welcome':
-            self.show_welcome_screen()
-        elif st.session_state.current_screen == 'main_menu':
-            self.show_main_menu()
-        elif st.session_state.current_screen == 'letter_sounds':
-            self.show_letter_sounds_activity()
+        ctx = get_script_run_ctx()
+        session_id = ctx.session_id if ctx else 'local'
+        metrics.begin_rerun(session_id)
+        screen = self.session.screen
+        self.in_full_rerun = True
+        try:
+            with metrics.timer('phonics_rerun_seconds', screen=screen):
+                # Load CSS for current theme
+                with metrics.timer('phonics_css_seconds'):
+                    self.load_custom_css()
+
+                if DEBUG_OVERLAY and metrics.enabled:
+                    self.show_debug_overlay(session_id)
+
+                # Route to appropriate screen
+                with metrics.timer('phonics_screen_seconds', screen=screen):
+                    if screen == 'splash':
+                        self.show_splash_screen()
+                    elif screen == 'user_selection':
+                        self.show_user_selection()
+                    elif screen == 'welcome':
+                        self.show_welcome_screen()
+                    elif screen == 'main_menu':
+                        self.show_main_menu()
+                    elif screen == 'letter_sounds':
+                        self.show_letter_sounds_activity()
+                    elif screen in ('word_wizard', 'word_builder'):
+                        self.show_word_activity()
+                    elif screen == 'teacher_dashboard':
+                        self.show_teacher_dashboard()
+        finally:
+            self.in_full_rerun = False
+            self.save_session()
+            trace = metrics.end_rerun()
+            if trace:
+                self.session.last_rerun_timings = trace
+
+    def show_debug_overlay(self, session_id):
+        """Sidebar breakdown of the previous rerun's timings"""
+        trace = self.session.last_rerun_timings
+        with st.sidebar.expander("⏱️ Last rerun timings", expanded=False):
+            st.caption(f"Reruns this session: {metrics.session_reruns(session_id)} · "
+                       f"active sessions: {metrics.active_sessions()}")
+            if trace:
+                st.table([{'step': label, 'ms': round(seconds * 1000, 2)} for label, seconds in trace])
 
 # Run the application
 if __name__ == "__main__":
-    app = PhonicsWebApp()
+    app = PhonicsWebApp(warm_up())
     app.run()
@@ -0,0 +1,334 @@
+# phonics_words.py - Word engine for Word Wizard and Word Builder
+#
+# Built once per process over a compiled WordList (see phonics_content.py). The
+# indexes are flat arrays rather than Python objects per word, so a large
+# dictionary costs a few bytes per word:
+#
+#   prefix trie   - nodes in breadth-first order; each node's children are a
+#                   contiguous run of edges, and its words a contiguous range of
+#                   the sorted list
+#   graphemes     - grapheme -> sorted array of ids of words that contain it
+#   neighbours    - (crc32 of a grapheme pattern with one slot blanked, word id)
+#                   pairs sorted by hash, so one-sound-apart words are a bisect away
+#
+#     python phonics_words.py bench --words 50000
+import argparse
+import os
+import random
+import tempfile
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque, namedtuple
+
+# Words offered in rounds, counted in graphemes
+MIN_ROUND_GRAPHEMES = 2
+MAX_ROUND_GRAPHEMES = 5
+
+Question = namedtuple('Question', ['kind', 'word', 'graphemes', 'choices'])
+
+
+def _pattern_hash(graphemes, blank):
+    return zlib.crc32(' '.join('_' if i == blank else g for i, g in enumerate(graphemes)).encode('utf-8'))
+
+
+class WordEngine:
+    """Prefix, grapheme and neighbour indexes over one word list"""
+
+    def __init__(self, words):
+        self.words = words
+        count = len(words)
+        self._first_child = array('i', [0])
+        self._child_count = array('B', [0])
+        self._lo = array('i', [0])
+        self._hi = array('i', [count])
+        self._terminal = bytearray(1)
+        # One character per node so a node's id is also its position in the edge string
+        edges = ['\0']
+        self._graphemes = {}
+        neighbour_pairs = []
+
+        spellings = []
+        for word_id, (word, graphemes) in enumerate(words):
+            spellings.append(word)
+            for grapheme in set(graphemes):
+                self._graphemes.setdefault(grapheme, array('i')).append(word_id)
+            for blank in range(len(graphemes)):
+                neighbour_pairs.append((_pattern_hash(graphemes, blank), word_id))
+
+        # Breadth-first trie over the sorted spellings: a node's words share its prefix
+        pending = deque([(0, 0, count, 0)])
+        while pending:
+            node, lo, hi, depth = pending.popleft()
+            if lo < hi and len(spellings[lo]) == depth:
+                self._terminal[node] = 1
+                lo += 1
+            self._first_child[node] = len(edges)
+            children = 0
+            start = lo
+            while start < hi:
+                letter = spellings[start][depth]
+                end = start + 1
+                while end < hi and spellings[end][depth] == letter:
+                    end += 1
+                child = len(edges)
+                edges.append(letter)
+                self._first_child.append(0)
+                self._child_count.append(0)
+                self._lo.append(start)
+                self._hi.append(end)
+                self._terminal.append(0)
+                pending.append((child, start, end, depth + 1))
+                children += 1
+                start = end
+            self._child_count[node] = children
+        self._edges = ''.join(edges)
+
+        neighbour_pairs.sort()
+        self._neighbour_hashes = array('I', (h for h, _ in neighbour_pairs))
+        self._neighbour_ids = array('i', (word_id for _, word_id in neighbour_pairs))
+
+    # Prefix queries
+
+    def _node(self, prefix):
+        """Trie node reached by spelling prefix, or -1"""
+        node = 0
+        edges = self._edges
+        for letter in prefix:
+            first = self._first_child[node]
+            index = edges.find(letter, first, first + self._child_count[node])
+            if index < 0:
+                return -1
+            node = index
+        return node
+
+    def next_letters(self, prefix):
+        """Letters that can follow prefix on the way to some word"""
+        node = self._node(prefix)
+        if node < 0:
+            return ''
+        first = self._first_child[node]
+        return self._edges[first:first + self._child_count[node]]
+
+    def word_id(self, spelling):
+        """Id of spelling in the word list, or -1; a word sorts first among its node's words"""
+        node = self._node(spelling)
+        return self._lo[node] if node >= 0 and self._terminal[node] else -1
+
+    def is_word(self, spelling):
+        return self.word_id(spelling) >= 0
+
+    def complete(self, prefix, limit=20):
+        """Words starting with prefix, in sorted order"""
+        node = self._node(prefix)
+        if node < 0:
+            return []
+        lo = self._lo[node]
+        return [self.words.word(i) for i in range(lo, min(self._hi[node], lo + limit))]
+
+    # Sound queries
+
+    def blend(self, graphemes):
+        """The word these sounds blend into, or None"""
+        word_id = self.word_id(''.join(graphemes))
+        if word_id < 0 or self.words[word_id][1] != tuple(graphemes):
+            return None
+        return self.words.word(word_id)
+
+    def words_with(self, grapheme):
+        """Ids of words containing grapheme"""
+        return self._graphemes.get(grapheme, array('i'))
+
+    def words_from(self, tiles, limit=50):
+        """Words spelled by some of these grapheme tiles, each tile used at most once"""
+        available = {}
+        for tile in tiles:
+            available[tile] = available.get(tile, 0) + 1
+        found = []
+        used = []
+
+        def walk(node, spelling):
+            if len(found) >= limit:
+                return
+            if used and self._terminal[node]:
+                if self.words[self._lo[node]][1] == tuple(used) and spelling not in found:
+                    found.append(spelling)
+            for tile, left in available.items():
+                if not left:
+                    continue
+                child = node
+                for letter in tile:
+                    first = self._first_child[child]
+                    child = self._edges.find(letter, first, first + self._child_count[child])
+                    if child < 0:
+                        break
+                if child < 0:
+                    continue
+                available[tile] -= 1
+                used.append(tile)
+                walk(child, spelling + tile)
+                used.pop()
+                available[tile] += 1
+
+        walk(0, '')
+        return found
+
+    def neighbours(self, word_id):
+        """Ids of words with the same number of sounds and exactly one sound different"""
+        graphemes = self.words[word_id][1]
+        found = []
+        for blank in range(len(graphemes)):
+            key = _pattern_hash(graphemes, blank)
+            lo = bisect_left(self._neighbour_hashes, key)
+            hi = bisect_right(self._neighbour_hashes, key, lo)
+            for other in self._neighbour_ids[lo:hi]:
+                if other == word_id or other in found:
+                    continue
+                other_graphemes = self.words[other][1]
+                # The hash may collide; check the pattern really matches
+                if len(other_graphemes) == len(graphemes) and sum(
+                        a != b for a, b in zip(graphemes, other_graphemes)) == 1:
+                    found.append(other)
+        return found
+
+    def distractors(self, word, count=3, rng=random):
+        """Words that sound close to word: one sound apart first, then same length"""
+        word_id = self.word_id(word)
+        if word_id < 0:
+            return []
+        close = self.neighbours(word_id)
+        picked = rng.sample(close, min(count, len(close)))
+        size = len(self.words[word_id][1])
+        attempts = 0
+        while len(picked) < count and attempts < 50 * count:
+            attempts += 1
+            other = rng.randrange(len(self.words))
+            if other != word_id and other not in picked and len(self.words[other][1]) == size:
+                picked.append(other)
+        return [self.words.word(i) for i in picked]
+
+    # Rounds
+
+    def _pick_words(self, count, rng, focus):
+        pool = self.words_with(focus) if focus else None
+        size = len(pool) if pool is not None else len(self.words)
+        picked = []
+        attempts = 0
+        while len(picked) < count and attempts < 50 * count and size:
+            attempts += 1
+            word_id = pool[rng.randrange(size)] if pool is not None else rng.randrange(size)
+            if word_id in picked:
+                continue
+            if MIN_ROUND_GRAPHEMES <= len(self.words[word_id][1]) <= MAX_ROUND_GRAPHEMES:
+                picked.append(word_id)
+        return picked
+
+    def rounds(self, kind, count=10, rng=random, focus=None, choices=4, extra_tiles=2):
+        """Pre-generate count questions in one pass
+
+        kind 'wizard': blend the sounds and pick the word among close distractors.
+        kind 'builder': build the word from its tiles plus a few decoy sounds.
+        focus limits the round to words containing one grapheme, e.g. 'sh'.
+        """
+        questions = []
+        for word_id in self._pick_words(count, rng, focus):
+            word, graphemes = self.words[word_id]
+            if kind == 'wizard':
+                options = self.distractors(word, choices - 1, rng) + [word]
+                rng.shuffle(options)
+                questions.append(Question(kind, word, graphemes, tuple(options)))
+            elif kind == 'builder':
+                decoys = []
+                for other in self.distractors(word, extra_tiles, rng):
+                    decoys.extend(g for g in self.words[self.word_id(other)][1] if g not in graphemes)
+                tiles = list(graphemes) + decoys[:extra_tiles]
+                rng.shuffle(tiles)
+                questions.append(Question(kind, word, graphemes, tuple(tiles)))
+            else:
+                raise ValueError(f"Unknown round kind {kind!r}")
+        return questions
+
+    def index_bytes(self):
+        """Approximate memory held by the flat indexes"""
+        arrays = [self._first_child, self._child_count, self._lo, self._hi,
+                  self._neighbour_hashes, self._neighbour_ids] + list(self._graphemes.values())
+        return sum(a.itemsize * len(a) for a in arrays) + len(self._terminal) + len(self._edges)
+
+    def __len__(self):
+        return len(self.words)
+
+
+def synthetic_word_list(path, count, graphemes, seed=7):
+    """Write a TSV of count made-up words spelled from graphemes, for benchmarking"""
+    rng = random.Random(seed)
+    consonants = [g for g in graphemes if g[0] not in 'aeiou']
+    vowels = [g for g in graphemes if g[0] in 'aeiou']
+    seen = {}
+    while len(seen) < count:
+        parts = []
+        for i in range(rng.randint(2, 6)):
+            parts.append(rng.choice(vowels if i % 2 else consonants))
+        seen.setdefault(''.join(parts), parts)
+    with open(path, 'w', encoding='utf-8') as f:
+        for word, parts in seen.items():
+            f.write(f"{word}\t{' '.join(parts)}\n")
+
+
+def _time_query(label, query, inputs, repeat):
+    samples = []
+    for i in range(repeat):
+        argument = inputs[i % len(inputs)]
+        start = time.perf_counter_ns()
+        query(argument)
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    p50 = samples[len(samples) // 2] / 1000
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] / 1000
+    print(f"{label:<22} p50 {p50:9.1f} us   p99 {p99:9.1f} us")
+
+
+def bench(word_count, repeat, content_dir):
+    """Build the engine over a synthetic dictionary and time each query"""
+    from phonics_content import ContentStore, WordList, compile_word_list
+
+    graphemes = ContentStore(content_dir).get('phonemes').items
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, 'words.tsv')
+        target = os.path.join(workdir, 'words.bin')
+        synthetic_word_list(source, word_count, graphemes)
+        started = time.perf_counter()
+        compile_word_list(source, target, set(graphemes))
+        compiled = time.perf_counter()
+        engine = WordEngine(WordList(target))
+        built = time.perf_counter()
+        print(f"{len(engine)} words: compile {compiled - started:.2f}s, index build {built - compiled:.2f}s, "
+              f"index {engine.index_bytes() / 1e6:.1f} MB")
+
+        rng = random.Random(1)
+        samples = [engine.words[rng.randrange(len(engine))] for _ in range(200)]
+        words = [word for word, _ in samples]
+        _time_query('next_letters', engine.next_letters, [w[:rng.randint(0, len(w) - 1)] for w in words], repeat)
+        _time_query('complete(limit=10)', lambda p: engine.complete(p, 10), [w[:2] for w in words], repeat)
+        _time_query('blend', engine.blend, [g for _, g in samples], repeat)
+        _time_query('distractors(3)', lambda w: engine.distractors(w, 3, rng), words, repeat)
+        _time_query('words_from(6 tiles)', engine.words_from,
+                    [g + tuple(rng.sample(graphemes, 2)) for _, g in samples], repeat)
+        _time_query('rounds(wizard, 10)', lambda _: engine.rounds('wizard', 10, rng), [None], max(1, repeat // 20))
+        _time_query('rounds(builder, 10)', lambda _: engine.rounds('builder', 10, rng), [None], max(1, repeat // 20))
+
+
+def main():
+    from phonics_config import CONTENT_DIR
+
+    parser = argparse.ArgumentParser(description="Word engine micro-benchmarks")
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('--words', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--content-dir', default=CONTENT_DIR)
+    args = parser.parse_args()
+    bench(args.words, args.repeat, args.content_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+# conftest.py - Settings phonics_config reads at import, set before any test module imports it
+import os
+
+# The splash screen would add a rerun to every AppTest session
+os.environ.setdefault('PHONICS_SKIP_SPLASH', '1')
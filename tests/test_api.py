@@ -0,0 +1,58 @@
+# test_api.py - JSON API validation of progress events
+import asyncio
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from phonics_api import PhonicsApi, _call  # noqa: E402
+from phonics_services import PhonicsServices  # noqa: E402
+
+
+@pytest.fixture
+def api(tmp_path):
+    services = PhonicsServices(str(tmp_path / 'kids.db'), content_dir=os.path.join(APP_DIR, 'content'))
+    services.content.cache_dir = str(tmp_path / 'content_cache')
+    api = PhonicsApi(services)
+    assert asyncio.run(_call(api, 'POST', '/users', {'name': 'ann'}))[0] == 201
+    yield api
+    services.journal.close()
+
+
+def post_progress(api, *events):
+    return asyncio.run(_call(api, 'POST', '/progress', {'events': list(events)}))
+
+
+def event(content, activity='letter_sounds'):
+    return {'user': 'ann', 'activity': activity, 'content': content, 'score': 10, 'time_spent': 1}
+
+
+@pytest.mark.parametrize('content', [None, '', 7, 'zz'])
+def test_bad_content_is_rejected(api, content):
+    payload = event(content)
+    if content is None:
+        del payload['content']
+    status, body = post_progress(api, payload)
+    assert status == 400
+    assert body['accepted'] == 0 and body['rejected'][0]['index'] == 0
+
+
+def test_null_content_does_not_reach_the_journal(api):
+    status, body = post_progress(api, event(None), event('A'))
+    assert status == 200
+    assert body['accepted'] == 1 and [r['index'] for r in body['rejected']] == [0]
+    journal = api.services.journal
+    journal.flush()
+    assert journal.stats()['dropped'] == 0
+    assert api.services.storage.get_profile('ann')[1] == 10
+    # The practice queue holds only real letters, so it still saves and answers
+    status, body = asyncio.run(_call(api, 'GET', '/users/ann/next', query=b'activity=letter_sounds'))
+    assert status == 200 and body['item'] is not None and body['sound'] is not None
+
+
+def test_unscheduled_activity_takes_any_content(api):
+    status, body = post_progress(api, event('cat', activity='word_wizard'))
+    assert status == 200 and body['accepted'] == 1
@@ -0,0 +1,121 @@
+# test_journal.py - Write-behind progress journal: batching, lock retry and dropped events
+import os
+import sqlite3
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from phonics_journal import ProgressJournal  # noqa: E402
+from phonics_profiles import ProfileCache, VersionTable  # noqa: E402
+from phonics_storage import PhonicsStorage  # noqa: E402
+
+
+class LockedStorage:
+    """Storage whose first few batch writes fail as if another writer held the lock"""
+
+    def __init__(self, storage, failures):
+        self.storage = storage
+        self.failures = failures
+
+    def record_progress_batch(self, events, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return self.storage.record_progress_batch(events, **kwargs)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = PhonicsStorage(str(tmp_path / 'kids.db'))
+    storage.create_user('ann')
+    storage.create_user('bob')
+    yield storage
+    storage.close()
+
+
+def _progress_rows(storage):
+    with storage.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM progress").fetchone()[0]
+
+
+def test_events_are_written_in_batches(storage):
+    journal = ProgressJournal(storage, max_batch=16, flush_interval=0.05)
+    batches = []
+    journal.add_listener(batches.append)
+    for i in range(40):
+        assert journal.record('ann' if i % 2 else 'bob', 'letter_sounds', 'A', 10, 1, 1)
+    journal.flush()
+    stats = journal.stats()
+    assert stats['flushed'] == 40 and stats['dropped'] == 0
+    assert stats['batches'] < 40 and max(len(batch) for batch in batches) <= 16
+    assert _progress_rows(storage) == 40
+    assert storage.get_profile('ann')[1:3] == (200, 20)
+    assert journal.pending_totals('ann') == (0, 0)
+    journal.close()
+
+
+def test_locked_database_is_retried(storage):
+    journal = ProgressJournal(LockedStorage(storage, failures=3), flush_interval=0.01)
+    for _ in range(5):
+        journal.record('ann', 'letter_sounds', 'A', 10, 1, 1)
+    journal.flush()
+    stats = journal.stats()
+    assert stats['retries'] == 3
+    assert stats['flushed'] == 5 and stats['dropped'] == 0
+    assert _progress_rows(storage) == 5
+    journal.close()
+
+
+def test_rejected_event_is_dropped_alone(storage):
+    journal = ProgressJournal(storage, flush_interval=0.2)
+    written = []
+    dropped = []
+    journal.add_listener(written.extend)
+    journal.add_drop_listener(dropped.extend)
+    journal.record('ann', 'letter_sounds', 'A', 10, 1, 1)
+    # A list cannot be bound as a parameter, so SQLite rejects this event outright
+    journal.record('ann', 'letter_sounds', ['A'], 10, 1, 1)
+    journal.record('bob', 'letter_sounds', 'B', 10, 1, 1)
+    journal.flush()
+    stats = journal.stats()
+    assert stats['flushed'] == 2 and stats['dropped'] == 1
+    assert [event.content for event in written] == ['A', 'B']
+    assert [event.content for event in dropped] == [['A']]
+    assert journal.pending_totals('ann') == (0, 0)
+    assert storage.get_profile('ann')[1] == 10
+    journal.close()
+
+
+def test_unknown_user_counts_as_dropped(storage):
+    journal = ProgressJournal(storage, flush_interval=0.2)
+    written = []
+    dropped = []
+    journal.add_listener(written.extend)
+    journal.add_drop_listener(dropped.extend)
+    journal.record('ann', 'letter_sounds', 'A', 10, 1, 1)
+    journal.record('ghost', 'letter_sounds', 'A', 10, 1, 1)
+    journal.flush()
+    stats = journal.stats()
+    assert stats['flushed'] == 1 and stats['dropped'] == 1
+    assert [event.user_name for event in written] == ['ann']
+    assert [event.user_name for event in dropped] == ['ghost']
+    assert journal.pending_totals('ghost') == (0, 0)
+    journal.close()
+
+
+def test_cached_profile_forgets_dropped_points(storage, tmp_path):
+    journal = ProgressJournal(storage, flush_interval=0.05)
+    versions = VersionTable(str(tmp_path / 'kids.db-versions'))
+    profiles = ProfileCache(storage, journal, versions)
+    journal.add_drop_listener(profiles.on_dropped)
+    assert profiles.get('ann').points == 0
+    profiles.record_progress('ann', 'letter_sounds', 'A', 10, 1, 1)
+    profiles.record_progress('ann', 'letter_sounds', ['A'], 25, 1, 1)
+    assert profiles.get('ann').points == 35
+    journal.flush()
+    assert profiles.get('ann').points == 10
+    journal.close()
+    versions.close()
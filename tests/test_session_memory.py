@@ -0,0 +1,30 @@
+# test_session_memory.py - Per-session memory budget, as checked by phonics_memory.py
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+pytest.importorskip('streamlit')
+import phonics_memory  # noqa: E402
+
+SESSIONS = 10
+
+
+def test_sessions_stay_within_memory_budget(tmp_path, monkeypatch):
+    # Fresh database and caches; the splash screen would add a rerun per session
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('PHONICS_SKIP_SPLASH', '1')
+    tracemalloc.start(1)
+    try:
+        app_bytes, _, sites = phonics_memory.profile(SESSIONS, timeout=60, top=5)
+    finally:
+        tracemalloc.stop()
+    top = ', '.join(f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno} "
+                    f"{stat.size_diff / 1024:.1f} KB" for stat in sites)
+    assert app_bytes <= phonics_memory.DEFAULT_BUDGET_KB * 1024, (
+        f"{app_bytes / 1024:.1f} KB per session, over the {phonics_memory.DEFAULT_BUDGET_KB} KB budget; "
+        f"top sites: {top}")
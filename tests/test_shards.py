@@ -0,0 +1,91 @@
+# test_shards.py - Sharded progress writes when one shard fails partway through a batch
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from phonics_journal import ProgressJournal  # noqa: E402
+from phonics_shards import ShardRouter  # noqa: E402
+
+
+@pytest.fixture
+def router(tmp_path):
+    config = tmp_path / 'shards.json'
+    config.write_text(json.dumps({
+        'directory': 'directory.db',
+        'shards': {'s0': 's0.db', 's1': 's1.db'},
+        'classrooms': {'room-a': 's0', 'room-b': 's1'},
+    }))
+    router = ShardRouter.from_config(str(config))
+    router.create_user('kid0', classroom='room-a')
+    router.create_user('kid1', classroom='room-b')
+    yield router
+    router.close()
+
+
+def fail_shard(router, shard, error, times):
+    """Make a shard's batch writes raise error for the next `times` calls"""
+    storage = router.shards[shard]
+    write = storage.record_progress_batch
+    calls = {'left': times}
+
+    def failing(*args, **kwargs):
+        if calls['left']:
+            calls['left'] -= 1
+            raise error
+        return write(*args, **kwargs)
+    storage.record_progress_batch = failing
+
+
+def totals(router, name):
+    shard = router.shards[router.locate([name])[name]]
+    with shard.connection() as conn:
+        points = conn.execute("SELECT total_points FROM users WHERE name = ?", (name,)).fetchone()[0]
+        rows = conn.execute("SELECT COUNT(*) FROM progress JOIN users ON users.id = progress.user_id "
+                            "WHERE name = ?", (name,)).fetchone()[0]
+    return points, rows
+
+
+def test_committed_reports_the_shards_written_before_a_failure(router):
+    fail_shard(router, 's1', sqlite3.OperationalError("database is locked"), 1)
+    events = [('kid0', 'letter_sounds', 'A', 5, 1, '2026-01-01T10:00:00', 1),
+              ('kid1', 'letter_sounds', 'A', 5, 1, '2026-01-01T10:00:00', 1)]
+    committed = []
+    with pytest.raises(sqlite3.OperationalError):
+        router.record_progress_batch(events, committed=committed)
+    assert committed == [events[0]]
+
+
+def test_journal_retries_only_the_failed_shard(router):
+    fail_shard(router, 's1', sqlite3.OperationalError("database is locked"), 2)
+    journal = ProgressJournal(router, flush_interval=0.2)
+    journal.record('kid0', 'letter_sounds', 'A', 5, 1, 1)
+    journal.record('kid1', 'letter_sounds', 'A', 5, 1, 1)
+    journal.flush()
+    stats = journal.stats()
+    assert stats['flushed'] == 2 and stats['dropped'] == 0 and stats['retries'] == 2
+    assert totals(router, 'kid0') == (5, 1)
+    assert totals(router, 'kid1') == (5, 1)
+    journal.close()
+
+
+def test_rejected_shard_does_not_rewrite_the_others(router):
+    fail_shard(router, 's1', sqlite3.IntegrityError("rejected"), 10)
+    journal = ProgressJournal(router, flush_interval=0.2)
+    written = []
+    journal.add_listener(written.extend)
+    journal.record('kid0', 'letter_sounds', 'A', 5, 1, 1)
+    journal.record('kid0', 'letter_sounds', 'B', 5, 1, 1)
+    journal.record('kid1', 'letter_sounds', 'A', 5, 1, 1)
+    journal.flush()
+    stats = journal.stats()
+    assert stats['flushed'] == 2 and stats['dropped'] == 1
+    assert [event.user_name for event in written] == ['kid0', 'kid0']
+    assert totals(router, 'kid0') == (10, 2)
+    assert totals(router, 'kid1') == (0, 0)
+    journal.close()
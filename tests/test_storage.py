@@ -0,0 +1,23 @@
+# test_storage.py - Batched progress writes and their daily rollups
+import os
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from phonics_storage import PhonicsStorage  # noqa: E402
+
+
+def test_null_content_is_written_and_left_out_of_content_rollup(tmp_path):
+    storage = PhonicsStorage(str(tmp_path / 'kids.db'))
+    storage.create_user('ann')
+    written = storage.record_progress_batch([
+        ('ann', 'letter_sounds', None, 10, 5, '2026-01-01T10:00:00', 1),
+        ('ann', 'letter_sounds', 'A', 10, 5, '2026-01-01T10:01:00', 1),
+    ])
+    assert written == 2
+    with storage.connection() as conn:
+        assert conn.execute("SELECT events, points FROM daily_user_rollup").fetchall() == [(2, 20)]
+        assert conn.execute("SELECT content, events FROM daily_content_rollup").fetchall() == [('A', 1)]
+        assert conn.execute("SELECT total_points FROM users").fetchone() == (20,)
+    storage.close()